@@ -0,0 +1,416 @@
+"""
+cluster mode: forecast cells sharded across api nodes by consistent hashing
+
+with several api nodes behind a load balancer, each would fetch and cache
+every spot it is asked about. in cluster mode every grid cell has one owner
+node, picked on a consistent-hash ring of the nodes' urls:
+
+- on a cache miss, marine and weather fetches of a cell owned by another
+  node are forwarded to it (GET /internal/{kind}); the owner answers from
+  its cache or fetches once for the whole cluster. upstream calls and
+  cached forecasts then scale with the distinct cells, not nodes x cells.
+- the forwarding node keeps the answer for a short while
+  (SURF_CLUSTER_NEAR_TTL), enough for its live update subscribers and alert
+  rules, which are fed through its own cache.
+- each node sits at many points of the ring (virtual nodes), so adding or
+  removing one moves only about 1/n of the cells, spread over all nodes.
+- an owner that is unreachable (breaker per peer) or cannot answer is not
+  waited on: the node fetches the cell itself.
+- a forwarded request is always served where it lands, so nodes that
+  briefly disagree on membership cost at most one extra hop, never a loop.
+- peers prove membership with a shared secret (SURF_CLUSTER_TOKEN, sent as
+  the X-Surf-Cluster-Token header): /internal/* and /admin/cluster refuse
+  anyone else, so outsiders can neither feed a node's cache nor point it
+  at their own hosts.
+
+configuration (environment):
+    SURF_CLUSTER_NODES: comma-separated base urls of all nodes, the same on
+        every node (unset: cluster mode off)
+    SURF_CLUSTER_SELF: this node's url, as listed in SURF_CLUSTER_NODES
+    SURF_CLUSTER_TOKEN: secret shared by all nodes (required in cluster mode)
+    SURF_CLUSTER_NEAR_TTL: seconds a forwarding node keeps an answer
+        (default 60; 0 keeps nothing)
+    SURF_CLUSTER_TIMEOUT: seconds to wait for an owner (default 10)
+
+`python -m cli.cluster` starts a local cluster for testing.
+"""
+
+import bisect
+import contextvars
+import hashlib
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterable, Iterator, Optional, TypeVar
+
+import requests
+from pydantic import BaseModel, ValidationError
+
+from api.deadline import Deadline, effective_timeout
+from api.scheduler import current_priority
+from api.upstream import (
+    CircuitBreaker,
+    UpstreamUnavailableError,
+    cache_only,
+    is_cache_only,
+    pooled_session,
+)
+from services.cache import put_model
+from services.helpers import cell_id
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# points per node on the ring: more points spread cells more evenly
+_REPLICAS = 128
+_NEAR_TTL = 60.0
+_TIMEOUT = 10.0
+TOKEN_HEADER = "X-Surf-Cluster-Token"
+
+_peer_request: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "surf_peer_request", default=False
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    consistent-hash ring mapping keys to nodes
+
+    args:
+        nodes: node names (the nodes' base urls)
+        replicas: points per node on the ring
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = _REPLICAS):
+        self.replicas = replicas
+        self._nodes: set[str] = set()
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> list[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            at = bisect.bisect(self._points, point)
+            self._points.insert(at, point)
+            self._owners.insert(at, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def owner(self, key: str) -> str:
+        """
+        the node owning a key: the first point clockwise from its hash
+
+        raises:
+            LookupError: if the ring has no nodes
+        """
+        if not self._points:
+            raise LookupError("hash ring has no nodes")
+        at = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[at]
+
+    def shares(self) -> dict[str, float]:
+        """fraction of the hash space each node owns"""
+        shares = {node: 0.0 for node in self._nodes}
+        space = float(2**64)
+        for i, point in enumerate(self._points):
+            previous = self._points[i - 1] if i else self._points[-1] - 2**64
+            shares[self._owners[i]] += (point - previous) / space
+        return shares
+
+
+class Cluster:
+    """
+    this node's view of the cluster: the ring and a client per peer
+
+    args:
+        nodes: base urls of all nodes, this one included
+        me: this node's base url
+        token: secret shared by all nodes, sent with every peer call
+        near_ttl: seconds forwarded answers are kept locally
+        timeout: seconds to wait for an owner
+        session: requests-compatible session for peer calls (pooled by default)
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[str],
+        me: str,
+        token: str,
+        near_ttl: float = _NEAR_TTL,
+        timeout: float = _TIMEOUT,
+        session: Optional[requests.Session] = None,
+    ):
+        if not token:
+            raise ValueError("cluster mode needs a shared token (SURF_CLUSTER_TOKEN)")
+        self.me = me.rstrip("/")
+        self._token = token
+        self.near_ttl = near_ttl
+        self.timeout = timeout
+        self.session = session or pooled_session()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._forwarded = 0
+        self._fallbacks = 0
+        self._lock = threading.Lock()
+        self.set_nodes(nodes)
+
+    def set_nodes(self, nodes: Iterable[str]) -> None:
+        """
+        change the membership; only the cells of added or removed nodes move
+
+        raises:
+            ValueError: if this node is not among them
+        """
+        nodes = {node.rstrip("/") for node in nodes if node.strip()}
+        if self.me not in nodes:
+            raise ValueError(f"cluster nodes must include this node ({self.me})")
+        with self._lock:
+            ring = HashRing(nodes)
+            self.ring = ring
+            self._breakers = {
+                node: self._breakers.get(node) or CircuitBreaker(f"peer:{node}")
+                for node in nodes
+                if node != self.me
+            }
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """whether a caller's token is the cluster's"""
+        return token is not None and hmac.compare_digest(
+            token.encode(), self._token.encode()
+        )
+
+    def owner(self, cell: str) -> str:
+        """the node owning a grid cell (services.helpers.cell_id)"""
+        return self.ring.owner(cell)
+
+    def owns(self, cell: str) -> bool:
+        return self.owner(cell) == self.me
+
+    def fetch(
+        self, owner: str, kind: str, params: dict, deadline: Optional[Deadline]
+    ) -> Any:
+        """
+        GET a cell's upstream response from its owner
+
+        raises:
+            UpstreamUnavailableError: if the owner is down (breaker open, no
+                connection, 5xx) or could not answer (503, 429)
+            requests.HTTPError: if the owner rejected the request (4xx)
+            DeadlineExceeded: if the deadline passed
+        """
+        breaker = self._breakers.get(owner)
+        if breaker is None:
+            raise UpstreamUnavailableError(f"peer:{owner}", 1.0, "not a member")
+        if not breaker.allow():
+            raise UpstreamUnavailableError(
+                breaker.name, breaker.retry_after(), "circuit open"
+            )
+        query = {k: v for k, v in params.items() if v is not None}
+        query["priority"] = current_priority()
+        if is_cache_only():
+            query["cache_only"] = "true"
+        if deadline is not None:
+            query["deadline_ms"] = max(100, int(deadline.remaining() * 1000))
+        try:
+            response = self.session.get(
+                f"{owner}/internal/{kind}",
+                params=query,
+                headers={TOKEN_HEADER: self._token},
+                timeout=effective_timeout(self.timeout, deadline),
+            )
+        except requests.RequestException as e:
+            breaker.record_failure()
+            raise UpstreamUnavailableError(breaker.name, breaker.retry_after(), str(e))
+        if response.status_code >= 500 and response.status_code != 503:
+            breaker.record_failure()
+            raise UpstreamUnavailableError(
+                breaker.name, breaker.retry_after(), f"{response.status_code}"
+            )
+        # the peer answered: a 503 or 429 is about its upstream or load
+        breaker.record_success()
+        if response.status_code in (429, 503):
+            raise UpstreamUnavailableError(
+                breaker.name, 1.0, f"{response.status_code} from owner"
+            )
+        response.raise_for_status()
+        return response.json()
+
+    def count(self, forwarded: bool) -> None:
+        with self._lock:
+            if forwarded:
+                self._forwarded += 1
+            else:
+                self._fallbacks += 1
+
+    def stats(self) -> dict:
+        shares = self.ring.shares()
+        with self._lock:
+            return {
+                "self": self.me,
+                "nodes": {
+                    node: {
+                        "share": round(shares[node], 4),
+                        "breaker": (
+                            "self" if node == self.me else self._breakers[node].state
+                        ),
+                    }
+                    for node in self.ring.nodes
+                },
+                "forwarded": self._forwarded,
+                "fallbacks": self._fallbacks,
+            }
+
+
+_cluster: Optional[Cluster] = None
+_cluster_loaded = False
+_cluster_lock = threading.Lock()
+
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def get_cluster() -> Optional[Cluster]:
+    """
+    this node's cluster, or None when cluster mode is off
+
+    raises:
+        ValueError: if cluster mode is configured without SURF_CLUSTER_TOKEN
+    """
+    global _cluster, _cluster_loaded
+    if not _cluster_loaded:
+        with _cluster_lock:
+            if not _cluster_loaded:
+                nodes = os.getenv("SURF_CLUSTER_NODES", "").split(",")
+                me = os.getenv("SURF_CLUSTER_SELF", "")
+                if any(node.strip() for node in nodes) and me:
+                    _cluster = Cluster(
+                        nodes,
+                        me,
+                        os.getenv("SURF_CLUSTER_TOKEN", ""),
+                        near_ttl=_env_seconds("SURF_CLUSTER_NEAR_TTL", _NEAR_TTL),
+                        timeout=_env_seconds("SURF_CLUSTER_TIMEOUT", _TIMEOUT),
+                    )
+                _cluster_loaded = True
+    return _cluster
+
+
+def set_cluster(cluster: Optional[Cluster]) -> None:
+    """replace this node's cluster (None turns cluster mode off)"""
+    global _cluster, _cluster_loaded
+    with _cluster_lock:
+        _cluster = cluster
+        _cluster_loaded = True
+
+
+@contextmanager
+def peer_request() -> Iterator[None]:
+    """serve the calls in this context here, never forwarding them again"""
+    token = _peer_request.set(True)
+    try:
+        yield
+    finally:
+        _peer_request.reset(token)
+
+
+def from_owner(
+    kind: str,
+    cache_key: str,
+    model_cls: type[ModelT],
+    latitude: float,
+    longitude: float,
+    params: dict,
+    deadline: Optional[Deadline] = None,
+) -> Optional[ModelT]:
+    """
+    a cell's upstream response from the node owning it
+
+    args:
+        kind: "marine" or "weather"
+        cache_key: the response's cache key, where it is kept near_ttl seconds
+        model_cls: response model
+        latitude, longitude: coordinates in the cell
+        params: query of GET /internal/{kind} besides the coordinates
+
+    returns:
+        the response, or None when this node should fetch the cell itself:
+        cluster mode is off, this node owns the cell, the request was
+        forwarded here, or the owner could not answer
+
+    raises:
+        DeadlineExceeded: if the deadline passed
+    """
+    cluster = get_cluster()
+    if cluster is None or _peer_request.get():
+        return None
+    owner = cluster.owner(cell_id(latitude, longitude))
+    if owner == cluster.me:
+        return None
+    query = {"latitude": latitude, "longitude": longitude, **params}
+    started = time.time()
+    try:
+        model = model_cls.model_validate(cluster.fetch(owner, kind, query, deadline))
+    except (UpstreamUnavailableError, requests.HTTPError, ValueError, ValidationError):
+        cluster.count(forwarded=False)
+        return None
+    cluster.count(forwarded=True)
+    if cluster.near_ttl > 0:
+        put_model(cache_key, model, started, cluster.near_ttl)
+    return model
+
+
+def serve_peer(
+    kind: str,
+    latitude: float,
+    longitude: float,
+    params: dict,
+    priority_name: str,
+    from_cache: bool = False,
+    deadline: Optional[Deadline] = None,
+) -> BaseModel:
+    """
+    answer a forwarded fetch here, for GET /internal/{kind}
+
+    raises:
+        ValueError: for an unknown kind or priority, or invalid parameters
+        as the marine and weather clients
+    """
+    from api.marine import get_marine_forecast
+    from api.scheduler import priority
+    from api.weather import weather_forecast
+
+    getters = {"marine": get_marine_forecast, "weather": weather_forecast}
+    if kind not in getters:
+        raise ValueError(f"unknown forecast kind: {kind}")
+    if kind != "marine" and params.get("model") is not None:
+        raise ValueError(f"{kind} forecasts have no model choice")
+    with (
+        peer_request(),
+        priority(priority_name),
+        cache_only() if from_cache else nullcontext(),
+    ):
+        return getters[kind](latitude, longitude, deadline=deadline, **params)
@@ -0,0 +1,70 @@
+"""
+per-request deadlines propagated into upstream timeouts and retry decisions
+"""
+
+import time
+from typing import Optional
+
+# requested budgets are clamped to this range (seconds)
+MIN_DEADLINE_SECONDS = 0.1
+MAX_DEADLINE_SECONDS = 120.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """raised when the request budget runs out before an upstream answers"""
+
+
+class Deadline:
+    """
+    absolute point in (monotonic) time by which a request must be answered
+
+    args:
+        seconds: budget from now, clamped to [MIN_DEADLINE_SECONDS, MAX_DEADLINE_SECONDS]
+    """
+
+    def __init__(self, seconds: float):
+        seconds = min(max(seconds, MIN_DEADLINE_SECONDS), MAX_DEADLINE_SECONDS)
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_ms(cls, ms: Optional[float]) -> Optional["Deadline"]:
+        """build a deadline from a millisecond budget; None means no deadline"""
+        if ms is None:
+            return None
+        return cls(ms / 1000)
+
+    def remaining(self) -> float:
+        """seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """
+        timeout to use for the next upstream call
+
+        args:
+            cap: the call's normal timeout
+
+        returns:
+            min(cap, remaining budget)
+
+        raises:
+            DeadlineExceeded: if no budget is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"deadline of {self.budget:.2f}s exceeded")
+        return min(cap, remaining)
+
+    def allows(self, seconds: float) -> bool:
+        """return True if at least `seconds` of budget remain (e.g. for a retry)"""
+        return self.remaining() > seconds
+
+
+def effective_timeout(cap: float, deadline: Optional[Deadline]) -> float:
+    """timeout for an upstream call, capped by the deadline if there is one"""
+    return cap if deadline is None else deadline.timeout(cap)
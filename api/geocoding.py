@@ -3,42 +3,131 @@ geocoding api client for converting city names to coordinates
 https://geopy.readthedocs.io/en/stable/
 """
 
-import time
 import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from geopy.geocoders import Nominatim
 
+from api.deadline import Deadline, DeadlineExceeded, effective_timeout
+from api.scheduler import Scheduler
+from api.upstream import (
+    CircuitBreaker,
+    UpstreamUnavailableError,
+    guarded_call,
+)
+from backend.models import GeocodedLocation
+from services.cache import get_model, put_model
+from services.helpers import normalize_location_name
+from services.memory import deep_size, register_cache
+from services.tracing import span, traced
+
 _GEOCODE_TIMEOUT = 10
 _GEOCODE_RETRIES = 3
 _GEOCODE_RETRY_DELAY = 1.0
+# place names almost never move
+_CACHE_TTL = 30 * 24 * 3600
+_GEOCODE_ERRORS = (OSError, TimeoutError, GeocoderTimedOut, GeocoderUnavailable)
+_LAST_GOOD_ENTRIES = 1024
+
+# no hedging here: nominatim's usage policy allows one request per second
+_breaker = CircuitBreaker("nominatim")
+# one query in flight at a time; other misses wait briefly or fail fast,
+# interactive lookups ahead of catalogue imports
+_bulkhead = Scheduler("nominatim", max_concurrent=1, max_queue=50, max_wait=2.0)
+# last good answer per normalized query (lru), served while the breaker is open
+_last_good: OrderedDict[str, tuple[float, float, str]] = OrderedDict()
+_last_good_lock = threading.Lock()
+
 
+def geocode_cache_key(city_name: str) -> str:
+    """cache key of a query; spellings differing in case or accents share it"""
+    return f"geocode:v1:{normalize_location_name(city_name)}"
 
-def geocode_location(city_name: str) -> tuple[float, float, str]:
+
+@traced("geocode")
+def geocode_location(
+    city_name: str, deadline: Optional[Deadline] = None
+) -> tuple[float, float, str]:
     """
     convert city name to latitude and longitude coordinates
 
     args:
         city_name: name of the city or location
+        deadline: optional request deadline capping timeouts and retries
 
     returns:
         tuple of (latitude, longitude, full_location_name)
 
     raises:
         ValueError: if location cannot be found
+        UpstreamUnavailableError: if nominatim is failing and the query was never seen
+        DeadlineExceeded: if the deadline passed and the query was never seen
     """
+    cache_key = geocode_cache_key(city_name)
+    cached = get_model(cache_key, GeocodedLocation)
+    if cached is not None:
+        return cached.latitude, cached.longitude, cached.address
+
+    fetched_at = time.time()
+    try:
+        with span("geocode.fetch"):
+            location = guarded_call(
+                _breaker,
+                lambda: _geocode_with_retries(city_name, deadline),
+                _GEOCODE_ERRORS,
+                bulkhead=_bulkhead,
+                deadline=deadline,
+            )
+    except (UpstreamUnavailableError, *_GEOCODE_ERRORS):
+        with _last_good_lock:
+            if cache_key in _last_good:
+                _last_good.move_to_end(cache_key)
+                return _last_good[cache_key]
+        raise
+    if location is None:
+        raise ValueError(f"could not find location: {city_name}")
+
+    geocoded = GeocodedLocation(
+        latitude=location.latitude,
+        longitude=location.longitude,
+        address=location.address,
+    )
+    put_model(cache_key, geocoded, fetched_at, _CACHE_TTL)
+    result = (geocoded.latitude, geocoded.longitude, geocoded.address)
+    with _last_good_lock:
+        _last_good[cache_key] = result
+        _last_good.move_to_end(cache_key)
+        while len(_last_good) > _LAST_GOOD_ENTRIES:
+            _last_good.popitem(last=False)
+    return result
+
+
+def _last_good_usage() -> tuple[int, int]:
+    """(answers, approximate bytes) kept for open-breaker fallbacks"""
+    with _last_good_lock:
+        return len(_last_good), deep_size(_last_good)
+
+
+register_cache("geocode:last_good", _last_good_usage)
+
+
+def _geocode_with_retries(city_name: str, deadline: Optional[Deadline]):
+    """query nominatim, retrying transient network errors while budget remains"""
     geolocator = Nominatim(user_agent="surf_forecast_mcp", timeout=_GEOCODE_TIMEOUT)
-    location = None
     for attempt in range(_GEOCODE_RETRIES):
         try:
-            location = geolocator.geocode(city_name)
-            break
-        except (OSError, TimeoutError):
+            timeout = effective_timeout(_GEOCODE_TIMEOUT, deadline)
+            return geolocator.geocode(city_name, timeout=timeout)
+        except _GEOCODE_ERRORS as e:
+            if deadline is not None and not deadline.allows(_GEOCODE_RETRY_DELAY):
+                raise DeadlineExceeded(f"nominatim: {e}") from e
             if attempt == _GEOCODE_RETRIES - 1:
                 raise
             time.sleep(_GEOCODE_RETRY_DELAY)
-    if location is None:
-        raise ValueError(f"could not find location: {city_name}")
-
-    return location.latitude, location.longitude, location.address
 
 
 if __name__ == "__main__":
@@ -2,43 +2,109 @@
 marine weather api client
 """
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import time
+from typing import Optional
+
 from pydantic import ValidationError
+
+from api.cluster import from_owner
+from api.deadline import Deadline
+from api.quota import cache_ttl
+from api.upstream import Upstream, pooled_session
 from backend.models import MarineResponse
-from services.helpers import validate_coordinates
+from services.cache import get_model, put_model
+from services.helpers import (
+    forecast_cache_key,
+    grid_cell,
+    upstream_daily_enabled,
+    validate_coordinates,
+    validate_forecast_days,
+)
+from services.localize import utc_series
+from services.tracing import span, traced
 
-# Session with retry: 3 attempts, backoff 1s, retry on 5xx/429 and connection/timeout errors
-_REQUEST_TIMEOUT = 30
-_RETRY_STRATEGY = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=(500, 502, 503, 504, 429),
-    allowed_methods=("GET",),
+_DEFAULT_FORECAST_DAYS = 7
+# wave models open-meteo serves through the `models` parameter
+MARINE_MODELS = (
+    "ecmwf_wam025",
+    "ncep_gfswave025",
+    "meteofrance_wave",
+    "dwd_gwam",
+    "dwd_ewam",
 )
-_session = requests.Session()
-_session.mount("https://", HTTPAdapter(max_retries=_RETRY_STRATEGY))
-_session.mount("http://", HTTPAdapter(max_retries=_RETRY_STRATEGY))
+# open-meteo refreshes hourly; model runs land every few hours
+_CACHE_TTL = 3600
+
+# Shared pooled session; retries, hedging, bulkhead and breaker live in Upstream
+_REQUEST_TIMEOUT = 30
+_session = pooled_session()
+_upstream = Upstream("open-meteo-marine", _session, timeout=_REQUEST_TIMEOUT)
 
 
-def get_marine_forecast(latitude: float, longitude: float) -> MarineResponse:
+@traced("marine")
+def get_marine_forecast(
+    latitude: float,
+    longitude: float,
+    forecast_days: int = _DEFAULT_FORECAST_DAYS,
+    deadline: Optional[Deadline] = None,
+    include_daily: Optional[bool] = None,
+    model: Optional[str] = None,
+) -> MarineResponse:
     """
     fetch marine forecast data from open-meteo api with validation
 
     args:
         latitude: latitude coordinate
         longitude: longitude coordinate
+        forecast_days: number of forecast days to request (1-16)
+        deadline: optional request deadline capping timeouts and retries
+        include_daily: request daily= aggregates upstream; defaults to
+            upstream_daily_enabled(). without them `daily` is None and
+            daily values are derived from hourly data
+        model: wave model from MARINE_MODELS; None lets open-meteo pick the
+            best model for the location
+
+    data is fetched for the center of the coordinates' grid cell and shared
+    through the cache backend with every worker asking for the same cell (in
+    cluster mode, with every node: see api.cluster).
 
     returns:
         validated marine response
 
     raises:
-        ValueError: if coordinates are out of valid range
+        ValueError: if coordinates, forecast_days or model are invalid
         requests.HTTPError: if api request fails
+        UpstreamUnavailableError: if the api is failing and no cached response exists
+        DeadlineExceeded: if the deadline passed and no cached response exists
         ValidationError: if api response doesn't match expected schema
     """
     validate_coordinates(latitude, longitude)
+    validate_forecast_days(forecast_days)
+    if model is not None and model not in MARINE_MODELS:
+        raise ValueError(
+            f"unknown marine model: {model} (expected one of {', '.join(MARINE_MODELS)})"
+        )
+    if include_daily is None:
+        include_daily = upstream_daily_enabled()
+    cache_key = forecast_cache_key(
+        "marine", latitude, longitude, forecast_days, include_daily, model
+    )
+    cached = get_model(cache_key, MarineResponse)
+    if cached is not None:
+        return cached
+    # in cluster mode the cell's owner node fetches and caches it
+    owned = from_owner(
+        "marine",
+        cache_key,
+        MarineResponse,
+        latitude,
+        longitude,
+        {"days": forecast_days, "daily": str(include_daily).lower(), "model": model},
+        deadline=deadline,
+    )
+    if owned is not None:
+        return owned
+    latitude, longitude = grid_cell(latitude, longitude)
     # open-meteo marine api endpoint
     url = "https://marine-api.open-meteo.com/v1/marine"
 
@@ -73,15 +139,28 @@ def get_marine_forecast(latitude: float, longitude: float) -> MarineResponse:
                 "swell_wave_period_max",
             ]
         ),
+        # canonical units and utc instants, as the weather client
+        "length_unit": "metric",
+        "timeformat": "unixtime",
         "timezone": "auto",
-        "forecast_days": 7,
+        "forecast_days": forecast_days,
     }
 
-    response = _session.get(url, params=params, timeout=_REQUEST_TIMEOUT)
-    response.raise_for_status()
+    if not include_daily:
+        del params["daily"]
+    if model is not None:
+        params["models"] = model
+
+    fetched_at = time.time()
+    with span("marine.fetch"):
+        payload = _upstream.get_json(url, params, deadline=deadline)
 
     # validate response
     try:
-        return MarineResponse(**response.json())
+        with span("marine.validate"):
+            marine = MarineResponse(**utc_series(payload))
     except ValidationError as e:
         raise ValueError(f"invalid marine api response: {e}")
+    # kept longer while the upstream quota runs low
+    put_model(cache_key, marine, fetched_at, cache_ttl(_CACHE_TTL))
+    return marine
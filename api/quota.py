@@ -0,0 +1,321 @@
+"""
+upstream call budgets and degradation as they run low
+
+open-meteo's free tier allows a fixed number of calls per hour and per day
+(across its apis, from one address); past that it answers 429 until the
+window resets. a QuotaTracker counts every request sent to the upstreams of
+a quota group in utc hourly and daily windows, so we see the limit coming
+instead of finding it through failures:
+
+- counts are shared and survive restarts: each process keeps its own
+  counts in the cache (quota:v1:<group>:<instance>) every few seconds and
+  sums the other entries, so no read-modify-write races between workers.
+- the service degrades as the tightest window runs low:
+    low (under 25% left): forecasts are cached longer and exact-cell
+        refreshes after approximate answers are skipped
+    critical (under 10% left): watched cells are no longer refreshed and
+        uncached locations get approximate answers from nearby cells
+    exhausted (budget spent, or a 429): no calls until the window resets
+        (or the upstream's Retry-After passes); cached answers only
+- projected exhaustion (at the current window's call rate) is reported by
+  GET /admin/quota.
+
+configuration (environment):
+    SURF_QUOTA_OPEN_METEO_HOURLY: calls per utc hour (default 5000, 0: no limit)
+    SURF_QUOTA_OPEN_METEO_DAILY: calls per utc day (default 10000, 0: no limit)
+open-meteo's per-minute limit is better enforced up front by
+SURF_UPSTREAM_RATE (api.scheduler).
+"""
+
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from backend.models import QuotaUsage
+from services.cache import get_cache, put_model
+
+NORMAL = "normal"
+LOW = "low"
+CRITICAL = "critical"
+EXHAUSTED = "exhausted"
+# from least to most degraded
+LEVELS = (NORMAL, LOW, CRITICAL, EXHAUSTED)
+# share of a window's budget left below which each level starts
+_LOW_SHARE = 0.25
+_CRITICAL_SHARE = 0.10
+# cache ttl multiplier per level: fewer refetches of the same cells
+TTL_FACTORS = {NORMAL: 1.0, LOW: 3.0, CRITICAL: 6.0, EXHAUSTED: 12.0}
+
+WINDOWS = {"hourly": 3600, "daily": 86400}
+# upstream -> quota group it spends from
+QUOTA_GROUPS = {
+    "open-meteo-marine": "open-meteo",
+    "open-meteo-weather": "open-meteo",
+}
+# open-meteo free tier
+_DEFAULT_BUDGETS = {"open-meteo": {"hourly": 5000, "daily": 10000}}
+
+_KEY_PREFIX = "quota:v1:"
+_SYNC_SECONDS = 10.0
+# persisted counts outlive the longest window
+_RETENTION = 2 * WINDOWS["daily"]
+# shortest elapsed time a rate is projected from, so the first calls of a
+# window do not project exhaustion within seconds
+_MIN_ELAPSED = 60.0
+# pause after a 429 without a usable Retry-After
+_REJECT_SECONDS = 60.0
+
+
+def _env_budget(group: str, window: str, default: int) -> int:
+    name = f"SURF_QUOTA_{group.upper().replace('-', '_')}_{window.upper()}"
+    try:
+        return max(0, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class QuotaTracker:
+    """
+    calls made to a quota group's upstreams in the current windows
+
+    args:
+        group: quota group, e.g. "open-meteo"
+        budgets: calls allowed per window name ("hourly", "daily"); 0 or a
+            missing window is unlimited
+        clock: wall-clock time source (windows are utc calendar hours and days)
+        persist: share counts through the cache backend
+    """
+
+    def __init__(
+        self,
+        group: str,
+        budgets: dict[str, int],
+        clock: Callable[[], float] = time.time,
+        persist: bool = True,
+    ):
+        unknown = set(budgets) - set(WINDOWS)
+        if unknown:
+            raise ValueError(f"unknown quota windows: {', '.join(sorted(unknown))}")
+        self.group = group
+        self.budgets = {w: budgets.get(w, 0) for w in WINDOWS}
+        self.persist = persist
+        self._clock = clock
+        self._key = f"{_KEY_PREFIX}{group}:{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # calls per "window:start" bucket: this process's, and the sum of the
+        # other processes' (and earlier runs') as of the last sync
+        self._counts: dict[str, int] = {}
+        self._others: dict[str, int] = {}
+        self._rejected_until = 0.0
+        self._synced_at = -math.inf
+        self._syncing = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _start(window: str, now: float) -> int:
+        return int(now // WINDOWS[window] * WINDOWS[window])
+
+    def _buckets(self, now: float) -> dict[str, str]:
+        return {w: f"{w}:{self._start(w, now)}" for w in WINDOWS}
+
+    def record(self, calls: int = 1) -> None:
+        """count requests sent upstream (hedges and retries included)"""
+        now = self._clock()
+        with self._lock:
+            for bucket in self._buckets(now).values():
+                self._counts[bucket] = self._counts.get(bucket, 0) + calls
+        self._maybe_sync(now)
+
+    def reject(self, retry_after: Optional[float] = None) -> None:
+        """
+        the upstream answered 429: stop calling it until retry_after seconds
+        pass (a minute without one)
+        """
+        now = self._clock()
+        pause = _REJECT_SECONDS if retry_after is None else max(1.0, retry_after)
+        with self._lock:
+            self._rejected_until = max(self._rejected_until, now + pause)
+
+    def used(self, window: str) -> int:
+        """calls counted by all processes in the current window"""
+        now = self._clock()
+        self._maybe_sync(now)
+        bucket = self._buckets(now)[window]
+        with self._lock:
+            return self._counts.get(bucket, 0) + self._others.get(bucket, 0)
+
+    def level(self) -> str:
+        """degradation level, one of LEVELS"""
+        now = self._clock()
+        if now < self._rejected_until:
+            return EXHAUSTED
+        share = min(
+            (
+                (budget - self.used(window)) / budget
+                for window, budget in self.budgets.items()
+                if budget
+            ),
+            default=1.0,
+        )
+        if share <= 0:
+            return EXHAUSTED
+        if share < _CRITICAL_SHARE:
+            return CRITICAL
+        if share < _LOW_SHARE:
+            return LOW
+        return NORMAL
+
+    def retry_after(self) -> float:
+        """seconds until calls may resume (0 when not exhausted)"""
+        now = self._clock()
+        waits = [self._rejected_until - now]
+        for window, budget in self.budgets.items():
+            if budget and self.used(window) >= budget:
+                waits.append(self._start(window, now) + WINDOWS[window] - now)
+        return max(0.0, *waits)
+
+    def projected_exhaustion(self, window: str) -> Optional[float]:
+        """
+        when the window's budget runs out at its call rate so far
+
+        returns:
+            utc epoch seconds, or None when unlimited or when the window
+            resets first
+        """
+        budget = self.budgets[window]
+        used = self.used(window)
+        if not budget or not used:
+            return None
+        now = self._clock()
+        if used >= budget:
+            return now
+        start = self._start(window, now)
+        rate = used / max(now - start, _MIN_ELAPSED)
+        eta = now + (budget - used) / rate
+        return eta if eta < start + WINDOWS[window] else None
+
+    def report(self) -> dict:
+        """counts, budgets and projections for metrics"""
+        now = self._clock()
+        windows = {}
+        for window, budget in self.budgets.items():
+            used = self.used(window)
+            eta = self.projected_exhaustion(window)
+            windows[window] = {
+                "used": used,
+                "budget": budget or None,
+                "remaining": max(0, budget - used) if budget else None,
+                "resets_at": _iso(self._start(window, now) + WINDOWS[window]),
+                "projected_exhaustion": None if eta is None else _iso(eta),
+            }
+        etas = [w["projected_exhaustion"] for w in windows.values()]
+        level = self.level()
+        return {
+            "level": level,
+            "ttl_factor": TTL_FACTORS[level],
+            "retry_after": round(self.retry_after(), 1),
+            "projected_exhaustion": min((e for e in etas if e), default=None),
+            "windows": windows,
+        }
+
+    def _maybe_sync(self, now: float) -> None:
+        with self._lock:
+            if self._syncing or now - self._synced_at < _SYNC_SECONDS:
+                return
+            self._syncing = True
+        try:
+            self.sync()
+        finally:
+            with self._lock:
+                self._syncing = False
+
+    def sync(self) -> None:
+        """store this process's counts and reload everyone else's"""
+        now = self._clock()
+        current = set(self._buckets(now).values())
+        with self._lock:
+            self._synced_at = now
+            # earlier windows no longer matter
+            self._counts = {b: n for b, n in self._counts.items() if b in current}
+            own = dict(self._counts)
+        if not self.persist:
+            return
+        put_model(
+            self._key,
+            QuotaUsage(group=self.group, counts=own),
+            now,
+            _RETENTION,
+            notify=False,
+        )
+        others: dict[str, int] = {}
+        try:
+            for key, entry in get_cache().scan(f"{_KEY_PREFIX}{self.group}:"):
+                if key == self._key:
+                    continue
+                usage = QuotaUsage.model_validate_json(entry.value)
+                for bucket, calls in usage.counts.items():
+                    if bucket in current:
+                        others[bucket] = others.get(bucket, 0) + calls
+        except Exception:
+            # the cache is best-effort: keep the last known counts
+            return
+        with self._lock:
+            self._others = others
+
+
+_trackers: dict[str, QuotaTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_quota(group: str) -> QuotaTracker:
+    """the process-wide tracker of a quota group, budgeted from the environment"""
+    with _trackers_lock:
+        tracker = _trackers.get(group)
+        if tracker is None:
+            defaults = _DEFAULT_BUDGETS.get(group, {})
+            budgets = {w: _env_budget(group, w, defaults.get(w, 0)) for w in WINDOWS}
+            tracker = _trackers[group] = QuotaTracker(group, budgets)
+        return tracker
+
+
+def quota_for(upstream: str) -> Optional[QuotaTracker]:
+    """the tracker an upstream spends from, or None if it has no quota"""
+    group = QUOTA_GROUPS.get(upstream)
+    return None if group is None else get_quota(group)
+
+
+def degradation() -> str:
+    """the most degraded level of all quota groups"""
+    groups = sorted(set(QUOTA_GROUPS.values()))
+    return max((get_quota(g).level() for g in groups), key=LEVELS.index)
+
+
+def degraded(level: str = LOW) -> bool:
+    """whether the service is degraded to at least a level"""
+    return LEVELS.index(degradation()) >= LEVELS.index(level)
+
+
+def cache_ttl(ttl: float) -> float:
+    """a forecast cache ttl stretched by the current degradation"""
+    return ttl * TTL_FACTORS[degradation()]
+
+
+def quota_report() -> dict[str, dict]:
+    """report of every quota group, for GET /admin/quota"""
+    groups = sorted(set(QUOTA_GROUPS.values()))
+    return {g: get_quota(g).report() for g in groups}
+
+
+def sync_quotas() -> None:
+    """store the counts of every tracker now (on shutdown)"""
+    with _trackers_lock:
+        trackers = list(_trackers.values())
+    for tracker in trackers:
+        tracker.sync()
@@ -0,0 +1,273 @@
+"""
+priority-aware scheduling of upstream calls
+
+interactive requests (/forecast, the mcp tool), background work (refreshes
+of watched cells, exact-cell refreshes after approximate answers) and bulk
+jobs (exports, catalogue imports) share each upstream's connections and
+rate limit. a Scheduler hands out an upstream's call slots the way a
+Bulkhead does, but per priority class:
+
+- a few slots are reserved for interactive calls, so background and bulk
+  work can never occupy every connection.
+- waiting callers are served by weighted fair queuing (weights 8:2:1), so
+  interactive calls jump the queue without starving bulk jobs outright.
+- when the wait queue is full, an interactive caller evicts the most
+  recently queued lower-priority waiter instead of being rejected; the
+  evicted call fails like any saturated one (stale fallback or error).
+- an optional token bucket (SURF_UPSTREAM_RATE calls per second) is shared
+  the same way: tokens go to the same grants as slots.
+
+the priority of a call comes from the context (see `priority`), like
+cache_only, so it follows work submitted through services.tracing.propagate.
+
+configuration (environment), besides api.upstream's:
+    SURF_UPSTREAM_RATE: calls per second per upstream (default 0: unlimited)
+    SURF_UPSTREAM_RESERVED: slots only interactive calls may use (default a
+        quarter of SURF_UPSTREAM_CONCURRENCY)
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BULK = "bulk"
+
+# classes from highest to lowest priority, and their share of contended slots
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+PRIORITY_WEIGHTS = {INTERACTIVE: 8, BACKGROUND: 2, BULK: 1}
+# longest wait for a slot per class; None uses the scheduler's max_wait.
+# background and bulk work is not latency sensitive and may wait longer
+_CLASS_WAIT: dict[str, Optional[float]] = {
+    INTERACTIVE: None,
+    BACKGROUND: 30.0,
+    BULK: 120.0,
+}
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "surf_priority", default=INTERACTIVE
+)
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """
+    run the upstream calls in this context with a priority class
+
+    raises:
+        ValueError: if the class is unknown
+    """
+    if name not in PRIORITY_WEIGHTS:
+        raise ValueError(
+            f"unknown priority: {name} (expected one of {', '.join(PRIORITIES)})"
+        )
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class _Ticket:
+    """a queued caller"""
+
+    __slots__ = ("granted", "evicted")
+
+    def __init__(self):
+        self.granted = False
+        self.evicted = False
+
+
+class Scheduler:
+    """
+    a Bulkhead whose slots (and rate tokens) are shared by priority class
+
+    args:
+        name: label used in errors and metrics
+        max_concurrent: calls allowed at once
+        max_queue: callers allowed to wait, all classes together
+        max_wait: longest an interactive caller waits for a slot, in seconds
+        reserved: slots only interactive calls may take
+        rate: calls started per second (token bucket); 0 for no limit
+        burst: tokens the bucket holds; defaults to one second of calls
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        max_wait: float,
+        reserved: int = 0,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+    ):
+        if not 0 <= reserved < max_concurrent:
+            raise ValueError(f"reserved slots must be below {max_concurrent}")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.reserved = reserved
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._queues: dict[str, deque[_Ticket]] = {p: deque() for p in PRIORITIES}
+        self._active = {p: 0 for p in PRIORITIES}
+        self._granted = {p: 0 for p in PRIORITIES}
+        self._evicted = {p: 0 for p in PRIORITIES}
+        # weighted fair queuing: virtual finish time of each class's last
+        # grant, and the virtual start of the latest grant
+        self._finish = {p: 0.0 for p in PRIORITIES}
+        self._virtual = 0.0
+        self._cond = threading.Condition()
+
+    def _class_wait(self, name: str) -> float:
+        wait = _CLASS_WAIT[name]
+        return self.max_wait if wait is None else max(wait, self.max_wait)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        take a slot for the context's priority class, waiting at most
+        min(timeout, the class's wait) seconds
+
+        returns:
+            True if a slot was taken (release it in the same context), False
+            if the queue is full, the wait ran out or the caller was evicted
+            by an interactive one
+        """
+        name = current_priority()
+        class_wait = self._class_wait(name)
+        wait_for = class_wait if timeout is None else min(timeout, class_wait)
+        ticket = _Ticket()
+        with self._cond:
+            if self._waiting() >= self.max_queue and not self._evict_for(name):
+                # no queue room: only an immediately free slot will do
+                if not self._can_start(name, queued_ahead=True):
+                    return False
+            if not self._queues[name]:
+                # newly backlogged: its share counts from now, not from
+                # when it last had work
+                self._finish[name] = max(self._finish[name], self._virtual)
+            self._queues[name].append(ticket)
+            self._dispatch()
+            end = time.monotonic() + wait_for
+            while not ticket.granted:
+                remaining = end - time.monotonic()
+                if ticket.evicted or remaining <= 0:
+                    if not ticket.evicted:
+                        self._queues[name].remove(ticket)
+                    return False
+                self._cond.wait(min(remaining, self._token_wait()))
+                self._dispatch()
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._active[current_priority()] -= 1
+            self._dispatch()
+
+    def retry_after(self) -> float:
+        """seconds a rejected caller should wait before trying again"""
+        return max(1.0, self.max_wait)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": sum(self._active.values()),
+                "waiting": self._waiting(),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "reserved": self.reserved,
+                "classes": {
+                    p: {
+                        "active": self._active[p],
+                        "waiting": len(self._queues[p]),
+                        "granted": self._granted[p],
+                        "evicted": self._evicted[p],
+                    }
+                    for p in PRIORITIES
+                },
+            }
+
+    # everything below runs with self._cond held
+
+    def _waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _can_start(self, name: str, queued_ahead: bool = False) -> bool:
+        """whether a call of this class may start now"""
+        active = sum(self._active.values())
+        if active >= self.max_concurrent or not self._has_token():
+            return False
+        if name != INTERACTIVE and active >= self.max_concurrent - self.reserved:
+            return False
+        if queued_ahead and any(self._queues[p] for p in PRIORITIES):
+            return False
+        return True
+
+    def _refill(self) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+
+    def _has_token(self) -> bool:
+        self._refill()
+        return self.rate <= 0 or self._tokens >= 1.0
+
+    def _token_wait(self) -> float:
+        """how long until the next token (forever without a rate limit)"""
+        if self.rate <= 0 or self._tokens >= 1.0:
+            return float("inf")
+        return (1.0 - self._tokens) / self.rate
+
+    def _dispatch(self) -> None:
+        """grant free slots to waiting classes in weighted fair order"""
+        granted = False
+        while True:
+            eligible = [p for p in PRIORITIES if self._queues[p] and self._can_start(p)]
+            if not eligible:
+                break
+            # the class whose next grant would finish first in virtual time
+            # (ties go to the higher priority)
+            name = min(
+                eligible, key=lambda p: self._finish[p] + 1.0 / PRIORITY_WEIGHTS[p]
+            )
+            self._virtual = self._finish[name]
+            self._finish[name] += 1.0 / PRIORITY_WEIGHTS[name]
+            ticket = self._queues[name].popleft()
+            ticket.granted = True
+            self._active[name] += 1
+            self._granted[name] += 1
+            if self.rate > 0:
+                self._tokens -= 1.0
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _evict_for(self, name: str) -> bool:
+        """make queue room for an interactive caller by evicting the most
+        recently queued waiter of the lowest busy class"""
+        if name != INTERACTIVE:
+            return False
+        for lower in reversed(PRIORITIES[1:]):
+            if self._queues[lower]:
+                ticket = self._queues[lower].pop()
+                ticket.evicted = True
+                self._evicted[lower] += 1
+                self._cond.notify_all()
+                return True
+        return False
@@ -0,0 +1,591 @@
+"""
+resilient access to upstream http apis (open-meteo) and nominatim
+
+each upstream gets a circuit breaker that fails fast while it is unhealthy,
+a rolling latency window used to hedge slow requests (a duplicate request
+is fired once the first exceeds the observed p95), a priority-aware
+bulkhead (api.scheduler) bounding concurrent calls with a short wait queue,
+call accounting against the upstream's quota (api.quota), and a small
+last-good response cache served while the breaker is open, the bulkhead is
+full or the quota is spent.
+
+a 429 is not retried: retries would only spend more of the quota. the
+upstream's calls pause for its Retry-After instead.
+
+configuration (environment):
+    SURF_UPSTREAM_CONCURRENCY: concurrent calls per upstream (default 10)
+    SURF_UPSTREAM_QUEUE: callers allowed to wait for a slot (default 50)
+    SURF_UPSTREAM_QUEUE_WAIT: seconds an interactive caller may wait for a
+        slot (default 2)
+    SURF_UPSTREAM_RATE, SURF_UPSTREAM_RESERVED: see api.scheduler
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterator, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api.deadline import Deadline, DeadlineExceeded, effective_timeout
+from api.quota import QuotaTracker, quota_for
+from api.scheduler import Scheduler
+from services.memory import deep_size, register_cache
+
+# breaker: open after this many consecutive failures, probe again after the cooldown
+_FAILURE_THRESHOLD = 5
+_OPEN_SECONDS = 30.0
+
+# hedging: need this many samples before trusting p95; clamp the hedge delay
+_LATENCY_WINDOW = 200
+_MIN_LATENCY_SAMPLES = 20
+_MIN_HEDGE_DELAY = 0.25
+
+# retries: total attempts per call and base of the exponential backoff
+_ATTEMPTS = 3
+_BACKOFF = 0.5
+
+# bulkheads: concurrent calls per upstream, waiting callers and their max wait
+_CONCURRENCY = 10
+_QUEUE_SIZE = 50
+_QUEUE_WAIT = 2.0
+
+_STALE_ENTRIES = 256
+_HEDGE_WORKERS = 32
+
+
+class UpstreamUnavailableError(Exception):
+    """raised when an upstream is failing and no cached response can be served"""
+
+    def __init__(self, upstream: str, retry_after: float, reason: str = ""):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        detail = f": {reason}" if reason else ""
+        super().__init__(f"upstream {upstream} unavailable{detail}")
+
+
+class UpstreamSaturatedError(UpstreamUnavailableError):
+    """raised when an upstream's bulkhead is full (or the request is cache-only)
+    and no cached response can be served"""
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def upstream_concurrency() -> int:
+    """configured concurrent calls per upstream"""
+    return max(1, int(_env_number("SURF_UPSTREAM_CONCURRENCY", _CONCURRENCY)))
+
+
+def pooled_session(pool_size: Optional[int] = None) -> requests.Session:
+    """
+    session whose connection pool matches the bulkhead
+
+    requests' default pool keeps 10 connections per host, so concurrency
+    beyond that (or hedged duplicates) would open and drop connections.
+
+    args:
+        pool_size: connections kept per host; defaults to twice the configured
+            concurrency, leaving room for hedged requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size or 2 * upstream_concurrency())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_cache_only: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "surf_cache_only", default=False
+)
+
+
+@contextmanager
+def cache_only() -> Iterator[None]:
+    """
+    serve upstream calls in this context from cached responses only
+
+    used for requests admitted while the service is overloaded: anything
+    not cached fails fast with UpstreamSaturatedError instead of queueing.
+    """
+    token = _cache_only.set(True)
+    try:
+        yield
+    finally:
+        _cache_only.reset(token)
+
+
+def is_cache_only() -> bool:
+    return _cache_only.get()
+
+
+class Bulkhead:
+    """
+    bounded concurrency with a bounded, time-limited queue of waiting callers
+
+    args:
+        name: label used in errors and metrics
+        max_concurrent: calls allowed at once
+        max_queue: callers allowed to wait for a slot; more are rejected at once
+        max_wait: longest a caller waits for a slot, in seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = _CONCURRENCY,
+        max_queue: int = _QUEUE_SIZE,
+        max_wait: float = _QUEUE_WAIT,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name: str) -> "Bulkhead":
+        """bulkhead sized by the SURF_UPSTREAM_* environment variables"""
+        return cls(
+            name,
+            max_concurrent=upstream_concurrency(),
+            max_queue=max(0, int(_env_number("SURF_UPSTREAM_QUEUE", _QUEUE_SIZE))),
+            max_wait=max(0.0, _env_number("SURF_UPSTREAM_QUEUE_WAIT", _QUEUE_WAIT)),
+        )
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        take a slot, waiting at most min(timeout, max_wait) seconds
+
+        returns:
+            True if a slot was taken (release it), False if the queue is full
+            or the wait ran out
+        """
+        wait_for = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        with self._cond:
+            # waiting callers go first so newcomers cannot starve the queue
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                return True
+            if self._waiting >= self.max_queue or wait_for <= 0:
+                return False
+            end = time.monotonic() + wait_for
+            self._waiting += 1
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._active += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def retry_after(self) -> float:
+        """seconds a rejected caller should wait before trying again"""
+        return max(1.0, self.max_wait)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
+
+
+def upstream_scheduler(name: str) -> Scheduler:
+    """priority-aware bulkhead sized by the SURF_UPSTREAM_* environment variables"""
+    concurrency = upstream_concurrency()
+    reserved = int(_env_number("SURF_UPSTREAM_RESERVED", concurrency // 4))
+    return Scheduler(
+        name,
+        max_concurrent=concurrency,
+        max_queue=max(0, int(_env_number("SURF_UPSTREAM_QUEUE", _QUEUE_SIZE))),
+        max_wait=max(0.0, _env_number("SURF_UPSTREAM_QUEUE_WAIT", _QUEUE_WAIT)),
+        reserved=min(max(0, reserved), concurrency - 1),
+        rate=max(0.0, _env_number("SURF_UPSTREAM_RATE", 0.0)),
+    )
+
+
+class CircuitBreaker:
+    """consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = _FAILURE_THRESHOLD,
+        open_seconds: float = _OPEN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """one of 'closed', 'open' or 'half_open'"""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        """seconds until the breaker lets a probe through (0 when closed)"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            elapsed = time.monotonic() - self._opened_at
+            return max(0.0, self.open_seconds - elapsed)
+
+    def allow(self) -> bool:
+        """return True if a call may go upstream now"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """give back a half-open probe that ended without a verdict"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """rolling window of successful call latencies"""
+
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        return the q-th percentile (0-100) of the window, or None if too few samples
+        """
+        with self._lock:
+            if len(self._samples) < _MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        rank = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[rank]
+
+
+class Upstream:
+    """
+    a named upstream http api with breaker, hedging, retries and stale fallback
+
+    args:
+        name: label used in errors and metrics
+        session: requests-compatible session (anything with .get(url, params, timeout))
+        timeout: per-request timeout in seconds
+        hedge: whether slow requests may be duplicated
+        bulkhead: concurrency limit for calls; defaults to upstream_scheduler
+        quota: call budget the upstream spends from; defaults to its quota
+            group's (api.quota.quota_for), None for upstreams without one
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session: requests.Session,
+        timeout: float,
+        hedge: bool = True,
+        bulkhead: Optional[Union[Bulkhead, Scheduler]] = None,
+        quota: Optional[QuotaTracker] = None,
+    ):
+        self.name = name
+        self.session = session
+        self.timeout = timeout
+        self.hedge = hedge
+        self.bulkhead = bulkhead or upstream_scheduler(name)
+        self.quota = quota or quota_for(name)
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self._stale: OrderedDict[Hashable, Any] = OrderedDict()
+        self._stale_lock = threading.Lock()
+        register_cache(f"upstream:{name}:stale", self.stale_usage)
+        self._executor = ThreadPoolExecutor(
+            max_workers=_HEDGE_WORKERS, thread_name_prefix=f"upstream-{name}"
+        )
+
+    def get_json(
+        self, url: str, params: dict, deadline: Optional[Deadline] = None
+    ) -> Any:
+        """
+        GET url and return the decoded json body
+
+        args:
+            url: endpoint url
+            params: query parameters
+            deadline: optional request deadline capping timeouts and retries
+
+        returns:
+            decoded json payload (possibly a cached one if the upstream is down)
+
+        raises:
+            requests.HTTPError: for non-retryable 4xx responses
+            UpstreamUnavailableError: if the upstream is failing (or its quota
+                is spent) and nothing is cached
+            UpstreamSaturatedError: if the bulkhead is full (or the call is
+                cache-only) and nothing is cached
+            DeadlineExceeded: if the deadline passed and nothing is cached
+        """
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+        if is_cache_only():
+            return self._serve_stale(key, "cache-only", saturated=True)
+        paused = 0.0 if self.quota is None else self.quota.retry_after()
+        if paused > 0:
+            return self._serve_stale(key, "quota exhausted", retry_after=paused)
+        wait = None if deadline is None else deadline.remaining()
+        if not self.bulkhead.acquire(timeout=wait):
+            return self._serve_stale(key, "saturated", saturated=True)
+        try:
+            return self._fetch(key, url, params, deadline)
+        finally:
+            self.bulkhead.release()
+
+    def _fetch(
+        self, key: Hashable, url: str, params: dict, deadline: Optional[Deadline]
+    ) -> Any:
+        """breaker-guarded attempt loop run while holding a bulkhead slot"""
+        if not self.breaker.allow():
+            return self._serve_stale(key, "circuit open")
+
+        last_error: Optional[Exception] = None
+        out_of_time = False
+        for attempt in range(_ATTEMPTS):
+            if attempt:
+                backoff = _BACKOFF * 2 ** (attempt - 1)
+                if deadline is not None and not deadline.allows(backoff):
+                    out_of_time = True
+                    break
+                time.sleep(backoff)
+            try:
+                timeout = effective_timeout(self.timeout, deadline)
+                response = self._hedged_get(url, params, timeout)
+            except DeadlineExceeded:
+                out_of_time = True
+                break
+            except requests.RequestException as e:
+                last_error = e
+                if deadline is not None and deadline.expired:
+                    out_of_time = True
+                    break
+                continue
+            if response.status_code == 429:
+                # over quota: retrying would only dig deeper
+                pause = _retry_after_header(response)
+                if self.quota is not None:
+                    self.quota.reject(pause)
+                self.breaker.release_probe()
+                return self._serve_stale(
+                    key, "rate limited", retry_after=pause or _OPEN_SECONDS
+                )
+            if response.status_code >= 500:
+                last_error = requests.HTTPError(
+                    f"{response.status_code} from {self.name}", response=response
+                )
+                continue
+            # other 4xx are caller errors, not upstream health problems
+            self.breaker.record_success()
+            response.raise_for_status()
+            payload = response.json()
+            self._remember(key, payload)
+            return payload
+
+        # a timeout cut short by our own budget says nothing about upstream health
+        budget_only = out_of_time and (
+            last_error is None or isinstance(last_error, requests.Timeout)
+        )
+        if budget_only:
+            self.breaker.release_probe()
+            return self._serve_stale(key, "deadline exceeded", deadline_hit=True)
+        self.breaker.record_failure()
+        return self._serve_stale(key, str(last_error))
+
+    def _hedged_get(self, url: str, params: dict, timeout: float) -> requests.Response:
+        """send the request, firing a duplicate if it outlives the observed p95"""
+        p95 = self.latency.percentile(95) if self.hedge else None
+        if p95 is None:
+            return self._timed_get(url, params, timeout)
+
+        primary = self._executor.submit(self._timed_get, url, params, timeout)
+        delay = max(p95, _MIN_HEDGE_DELAY)
+        if delay >= timeout:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        pending: set[Future] = {
+            primary,
+            self._executor.submit(self._timed_get, url, params, timeout - delay),
+        }
+        # a 5xx is a failure too: keep waiting for the other request and
+        # return the 5xx (or raise) only if both fail
+        error: Optional[BaseException] = None
+        failed: Optional[requests.Response] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif future.result().status_code >= 500:
+                    failed = future.result()
+                else:
+                    return future.result()
+        if failed is not None:
+            return failed
+        raise error
+
+    def _timed_get(self, url: str, params: dict, timeout: float) -> requests.Response:
+        if self.quota is not None:
+            self.quota.record()
+        start = time.perf_counter()
+        response = self.session.get(url, params=params, timeout=timeout)
+        if response.status_code < 500:
+            self.latency.record(time.perf_counter() - start)
+        return response
+
+    def _remember(self, key: Hashable, payload: Any) -> None:
+        with self._stale_lock:
+            self._stale[key] = payload
+            self._stale.move_to_end(key)
+            while len(self._stale) > _STALE_ENTRIES:
+                self._stale.popitem(last=False)
+
+    def stale_usage(self) -> tuple[int, int]:
+        """(payloads, approximate bytes) kept for stale fallbacks"""
+        with self._stale_lock:
+            return len(self._stale), deep_size(self._stale)
+
+    def _serve_stale(
+        self,
+        key: Hashable,
+        reason: str,
+        deadline_hit: bool = False,
+        saturated: bool = False,
+        retry_after: Optional[float] = None,
+    ) -> Any:
+        with self._stale_lock:
+            if key in self._stale:
+                return self._stale[key]
+        if deadline_hit:
+            raise DeadlineExceeded(f"{self.name}: {reason}")
+        if saturated:
+            raise UpstreamSaturatedError(
+                self.name, retry_after=self.bulkhead.retry_after(), reason=reason
+            )
+        if retry_after is None:
+            retry_after = self.breaker.retry_after()
+        raise UpstreamUnavailableError(
+            self.name, retry_after=retry_after, reason=reason
+        )
+
+
+def _retry_after_header(response: requests.Response) -> Optional[float]:
+    """seconds from a Retry-After header (http dates are ignored)"""
+    value = getattr(response, "headers", {}).get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def guarded_call(
+    breaker: CircuitBreaker,
+    fn: Callable[[], Any],
+    failure_types: tuple[type[BaseException], ...],
+    bulkhead: Optional[Union[Bulkhead, Scheduler]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Any:
+    """
+    run fn behind a circuit breaker, for upstreams not reached via Upstream.get_json
+
+    args:
+        breaker: breaker guarding the upstream
+        fn: zero-argument callable performing the call
+        failure_types: exception types that count as upstream failures
+        bulkhead: optional concurrency limit for the upstream
+        deadline: optional request deadline capping the wait for a bulkhead slot
+
+    returns:
+        whatever fn returns
+
+    raises:
+        UpstreamUnavailableError: if the breaker is open
+        UpstreamSaturatedError: if the bulkhead is full or the call is cache-only
+    """
+    if is_cache_only():
+        raise UpstreamSaturatedError(breaker.name, retry_after=1.0, reason="cache-only")
+    if bulkhead is not None:
+        wait = None if deadline is None else deadline.remaining()
+        if not bulkhead.acquire(timeout=wait):
+            raise UpstreamSaturatedError(
+                breaker.name, retry_after=bulkhead.retry_after(), reason="saturated"
+            )
+    try:
+        if not breaker.allow():
+            raise UpstreamUnavailableError(
+                breaker.name, retry_after=breaker.retry_after(), reason="circuit open"
+            )
+        try:
+            result = fn()
+        except DeadlineExceeded:
+            breaker.release_probe()
+            raise
+        except failure_types:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+    finally:
+        if bulkhead is not None:
+            bulkhead.release()
@@ -2,40 +2,87 @@
 weather forecast api client
 """
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import time
+from typing import Optional
+
 from pydantic import ValidationError
+
+from api.cluster import from_owner
+from api.deadline import Deadline
+from api.quota import cache_ttl
+from api.upstream import Upstream, pooled_session
 from backend.models import WeatherResponse
-from services.helpers import validate_coordinates
+from services.cache import get_model, put_model
+from services.helpers import (
+    forecast_cache_key,
+    grid_cell,
+    upstream_daily_enabled,
+    validate_coordinates,
+    validate_forecast_days,
+)
+from services.localize import utc_series
+from services.tracing import span, traced
 
-# Session with retry: 3 attempts, backoff 1s, retry on 5xx/429 and connection/timeout errors
+_DEFAULT_FORECAST_DAYS = 7
+# open-meteo refreshes hourly; model runs land every few hours
+_CACHE_TTL = 3600
+
+# Shared pooled session; retries, hedging, bulkhead and breaker live in Upstream
 _REQUEST_TIMEOUT = 30
-_RETRY_STRATEGY = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=(500, 502, 503, 504, 429),
-    allowed_methods=("GET",),
-)
-_session = requests.Session()
-_session.mount("https://", HTTPAdapter(max_retries=_RETRY_STRATEGY))
-_session.mount("http://", HTTPAdapter(max_retries=_RETRY_STRATEGY))
+_session = pooled_session()
+_upstream = Upstream("open-meteo-weather", _session, timeout=_REQUEST_TIMEOUT)
 
 
-def weather_forecast(latitude: float, longitude: float) -> WeatherResponse:
+@traced("weather")
+def weather_forecast(
+    latitude: float,
+    longitude: float,
+    forecast_days: int = _DEFAULT_FORECAST_DAYS,
+    deadline: Optional[Deadline] = None,
+    include_daily: Optional[bool] = None,
+) -> WeatherResponse:
     """
     fetch weather forecast data from open-meteo api with validation
     args:
         latitude: latitude coordinate
         longitude: longitude coordinate
+        forecast_days: number of forecast days to request (1-16)
+        deadline: optional request deadline capping timeouts and retries
+        include_daily: request daily= aggregates upstream; defaults to
+            upstream_daily_enabled(). without them `daily` is None and
+            daily values are derived from hourly data
     returns:
         validated weather response
     raises:
-        ValueError: if coordinates are out of valid range
+        ValueError: if coordinates or forecast_days are out of valid range
         requests.HTTPError: if api request fails
+        UpstreamUnavailableError: if the api is failing and no cached response exists
+        DeadlineExceeded: if the deadline passed and no cached response exists
         ValidationError: if api response doesn't match expected schema
     """
     validate_coordinates(latitude, longitude)
+    validate_forecast_days(forecast_days)
+    if include_daily is None:
+        include_daily = upstream_daily_enabled()
+    cache_key = forecast_cache_key(
+        "weather", latitude, longitude, forecast_days, include_daily
+    )
+    cached = get_model(cache_key, WeatherResponse)
+    if cached is not None:
+        return cached
+    # in cluster mode the cell's owner node fetches and caches it
+    owned = from_owner(
+        "weather",
+        cache_key,
+        WeatherResponse,
+        latitude,
+        longitude,
+        {"days": forecast_days, "daily": str(include_daily).lower()},
+        deadline=deadline,
+    )
+    if owned is not None:
+        return owned
+    latitude, longitude = grid_cell(latitude, longitude)
     # open-meteo weather api endpoint
     url = "https://api.open-meteo.com/v1/forecast"
 
@@ -61,20 +108,30 @@ def weather_forecast(latitude: float, longitude: float) -> WeatherResponse:
                 "wind_gusts_10m_max",
             ]
         ),
-        "windspeed_unit": "kn",  # knots for surfing
+        # canonical units and utc instants whatever the caller displays
+        # (services.localize); timezone=auto still reports the spot's zone
+        # and aggregates daily values per local day
+        "wind_speed_unit": "kn",
+        "temperature_unit": "celsius",
+        "timeformat": "unixtime",
         "timezone": "auto",
-        "forecast_days": 7,
+        "forecast_days": forecast_days,
     }
 
-    response = _session.get(url, params=params, timeout=_REQUEST_TIMEOUT)
-    response.raise_for_status()
+    if not include_daily:
+        del params["daily"]
+
+    fetched_at = time.time()
+    with span("weather.fetch"):
+        payload = _upstream.get_json(url, params, deadline=deadline)
 
     # validate response
     try:
-        data = response.json()
+        # copy so the payload kept as a stale fallback is never mutated
+        data = dict(payload)
         # Map Open-Meteo keys to our Pydantic model expectations
-        hourly = data.get("hourly", {})
-        daily = data.get("daily", {})
+        hourly = dict(data.get("hourly", {}))
+        daily = dict(data.get("daily") or {})
         key_map_hourly = {
             "wind_speed_10m": "windspeed_10m",
             "wind_direction_10m": "winddirection_10m",
@@ -93,10 +150,14 @@ def weather_forecast(latitude: float, longitude: float) -> WeatherResponse:
             if src in daily and dst not in daily:
                 daily[dst] = daily[src]
         data["hourly"] = hourly
-        data["daily"] = daily
-        return WeatherResponse(**data)
+        data["daily"] = daily or None
+        with span("weather.validate"):
+            weather = WeatherResponse(**utc_series(data))
     except ValidationError as e:
         raise ValueError(f"invalid weather api response: {e}")
+    # kept longer while the upstream quota runs low
+    put_model(cache_key, weather, fetched_at, cache_ttl(_CACHE_TTL))
+    return weather
 
 
 if __name__ == "__main__":
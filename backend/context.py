@@ -2,11 +2,14 @@
 context formatting utilities for surf forecast models
 """
 
-from datetime import datetime
-from typing import TYPE_CHECKING, Optional
+import math
+from typing import TYPE_CHECKING, Literal, Optional
+
+from services.helpers import compass_upper, shore_wind
+from services.localize import CANONICAL_UNITS, Units
 
 if TYPE_CHECKING:
-    from backend.models import SurfForecast
+    from backend.models import EnsembleForecast, SurfForecast
 
 
 def _fmt(v: Optional[float], decimals: int = 1) -> str:
@@ -23,71 +26,341 @@ def _fmt_int(v: Optional[float]) -> str:
     return f"{int(round(v))}"
 
 
-def format_forecast_to_llm_context(forecast: "SurfForecast") -> str:
+def _shore(forecast: "SurfForecast", wind_from_deg: Optional[float]) -> str:
+    """ "offshore", "onshore" or "cross-shore"; empty when the shore is unknown"""
+    if forecast.shore_facing_deg is None or wind_from_deg is None:
+        return ""
+    return shore_wind(wind_from_deg, forecast.shore_facing_deg)
+
+
+def _suffix(label: str, template: str) -> str:
+    return template.format(label) if label else ""
+
+
+def _knots_word(units: Units) -> str:
+    return "knots" if units.wind == "kn" else units.wind_label
+
+
+def format_forecast_to_llm_context(
+    forecast: "SurfForecast", units: Optional[Units] = None
+) -> str:
     """
     format forecast as concise, human-readable text optimized for llm context
 
     args:
         forecast: SurfForecast model instance
+        units: display units; None for knots, metres and celsius
 
     returns:
         formatted string suitable for llm consumption
     """
-    from services.helpers import degrees_to_compass
-
+    u = units or CANONICAL_UNITS
+    m, kn, deg = u.height_label, u.wind_label, u.temperature_label
+    wind = _knots_word(u)
     cc = forecast.current_conditions
-    lines = [
-        f"# Surf Forecast: {forecast.location}",
-        "",
-        "## Current Conditions",
-        f"Waves: {_fmt(cc.wave_height_m)}m ({_fmt(cc.wave_period_s, 0)}s period)",
-        f"  - Swell: {_fmt(cc.swell_wave_height_m)}m from {degrees_to_compass(cc.swell_wave_direction_deg or 0).upper()}",
-        f"  - Wind waves: {_fmt(cc.wind_wave_height_m)}m",
-        f"Wind: {_fmt_int(cc.wind_speed_knots)} knots from {degrees_to_compass(cc.wind_direction_deg or 0).upper()} (gusts {_fmt_int(cc.wind_gusts_knots)} knots)",
-        f"Temperature: {_fmt_int(cc.temperature_c)}°C",
-        "",
-    ]
+    lines = [f"# Surf Forecast: {forecast.location}", ""]
+    if forecast.unavailable_sources:
+        missing = ", ".join(forecast.unavailable_sources)
+        lines.extend([f"Note: partial forecast, {missing} data unavailable", ""])
+    if forecast.interpolated_from:
+        lines.extend(
+            [
+                "Note: approximate forecast, interpolated from "
+                f"{len(forecast.interpolated_from)} nearby grid cells",
+                "",
+            ]
+        )
+    if forecast.shore_facing_deg is not None:
+        facing = forecast.shore_facing_deg
+        lines.extend([f"Shore faces {compass_upper(facing)} ({facing:.0f}°)", ""])
+    lines.extend(
+        [
+            "## Current Conditions",
+            f"Waves: {_fmt(u.length(cc.wave_height_m))}{m} ({_fmt(cc.wave_period_s, 0)}s period)",
+            f"  - Swell: {_fmt(u.length(cc.swell_wave_height_m))}{m} from {compass_upper(cc.swell_wave_direction_deg or 0)}",
+            f"  - Wind waves: {_fmt(u.length(cc.wind_wave_height_m))}{m}",
+        ]
+    )
+    if "weather" in forecast.unavailable_sources:
+        lines.append("Wind: unavailable")
+    else:
+        lines.extend(
+            [
+                f"Wind: {_fmt_int(u.speed(cc.wind_speed_knots))} {wind} from {compass_upper(cc.wind_direction_deg or 0)} (gusts {_fmt_int(u.speed(cc.wind_gusts_knots))} {wind}"
+                f"{_suffix(_shore(forecast, cc.wind_direction_deg), ', {}')})",
+                f"Temperature: {_fmt_int(u.degrees(cc.temperature_c))}{deg}",
+            ]
+        )
+    lines.append("")
 
     # add hourly forecast if available
     if forecast.hourly_forecast:
         lines.append("## Next Hours")
         for hour in forecast.hourly_forecast:
-            # parse timestamp to get readable time
-            try:
-                if "T" in hour.timestamp:
-                    dt = datetime.fromisoformat(hour.timestamp.replace("Z", "+00:00"))
-                    time_str = dt.strftime("%H:%M")
-                else:
-                    time_str = hour.timestamp[-5:]
-            except Exception:
-                time_str = (
-                    hour.timestamp.split("T")[1]
-                    if "T" in hour.timestamp
-                    else hour.timestamp[-5:]
-                )
-
-            swell_dir = degrees_to_compass(hour.swell_wave_direction_deg or 0).upper()
-            wind_dir = degrees_to_compass(hour.wind_direction_deg or 0).upper()
+            time_str = _hour_label(hour.timestamp)
+            if hour.hours_ahead:
+                time_str = f"{time_str} (+{hour.hours_ahead}h)"
+            swell_dir = compass_upper(hour.swell_wave_direction_deg or 0)
+            wind_dir = compass_upper(hour.wind_direction_deg or 0)
             lines.append(
-                f"{time_str}: {_fmt(hour.wave_height_m)}m waves (swell {_fmt(hour.swell_wave_height_m)}m from {swell_dir}), "
-                f"{_fmt_int(hour.wind_speed_knots)}kn wind from {wind_dir}"
+                f"{time_str}: {_fmt(u.length(hour.wave_height_m))}{m} waves (swell {_fmt(u.length(hour.swell_wave_height_m))}{m} from {swell_dir}), "
+                f"{_fmt_int(u.speed(hour.wind_speed_knots))}{kn} wind from {wind_dir}"
+                f"{_suffix(_shore(forecast, hour.wind_direction_deg), ' ({})')}"
             )
         lines.append("")
 
     lines.append("## 5-Day Forecast")
 
     for day in forecast.forecast_5day:
-        swell_dir = degrees_to_compass(
-            day.swell_wave_direction_dominant_deg or 0
-        ).upper()
-        wind_dir = degrees_to_compass(day.wind_direction_dominant_deg or 0).upper()
+        swell_dir = compass_upper(day.swell_wave_direction_dominant_deg or 0)
+        wind_dir = compass_upper(day.wind_direction_dominant_deg or 0)
         lines.extend(
             [
                 f"{day.date}:",
-                f"  Waves: {_fmt(day.wave_height_max_m)}m max (swell {_fmt(day.swell_wave_height_max_m)}m from {swell_dir})",
-                f"  Wind: {_fmt_int(day.wind_speed_max_knots)} knots from {wind_dir}",
-                f"  Temp: {_fmt_int(day.temperature_min_c)}-{_fmt_int(day.temperature_max_c)}°C",
+                f"  Waves: {_fmt(u.length(day.wave_height_max_m))}{m} max (swell {_fmt(u.length(day.swell_wave_height_max_m))}{m} from {swell_dir})",
+                f"  Wind: {_fmt_int(u.speed(day.wind_speed_max_knots))} {wind} from {wind_dir}"
+                f"{_suffix(_shore(forecast, day.wind_direction_dominant_deg), ' ({})')}",
+                f"  Temp: {_fmt_int(u.degrees(day.temperature_min_c))}-{_fmt_int(u.degrees(day.temperature_max_c))}{deg}",
             ]
         )
+        if day.first_light and day.last_light:
+            lines.append(f"  Light: {day.first_light}-{day.last_light}")
+
+    return "\n".join(lines)
+
 
+Detail = Literal["full", "compact"]
+
+# rough token estimate used for budgets (~4 characters per token for english)
+_CHARS_PER_TOKEN = 4
+
+
+def _hour_label(timestamp: str) -> str:
+    """ "HH:MM" from an iso timestamp without parsing it"""
+    if "T" in timestamp:
+        return timestamp.split("T", 1)[1][:5]
+    return timestamp[-5:]
+
+
+def _dir(degrees: Optional[float]) -> str:
+    return "-" if degrees is None else compass_upper(degrees)
+
+
+def _num(v: Optional[float], decimals: int = 1) -> str:
+    """compact number for tables; '-' when missing"""
+    if v is None:
+        return "-"
+    return f"{v:.{decimals}f}"
+
+
+def estimate_tokens(text: str) -> int:
+    """approximate llm token count of a rendered context"""
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def _surf_score(
+    wave_m: Optional[float], period_s: Optional[float], wind_kn: Optional[float]
+) -> float:
+    """
+    how informative a row is for a surfer: wave energy (height x period),
+    discounted by strong wind; rows with the lowest score are dropped first
+    """
+    energy = (wave_m or 0.0) * (period_s or 8.0)
+    return energy / (1.0 + (wind_kn or 0.0) / 15.0)
+
+
+def _compact_lines(
+    forecast: "SurfForecast",
+    hours: list[int],
+    days: list[int],
+    notes: bool,
+    units: Units = CANONICAL_UNITS,
+) -> list[str]:
+    """compact table layout for the selected hour and day indices"""
+    u = units
+    m, kn, deg = u.height_label, u.wind_label, u.temperature_label.lstrip("°")
+    cc = forecast.current_conditions
+    lines = [f"Surf {forecast.location}"]
+    if forecast.shore_facing_deg is not None:
+        lines.append(f"shore faces {compass_upper(forecast.shore_facing_deg)}")
+    if forecast.unavailable_sources:
+        lines.append(f"partial: {', '.join(forecast.unavailable_sources)} unavailable")
+    if forecast.interpolated_from:
+        lines.append(
+            f"approx: interpolated from {len(forecast.interpolated_from)} cells"
+        )
+    now = (
+        f"now: waves {_num(u.length(cc.wave_height_m))}{m} {_num(cc.wave_period_s, 0)}s, "
+        f"swell {_num(u.length(cc.swell_wave_height_m))}{m} {_dir(cc.swell_wave_direction_deg)}"
+    )
+    if "weather" not in forecast.unavailable_sources:
+        now += (
+            f", wind {_num(u.speed(cc.wind_speed_knots), 0)}{kn} {_dir(cc.wind_direction_deg)}"
+            f"{_suffix(_shore(forecast, cc.wind_direction_deg), ' {}')}"
+            f" g{_num(u.speed(cc.wind_gusts_knots), 0)}, {_num(u.degrees(cc.temperature_c), 0)}{deg}"
+        )
+    lines.append(now)
+
+    if hours:
+        lines.append(f"hour|wave {m}|per s|swell {m}|swell dir|wind {kn}|wind dir")
+        for i in hours:
+            h = forecast.hourly_forecast[i]
+            lines.append(
+                f"{_hour_label(h.timestamp)}|{_num(u.length(h.wave_height_m))}|{_num(h.wave_period_s, 0)}"
+                f"|{_num(u.length(h.swell_wave_height_m))}|{_dir(h.swell_wave_direction_deg)}"
+                f"|{_num(u.speed(h.wind_speed_knots), 0)}|{_dir(h.wind_direction_deg)}"
+            )
+
+    lines.append(
+        f"day|wave max {m}|swell max {m}|swell dir|wind max {kn}|wind dir|temp {deg}"
+    )
+    for i in days:
+        d = forecast.forecast_5day[i]
+        lines.append(
+            f"{d.date[5:]}|{_num(u.length(d.wave_height_max_m))}|{_num(u.length(d.swell_wave_height_max_m))}"
+            f"|{_dir(d.swell_wave_direction_dominant_deg)}|{_num(u.speed(d.wind_speed_max_knots), 0)}"
+            f"|{_dir(d.wind_direction_dominant_deg)}"
+            f"|{_num(u.degrees(d.temperature_min_c), 0)}-{_num(u.degrees(d.temperature_max_c), 0)}"
+        )
+    if notes:
+        lines.append(f"notes: {forecast.surf_quality_notes}")
+    return lines
+
+
+def _render_compact(
+    forecast: "SurfForecast",
+    max_tokens: Optional[int],
+    units: Units = CANONICAL_UNITS,
+) -> str:
+    """
+    compact render, dropping the least informative hours, then days (never
+    the first), then the notes until the text fits max_tokens
+    """
+    hours = list(range(len(forecast.hourly_forecast)))
+    days = list(range(len(forecast.forecast_5day)))
+    notes = True
+
+    def render() -> str:
+        return "\n".join(
+            _compact_lines(forecast, sorted(hours), sorted(days), notes, units)
+        )
+
+    text = render()
+    if max_tokens is None:
+        return text
+
+    # drop order is fixed up front: ascending score, ties broken by later rows
+    hour_order = sorted(
+        hours,
+        key=lambda i: (
+            _surf_score(
+                forecast.hourly_forecast[i].wave_height_m,
+                forecast.hourly_forecast[i].wave_period_s,
+                forecast.hourly_forecast[i].wind_speed_knots,
+            ),
+            -i,
+        ),
+    )
+    day_order = sorted(
+        days[1:],
+        key=lambda i: (
+            _surf_score(
+                forecast.forecast_5day[i].wave_height_max_m,
+                forecast.forecast_5day[i].wave_period_max_s,
+                forecast.forecast_5day[i].wind_speed_max_knots,
+            ),
+            -i,
+        ),
+    )
+    while estimate_tokens(text) > max_tokens:
+        if hour_order:
+            hours.remove(hour_order.pop(0))
+        elif day_order:
+            days.remove(day_order.pop(0))
+        elif notes:
+            notes = False
+        else:
+            # nothing left to drop: hard cut at the budget
+            return text[: max(max_tokens * _CHARS_PER_TOKEN - 1, 0)] + "…"
+        text = render()
+    return text
+
+
+def render_forecast_context(
+    forecast: "SurfForecast",
+    max_tokens: Optional[int] = None,
+    detail: Detail = "full",
+    units: Optional[Units] = None,
+) -> str:
+    """
+    render a forecast for llm context within an optional token budget
+
+    "full" is the prose layout of format_forecast_to_llm_context; if it does
+    not fit max_tokens the compact table layout is used instead.
+
+    args:
+        forecast: SurfForecast model instance
+        max_tokens: approximate token budget (see estimate_tokens); None for no limit
+        detail: "full" or "compact"
+        units: display units; None for knots, metres and celsius
+
+    returns:
+        formatted string suitable for llm consumption
+
+    raises:
+        ValueError: if detail is unknown or max_tokens is not positive
+    """
+    if detail not in ("full", "compact"):
+        raise ValueError(f"unknown detail level: {detail} (expected full or compact)")
+    if max_tokens is not None and max_tokens < 1:
+        raise ValueError(f"max_tokens must be positive, got {max_tokens}")
+
+    units = units or CANONICAL_UNITS
+    text = None
+    if detail == "full":
+        text = format_forecast_to_llm_context(forecast, units)
+        if max_tokens is not None and estimate_tokens(text) > max_tokens:
+            text = None
+    if text is None:
+        text = _render_compact(forecast, max_tokens, units)
+    return text
+
+
+def format_ensemble_context(ensemble: "EnsembleForecast") -> str:
+    """
+    summarize a wave model ensemble per day for llm context
+
+    each day is reported at its peak hour (highest mean wave height): the
+    mean, the spread between models and how much they agree.
+
+    args:
+        ensemble: EnsembleForecast model instance
+
+    returns:
+        formatted string suitable for llm consumption
+    """
+    lines = [
+        f"# Wave Model Ensemble: {ensemble.location}",
+        f"Models: {', '.join(ensemble.models)}",
+    ]
+    if ensemble.unavailable_models:
+        lines.append(f"Unavailable: {', '.join(ensemble.unavailable_models)}")
+    lines.append("date|wave max m|spread m|swell dir|agreement")
+
+    waves = ensemble.variables["wave_height"]
+    swell_dir = ensemble.variables["swell_wave_direction"]
+    days: dict[str, list[int]] = {}
+    for i, t in enumerate(ensemble.time):
+        days.setdefault(t[:10], []).append(i)
+    for date, hours in days.items():
+        known = [i for i in hours if waves.mean[i] is not None]
+        if not known:
+            continue
+        peak = max(known, key=lambda i: waves.mean[i])
+        agreement = waves.agreement[peak]
+        lines.append(
+            f"{date}|{_num(waves.mean[peak])}|±{_num(waves.spread[peak])}"
+            f"|{_dir(swell_dir.mean[peak])}"
+            f"|{'-' if agreement is None else f'{agreement:.0%}'}"
+        )
     return "\n".join(lines)
@@ -0,0 +1,164 @@
+"""
+Binary response encodings negotiated from the Accept header.
+
+JSON stays the default. MessagePack carries the same document as the JSON body,
+and Arrow IPC streams carry batches as one columnar table with a row per
+location and hour. Both need optional packages (`pip install ".[binary]"`) and
+are only offered when those are installed.
+"""
+
+import importlib.util
+import json
+from functools import lru_cache
+from typing import Any, Optional, Sequence, get_args
+
+from pydantic import BaseModel
+
+from backend.models import CurrentConditions, ForecastBatch
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_ALIASES = {"application/x-msgpack": MSGPACK}
+_PACKAGES = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+_HOURLY_FIELDS = tuple(
+    name for name in CurrentConditions.model_fields if name != "timestamp"
+)
+
+
+@lru_cache(maxsize=None)
+def _installed(media_type: str) -> bool:
+    package = _PACKAGES.get(media_type)
+    return package is None or importlib.util.find_spec(package) is not None
+
+
+def available(offered: Sequence[str]) -> list[str]:
+    """The offered media types whose encoder is installed, in order."""
+    return [media_type for media_type in offered if _installed(media_type)]
+
+
+def _ranges(accept: str) -> list[tuple[str, float]]:
+    """(media range, q) pairs of an Accept header."""
+    ranges = []
+    for part in accept.split(","):
+        media, *params = (p.strip() for p in part.split(";"))
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media = media.lower()
+        ranges.append((_ALIASES.get(media, media), q))
+    return ranges
+
+
+def negotiate(accept: Optional[str], offered: Sequence[str]) -> Optional[str]:
+    """
+    Pick the response media type for an Accept header.
+
+    Each offered type takes the q of the most specific range matching it
+    (exact, then type/*, then */*); the highest q wins and ties go to the
+    earlier offered type, so JSON stays the default for `*/*`.
+
+    Returns:
+        The chosen media type, or None if no installed type is acceptable.
+    """
+    candidates = available(offered)
+    if not accept or not accept.strip():
+        return candidates[0] if candidates else None
+    ranges = _ranges(accept)
+    best, best_score = None, (0.0, -1)
+    for candidate in candidates:
+        wildcard = f"{candidate.split('/')[0]}/*"
+        specificity, q = -1, 0.0
+        for media, media_q in ranges:
+            if media == candidate:
+                rank = 2
+            elif media == wildcard:
+                rank = 1
+            elif media == "*/*":
+                rank = 0
+            else:
+                continue
+            if rank > specificity:
+                specificity, q = rank, media_q
+        if q > 0 and (q, specificity) > best_score:
+            best, best_score = candidate, (q, specificity)
+    return best
+
+
+def _msgpack(model: BaseModel) -> bytes:
+    import msgpack
+
+    return msgpack.packb(model.model_dump(mode="json"))
+
+
+def _arrow_type(annotation: Any) -> Any:
+    """Arrow type of a (possibly Optional) scalar model field annotation."""
+    import pyarrow as pa
+
+    types = {bool: pa.bool_(), int: pa.int64(), float: pa.float64(), str: pa.string()}
+    inner = [arg for arg in get_args(annotation) if arg is not type(None)]
+    scalar = inner[0] if len(inner) == 1 else annotation
+    if scalar not in types:
+        raise ValueError(f"no arrow type for {annotation!r}")
+    return types[scalar]
+
+
+def _arrow(batch: ForecastBatch) -> bytes:
+    """Hourly series of every forecast as one table; errors go in the schema metadata."""
+    import pyarrow as pa
+
+    columns: dict[str, list] = {
+        name: [] for name in ("location", "latitude", "longitude", "timestamp")
+    }
+    columns.update({name: [] for name in _HOURLY_FIELDS})
+    for forecast in batch.forecasts:
+        hours = forecast.hourly_forecast
+        columns["location"].extend([forecast.location] * len(hours))
+        columns["latitude"].extend([forecast.latitude] * len(hours))
+        columns["longitude"].extend([forecast.longitude] * len(hours))
+        columns["timestamp"].extend(hour.timestamp for hour in hours)
+        for name in _HOURLY_FIELDS:
+            columns[name].extend(getattr(hour, name) for hour in hours)
+
+    schema = pa.schema(
+        [
+            ("location", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("timestamp", pa.string()),
+        ]
+        + [
+            (name, _arrow_type(CurrentConditions.model_fields[name].annotation))
+            for name in _HOURLY_FIELDS
+        ],
+        metadata={"errors": json.dumps(batch.errors)},
+    )
+    table = pa.Table.from_pydict(columns, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(model: BaseModel, media_type: str) -> bytes:
+    """
+    Serialize a response model as media_type.
+
+    Raises:
+        ValueError: if the model cannot be encoded as media_type
+    """
+    if media_type == JSON:
+        return model.model_dump_json().encode()
+    if media_type == MSGPACK:
+        return _msgpack(model)
+    if media_type == ARROW and isinstance(model, ForecastBatch):
+        return _arrow(model)
+    raise ValueError(f"cannot encode {type(model).__name__} as {media_type}")
@@ -1,16 +1,90 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
 
+from fastapi import FastAPI, Request
+from starlette.concurrency import run_in_threadpool
+
+from api.cluster import get_cluster
+from api.quota import sync_quotas
+from services.alerts import get_engine, refresh_cells, refresh_interval
+from services.memory import get_profiler, profiling_enabled
+from services.suggest import get_index as get_location_index
+from services.updates import get_hub
+from services.snapshot import load_snapshot_fallback, save_snapshot
+from services.tracing import start_trace
 from .router import router
 
 
+async def refresh_watched_cells(interval: float):
+    """Periodically refresh forecasts of cells with alert rules or live subscribers."""
+    while True:
+        await asyncio.sleep(interval)
+        cells = set(get_engine().cells()) | set(get_hub().cells())
+        await run_in_threadpool(refresh_cells, sorted(cells))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm the cache from the last snapshot and start refreshing watched cells
+    on startup; snapshot and store upstream call counts on shutdown.
+    """
+    # fail at startup, not per request, on a cluster configured without a token
+    get_cluster()
+    reader = load_snapshot_fallback()
+    get_engine()
+    get_hub()
+    get_location_index()
+    interval = refresh_interval()
+    refresher = (
+        asyncio.create_task(refresh_watched_cells(interval)) if interval > 0 else None
+    )
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    save_snapshot()
+    sync_quotas()
+    if reader is not None:
+        reader.close()
+
+
 def create_app() -> FastAPI:
     """Application factory for the Surf Forecast API."""
     app = FastAPI(
         title="Surf Forecast API",
         description="Wave and surf conditions for any location.",
         version="1.0.0",
+        lifespan=lifespan,
     )
     app.include_router(router)
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        """Trace sampled requests; ?debug=timing adds a Server-Timing header."""
+        debug = request.query_params.get("debug") == "timing"
+        with start_trace(f"{request.method} {request.url.path}", force=debug) as trace:
+            response = await call_next(request)
+        if debug:
+            response.headers["Server-Timing"] = trace.server_timing()
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
+    if profiling_enabled():
+        profiler = get_profiler()
+        profiler.start()
+
+        @app.middleware("http")
+        async def profile_memory(request: Request, call_next):
+            """Account memory allocated per route (SURF_MEMORY_PROFILE)."""
+            # sampled tracemalloc snapshots and diffs take far longer than a
+            # request; keep them off the event loop
+            token = await run_in_threadpool(profiler.begin)
+            response = await call_next(request)
+            route = request.scope.get("route")
+            path = getattr(route, "path", request.url.path)
+            await run_in_threadpool(profiler.end, token, f"{request.method} {path}")
+            return response
+
     return app
 
 
@@ -2,16 +2,23 @@
 Pydantic models for surf forecast and API response validation.
 """
 
-from typing import Optional
+import uuid
+from typing import TYPE_CHECKING, Any, Literal, Optional
 from datetime import datetime
 
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
+
+if TYPE_CHECKING:
+    from services.localize import Units
+    from services.timeindex import TimeIndex
 
 
 class CurrentConditions(BaseModel):
     """current surf conditions with validation; None = missing data from API"""
 
-    timestamp: str = Field(description="current time in iso format")
+    timestamp: str = Field(
+        description="time in iso format, in the forecast's time zone"
+    )
     wave_height_m: Optional[float] = Field(
         default=None, ge=0, le=30, description="significant wave height in meters"
     )
@@ -45,6 +52,13 @@ class CurrentConditions(BaseModel):
     temperature_c: Optional[float] = Field(
         default=None, ge=-50, le=60, description="air temperature in celsius"
     )
+    daylight: Optional[bool] = Field(
+        default=None,
+        description="whether the hour is between civil dawn and dusk; None if unknown",
+    )
+    hours_ahead: Optional[int] = Field(
+        default=None, ge=0, description="hours after the current hour (0 for now)"
+    )
 
     @field_validator("timestamp")
     @classmethod
@@ -115,6 +129,14 @@ class DailyForecast(BaseModel):
     temperature_min_c: Optional[float] = Field(
         default=None, ge=-50, le=60, description="minimum temperature in celsius"
     )
+    first_light: Optional[str] = Field(
+        default=None,
+        description="civil dawn in local time (HH:MM); None on polar days and nights",
+    )
+    last_light: Optional[str] = Field(
+        default=None,
+        description="civil dusk in local time (HH:MM); None on polar days and nights",
+    )
 
     @field_validator("date")
     @classmethod
@@ -143,8 +165,14 @@ class SurfForecast(BaseModel):
     """complete surf forecast for a location with validation"""
 
     location: str = Field(min_length=1, description="location name")
-    latitude: float = Field(ge=-90, le=90, description="latitude coordinate")
-    longitude: float = Field(ge=-180, le=180, description="longitude coordinate")
+    latitude: float = Field(
+        ge=-90, le=90, description="forecast latitude (snapped to the sea near coasts)"
+    )
+    longitude: float = Field(
+        ge=-180,
+        le=180,
+        description="forecast longitude (snapped to the sea near coasts)",
+    )
     current_conditions: CurrentConditions = Field(description="current surf conditions")
     hourly_forecast: list[CurrentConditions] = Field(
         default=[], description="hourly forecast for next hours"
@@ -155,6 +183,29 @@ class SurfForecast(BaseModel):
     surf_quality_notes: str = Field(
         min_length=1, description="interpretation of conditions for surfing"
     )
+    unavailable_sources: list[str] = Field(
+        default=[],
+        description="upstream sources missing from a partial forecast (e.g. weather)",
+    )
+    interpolated_from: list[str] = Field(
+        default=[],
+        description="grid cells an approximate forecast was interpolated from; "
+        "empty for exact forecasts",
+    )
+    shore_facing_deg: Optional[float] = Field(
+        default=None,
+        description="bearing the nearest shore faces (land to sea), used to label "
+        "wind offshore/onshore; None away from any coast",
+    )
+    timezone: str = Field(
+        default="UTC",
+        description="time zone of the timestamps: iana name, UTC or UTC+hh:mm",
+    )
+    local_timezone: Optional[str] = Field(
+        default=None,
+        description="the spot's own time zone, in which dates and first/last "
+        "light are given",
+    )
 
     @field_validator("forecast_5day")
     @classmethod
@@ -167,22 +218,236 @@ class SurfForecast(BaseModel):
                     raise ValueError("forecast days must be in chronological order")
         return v
 
-    def to_llm_context(self) -> str:
+    def to_llm_context(
+        self,
+        max_tokens: Optional[int] = None,
+        detail: str = "full",
+        units: Optional["Units"] = None,
+    ) -> str:
         """
         format forecast as concise, human-readable text optimized for llm context
+        args:
+            max_tokens: approximate token budget; None for no limit
+            detail: "full" (prose) or "compact" (tables)
+            units: display units (services.localize.Units); None for knots,
+                metres and celsius
         returns:
             formatted string suitable for llm consumption
         """
-        from backend.context import format_forecast_to_llm_context
+        from backend.context import render_forecast_context
+
+        return render_forecast_context(
+            self, max_tokens=max_tokens, detail=detail, units=units
+        )
+
+
+class ForecastBatchRequest(BaseModel):
+    """several locations fetched in one request"""
+
+    cities: list[str] = Field(
+        min_length=1, max_length=50, description="city or location names"
+    )
+    daily_window: Optional[str] = Field(
+        default=None, description="hours used for daily values: all, daylight or dawn"
+    )
+    approximate: bool = Field(
+        default=False,
+        description="interpolate uncached cells from nearby cached cells",
+    )
+    timezone: Optional[str] = Field(
+        default=None,
+        description="time zone of the timestamps (iana name, UTC or UTC+hh:mm); "
+        "default: each spot's own",
+    )
+
+
+class ForecastBatch(BaseModel):
+    """forecasts of a batch request; a failing city does not fail the batch"""
+
+    forecasts: list[SurfForecast] = Field(description="forecasts in request order")
+    errors: dict[str, str] = Field(
+        default={}, description="error message per city that could not be forecast"
+    )
+
+
+class GeocodedLocation(BaseModel):
+    """a geocoding result as cached and exported in spot catalogues"""
+
+    latitude: float = Field(ge=-90, le=90, description="latitude coordinate")
+    longitude: float = Field(ge=-180, le=180, description="longitude coordinate")
+    address: str = Field(min_length=1, description="full location name")
+
+
+class QuotaUsage(BaseModel):
+    """upstream calls one process counted, as cached for the others"""
+
+    group: str = Field(description="quota group, e.g. open-meteo")
+    counts: dict[str, int] = Field(
+        default={}, description="calls per window, keyed 'window:start epoch'"
+    )
+
+
+class ClusterMembership(BaseModel):
+    """base urls of every node of a cluster, this one included"""
+
+    nodes: list[str] = Field(min_length=1, description="node base urls")
+
+
+class LocationSuggestion(BaseModel):
+    """a typeahead match from cached geocodes and the spot catalogue"""
 
-        return format_forecast_to_llm_context(self)
+    name: str = Field(min_length=1, description="query to send to /forecast")
+    address: str = Field(description="full location name")
+    latitude: float = Field(ge=-90, le=90, description="latitude coordinate")
+    longitude: float = Field(ge=-180, le=180, description="longitude coordinate")
+    source: Literal["spot", "geocode"] = Field(
+        description="catalogue spot or previously geocoded query"
+    )
+
+
+class EnsembleSeries(BaseModel):
+    """per-hour statistics of one variable across ensemble members"""
+
+    mean: list[Optional[float]] = Field(
+        description="member mean (circular for directions)"
+    )
+    spread: list[Optional[float]] = Field(
+        description="member standard deviation (circular, in degrees, for directions)"
+    )
+    agreement: list[Optional[float]] = Field(
+        description="0-1: 1 - spread/mean for magnitudes, mean resultant length for directions"
+    )
+
+
+class EnsembleForecast(BaseModel):
+    """hourly marine forecast of several wave models aligned on one time axis"""
+
+    location: str = Field(min_length=1, description="location name")
+    latitude: float = Field(ge=-90, le=90, description="latitude coordinate")
+    longitude: float = Field(ge=-180, le=180, description="longitude coordinate")
+    models: list[str] = Field(min_length=1, description="models that answered")
+    unavailable_models: list[str] = Field(
+        default=[], description="models that failed or missed the deadline"
+    )
+    time: list[str] = Field(description="common hourly time axis (local iso time)")
+    members: list[int] = Field(description="models with data at each hour")
+    variables: dict[str, EnsembleSeries] = Field(
+        description="statistics per hourly marine variable"
+    )
+
+    def to_llm_context(self) -> str:
+        """daily confidence summary for llm consumption"""
+        from backend.context import format_ensemble_context
+
+        return format_ensemble_context(self)
+
+
+# hourly variables alert rules can refer to (marine and weather series)
+ALERT_VARIABLES = (
+    "wave_height",
+    "wave_direction",
+    "wave_period",
+    "wind_wave_height",
+    "wind_wave_direction",
+    "wind_wave_period",
+    "swell_wave_height",
+    "swell_wave_direction",
+    "swell_wave_period",
+    "temperature_2m",
+    "windspeed_10m",
+    "winddirection_10m",
+    "windgusts_10m",
+)
+
+
+class AlertCondition(BaseModel):
+    """threshold on one hourly variable, e.g. swell_wave_height > 1.5"""
+
+    variable: str = Field(description="hourly variable, e.g. swell_wave_height")
+    op: Literal[">", ">=", "<", "<="] = Field(description="comparison operator")
+    value: float = Field(description="threshold in the variable's unit")
+
+    @field_validator("variable")
+    @classmethod
+    def validate_variable(cls, v: str) -> str:
+        if v not in ALERT_VARIABLES:
+            raise ValueError(f"unknown variable: {v}")
+        return v
+
+
+class DirectionWindow(BaseModel):
+    """directions from start to end degrees, clockwise (may wrap through north)"""
+
+    variable: str = Field(description="direction variable, e.g. winddirection_10m")
+    start_deg: float = Field(ge=0, le=360, description="window start in degrees")
+    end_deg: float = Field(ge=0, le=360, description="window end in degrees")
+
+    @field_validator("variable")
+    @classmethod
+    def validate_variable(cls, v: str) -> str:
+        if v not in ALERT_VARIABLES or "direction" not in v:
+            raise ValueError(f"not a direction variable: {v}")
+        return v
+
+
+class AlertRule(BaseModel):
+    """conditions that must all hold for min_hours consecutive hours at a spot"""
+
+    rule_id: str = Field(
+        default_factory=lambda: uuid.uuid4().hex,
+        min_length=1,
+        description="unique rule id (generated when omitted)",
+    )
+    subscriber: str = Field(min_length=1, description="who is notified")
+    latitude: float = Field(ge=-90, le=90, description="latitude coordinate")
+    longitude: float = Field(ge=-180, le=180, description="longitude coordinate")
+    conditions: list[AlertCondition] = Field(default=[], description="thresholds")
+    directions: list[DirectionWindow] = Field(
+        default=[], description="direction windows"
+    )
+    min_hours: int = Field(default=1, ge=1, le=48, description="minimum run length")
+
+    @model_validator(mode="after")
+    def validate_not_empty(self):
+        if not self.conditions and not self.directions:
+            raise ValueError("an alert rule needs at least one condition")
+        return self
+
+
+class Alert(BaseModel):
+    """a run of hours matching an alert rule"""
+
+    rule_id: str
+    subscriber: str
+    cell: str = Field(description="forecast grid cell id")
+    start: str = Field(description="first matching hour (utc iso time)")
+    end: str = Field(description="last matching hour (utc iso time)")
+    hours: int = Field(ge=1, description="number of matching hours")
 
 
 # api response validation models
-class MarineHourly(BaseModel):
-    """validation model for marine api hourly response"""
+class HourlySeries(BaseModel):
+    """hourly series: utc iso times and one list per variable"""
 
     time: list[str]
+    # (the time list it was built from, its TimeIndex)
+    _time_index: Optional[tuple[list[str], Any]] = PrivateAttr(default=None)
+
+    @property
+    def time_index(self) -> "TimeIndex":
+        """epoch index of `time`, parsed once per series (rebuilt if time is replaced)"""
+        from services.timeindex import TimeIndex
+
+        cached = self._time_index
+        if cached is None or cached[0] is not self.time:
+            cached = (self.time, TimeIndex(self.time))
+            self._time_index = cached
+        return cached[1]
+
+
+class MarineHourly(HourlySeries):
+    """validation model for marine api hourly response"""
+
     wave_height: list[Optional[float]]
     wave_direction: list[Optional[float]]
     wave_period: list[Optional[float]]
@@ -213,13 +478,15 @@ class MarineResponse(BaseModel):
     """validation model for marine api response"""
 
     hourly: MarineHourly
-    daily: MarineDaily
+    daily: Optional[MarineDaily] = None
+    # the spot's zone (timezone=auto): hourly times are utc, daily dates local
+    timezone: Optional[str] = None
+    utc_offset_seconds: Optional[int] = None
 
 
-class WeatherHourly(BaseModel):
+class WeatherHourly(HourlySeries):
     """validation model for weather api hourly response"""
 
-    time: list[str]
     temperature_2m: list[Optional[float]]
     windspeed_10m: list[Optional[float]]
     winddirection_10m: list[Optional[float]]
@@ -241,12 +508,19 @@ class WeatherResponse(BaseModel):
     """validation model for weather api response"""
 
     hourly: WeatherHourly
-    daily: WeatherDaily
+    daily: Optional[WeatherDaily] = None
+    # the spot's zone (timezone=auto): hourly times are utc, daily dates local
+    timezone: Optional[str] = None
+    utc_offset_seconds: Optional[int] = None
 
 
 __all__ = [
+    "Alert",
+    "AlertRule",
     "CurrentConditions",
     "DailyForecast",
+    "EnsembleForecast",
+    "GeocodedLocation",
     "SurfForecast",
     "MarineResponse",
     "WeatherResponse",
@@ -2,44 +2,122 @@
 API router for the Surf Forecast API.
 """
 
-from fastapi import APIRouter, HTTPException, Query, status
+import asyncio
+import math
+import os
+from contextlib import nullcontext
+from typing import Any, Callable, Literal, Optional
 
-from backend.models import SurfForecast
-from api.geocoding import geocode_location
-from api.marine import get_marine_forecast
-from api.weather import weather_forecast
-from services.forecast import ForecastService
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from backend.encoding import ARROW, JSON, MSGPACK, available, encode, negotiate
+from backend.models import (
+    AlertRule,
+    ClusterMembership,
+    EnsembleForecast,
+    ForecastBatch,
+    ForecastBatchRequest,
+    LocationSuggestion,
+    SurfForecast,
+)
+from api.cluster import Cluster, get_cluster, serve_peer
+from api.deadline import Deadline, DeadlineExceeded
+from api.quota import quota_report
+from api.scheduler import INTERACTIVE
+from api.upstream import Bulkhead, UpstreamUnavailableError, cache_only
+from services.alerts import get_engine
+from services.ensemble import DEFAULT_MODELS, fetch_ensemble_forecast
+from services.cache import get_cache
+from services.helpers import MAX_FORECAST_DAYS
+from services.localize import get_zone, localize_forecast
+from services.memory import memory_report, profiling_enabled
+from services.pipeline import (
+    LocationNotFoundError,
+    fetch_surf_forecast,
+    fetch_surf_forecasts,
+)
+from services.suggest import get_index as get_location_index
+from services.updates import Subscriber, get_hub
 
 
 router = APIRouter(tags=["forecast"])
 
+# Forecasts run in the threadpool (40 threads by default). Admit a bounded
+# number for the full pipeline and a few more served from cache only, and
+# shed the rest with 429 so bursts never starve the pool or /health.
+_admission = Bulkhead(
+    "forecast", max_concurrent=int(os.getenv("SURF_MAX_INFLIGHT", "24")), max_queue=0
+)
+_cache_only_admission = Bulkhead(
+    "forecast-cache-only",
+    max_concurrent=int(os.getenv("SURF_MAX_CACHE_ONLY", "8")),
+    max_queue=0,
+)
 
-@router.get("/forecast", response_model=SurfForecast)
-def get_forecast(
-    city: str = Query(..., min_length=1, description="City or location name")
-):
-    """
-    Get surf forecast for a location by city name.
+# live update streams: locations per client, and a comment line this often
+# so proxies keep idle streams open
+_MAX_SUBSCRIBED = 20
+_KEEPALIVE_SECONDS = 15.0
 
-    Returns current conditions and 5-day forecast: wave heights, wind, temperature,
-    and surf quality context.
-    """
-    city = city.strip()
-    if not city:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Query parameter 'city' cannot be empty or only spaces.",
-        ) from None
+
+def _unavailable(e: UpstreamUnavailableError) -> HTTPException:
+    """503 telling the client when the failing upstream will be probed again."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Forecast service temporarily unavailable: {e!s}",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+def _overloaded() -> HTTPException:
+    """429 for requests shed before doing any work."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many forecast requests in flight, retry shortly.",
+        headers={"Retry-After": str(math.ceil(_admission.retry_after()))},
+    )
+
+
+def _run(fn: Callable[..., Any], from_cache_only: bool, kwargs: dict) -> Any:
+    """Run a pipeline in a worker thread, cache-only when overloaded."""
+    with cache_only() if from_cache_only else nullcontext():
+        return fn(**kwargs)
+
+
+async def _admitted(response: Response, fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """Run fn in the threadpool under admission control, mapping errors to HTTP."""
+    if _admission.acquire(timeout=0):
+        slot, from_cache_only = _admission, False
+    elif _cache_only_admission.acquire(timeout=0):
+        slot, from_cache_only = _cache_only_admission, True
+        response.headers["X-Cache-Only"] = "1"
+    else:
+        raise _overloaded()
     try:
-        lat, lon, full_name = geocode_location(city)
-    except Exception as e:
+        return await run_in_threadpool(_run, fn, from_cache_only, kwargs)
+    except UpstreamUnavailableError as e:
+        raise _unavailable(e) from e
+    except DeadlineExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Deadline exceeded: {e!s}",
+        ) from e
+    except LocationNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Location not found: {e!s}",
         ) from e
-    try:
-        marine_data = get_marine_forecast(lat, lon)
-        weather_data = weather_forecast(lat, lon)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -50,13 +128,465 @@ def get_forecast(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Forecast service error: {e!s}",
         ) from e
-    forecast = ForecastService.parse_forecast_data(
-        marine_data, weather_data, full_name, lat, lon
+    finally:
+        slot.release()
+
+
+def _media_type(accept: Optional[str], offered: tuple[str, ...]) -> str:
+    """Negotiate the response format before doing any work; 406 if none fits."""
+    media_type = negotiate(accept, offered)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Acceptable formats: {', '.join(available(offered))}",
+        )
+    return media_type
+
+
+def _encoded(model: Any, media_type: str, response: Response) -> Any:
+    """The model itself for JSON, otherwise a binary response keeping our headers."""
+    response.headers["Vary"] = "Accept"
+    if media_type == JSON:
+        return model
+    return Response(
+        encode(model, media_type), media_type=media_type, headers=response.headers
+    )
+
+
+def _clean_city(city: str) -> str:
+    city = city.strip()
+    if not city:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query parameter 'city' cannot be empty or only spaces.",
+        ) from None
+    return city
+
+
+def _zone(tz: Optional[str]) -> Optional[str]:
+    """Validate a requested time zone before doing any work; 400 if unknown."""
+    if tz is not None:
+        try:
+            get_zone(tz)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+            ) from None
+    return tz
+
+
+def _deadline(*budgets_ms: Optional[int]) -> Optional[Deadline]:
+    """The tightest of the given millisecond budgets, if any."""
+    budgets = [ms for ms in budgets_ms if ms is not None]
+    return Deadline.from_ms(min(budgets)) if budgets else None
+
+
+@router.get("/forecast", response_model=SurfForecast)
+async def get_forecast(
+    response: Response,
+    city: str = Query(..., min_length=1, description="City or location name"),
+    deadline_ms: Optional[int] = Query(
+        None,
+        ge=100,
+        le=120_000,
+        description="Overall time budget for this request in milliseconds",
+    ),
+    allow_partial: bool = Query(
+        False,
+        description="Return a marine-only forecast if weather misses the deadline",
+    ),
+    daily_window: Optional[str] = Query(
+        None,
+        description="Hours used for daily values: all, daylight or dawn",
+    ),
+    approximate: bool = Query(
+        False,
+        description="Interpolate from nearby cached cells when this one is not "
+        "cached; the exact cell is refreshed in the background",
+    ),
+    tz: Optional[str] = Query(
+        None,
+        description="Time zone of the timestamps (IANA name, UTC or UTC+hh:mm); "
+        "default: the spot's own",
+    ),
+    debug: Optional[Literal["timing"]] = Query(
+        None,
+        description="'timing' returns a per-stage Server-Timing header",
+    ),
+    x_deadline_ms: Optional[int] = Header(
+        None,
+        ge=100,
+        le=120_000,
+        description="Overall time budget in milliseconds (same as deadline_ms)",
+    ),
+    accept: Optional[str] = Header(None, description=f"{JSON} (default) or {MSGPACK}"),
+):
+    """
+    Get surf forecast for a location by city name.
+
+    Returns current conditions and 5-day forecast: wave heights, wind, temperature,
+    and surf quality context. When the service is saturated the forecast is served
+    from cache only (marked by an `X-Cache-Only` header) or shed with 429.
+    Forecasts are cached in UTC and converted to `tz` per request.
+    """
+    media_type = _media_type(accept, (JSON, MSGPACK))
+    zone = _zone(tz)
+    forecast = await _admitted(
+        response,
+        fetch_surf_forecast,
+        city_name=_clean_city(city),
+        deadline=_deadline(deadline_ms, x_deadline_ms),
+        allow_partial=allow_partial,
+        daily_window=daily_window,
+        approximate=approximate,
+    )
+    return _encoded(localize_forecast(forecast, zone), media_type, response)
+
+
+@router.post("/forecast/batch", response_model=ForecastBatch)
+async def get_forecast_batch(
+    batch: ForecastBatchRequest,
+    response: Response,
+    deadline_ms: Optional[int] = Query(
+        None,
+        ge=100,
+        le=120_000,
+        description="Time budget for the whole batch in milliseconds",
+    ),
+    x_deadline_ms: Optional[int] = Header(
+        None,
+        ge=100,
+        le=120_000,
+        description="Overall time budget in milliseconds (same as deadline_ms)",
+    ),
+    accept: Optional[str] = Header(
+        None,
+        description=f"{JSON} (default), {MSGPACK} or {ARROW} "
+        "(hourly series, one row per location and hour)",
+    ),
+):
+    """
+    Forecasts for several locations in one request.
+
+    Cities that fail are reported in `errors` (in the Arrow stream's schema
+    metadata) without failing the batch.
+    """
+    media_type = _media_type(accept, (JSON, MSGPACK, ARROW))
+    zone = _zone(batch.timezone)
+    forecasts = await _admitted(
+        response,
+        fetch_surf_forecasts,
+        city_names=[_clean_city(city) for city in batch.cities],
+        deadline=_deadline(deadline_ms, x_deadline_ms),
+        daily_window=batch.daily_window,
+        approximate=batch.approximate,
+    )
+    forecasts = forecasts.model_copy(
+        update={"forecasts": [localize_forecast(f, zone) for f in forecasts.forecasts]}
+    )
+    return _encoded(forecasts, media_type, response)
+
+
+@router.get("/forecast/ensemble", response_model=EnsembleForecast)
+async def get_ensemble_forecast(
+    response: Response,
+    city: str = Query(..., min_length=1, description="City or location name"),
+    models: Optional[str] = Query(
+        None,
+        description=f"Comma-separated wave models (default: {','.join(DEFAULT_MODELS)})",
+    ),
+    days: int = Query(7, ge=1, le=MAX_FORECAST_DAYS, description="Forecast days"),
+    deadline_ms: Optional[int] = Query(
+        None,
+        ge=100,
+        le=120_000,
+        description="Overall time budget; models missing it are left out",
+    ),
+    x_deadline_ms: Optional[int] = Header(
+        None,
+        ge=100,
+        le=120_000,
+        description="Overall time budget in milliseconds (same as deadline_ms)",
+    ),
+):
+    """
+    Hourly wave forecast from several models fetched concurrently: mean, spread
+    and agreement between models per hour, to gauge forecast confidence.
+    """
+    return await _admitted(
+        response,
+        fetch_ensemble_forecast,
+        city_name=_clean_city(city),
+        models=[m.strip() for m in models.split(",") if m.strip()] if models else None,
+        forecast_days=days,
+        deadline=_deadline(deadline_ms, x_deadline_ms),
+    )
+
+
+@router.get("/forecast/stream")
+async def stream_forecast_updates(
+    request: Request,
+    response: Response,
+    city: list[str] = Query(
+        ..., min_length=1, max_length=_MAX_SUBSCRIBED, description="Locations to watch"
+    ),
+):
+    """
+    Server-sent events: each location's forecast now, then again whenever a
+    refresh changes it (`event: forecast`, data is a SurfForecast).
+    """
+    subscriber = Subscriber(asyncio.get_running_loop())
+    hub = get_hub()
+    try:
+        for name in dict.fromkeys(_clean_city(c) for c in city):
+            await _admitted(
+                response, hub.subscribe, subscriber=subscriber, city_name=name
+            )
+    except BaseException:
+        hub.unsubscribe_all(subscriber)
+        raise
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    name, data = await asyncio.wait_for(
+                        subscriber.get(), timeout=_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {name}\ndata: {data}\n\n"
+        finally:
+            hub.unsubscribe_all(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            **response.headers,
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.websocket("/forecast/ws")
+async def forecast_updates_socket(websocket: WebSocket):
+    """
+    WebSocket variant of /forecast/stream. Send
+    `{"subscribe": ["Peniche"], "unsubscribe": [...]}`; receive
+    `{"event": "forecast", "data": SurfForecast}` and
+    `{"event": "error", "data": {"city": ..., "detail": ...}}`.
+    """
+    await websocket.accept()
+    subscriber = Subscriber(asyncio.get_running_loop())
+    hub = get_hub()
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            for name in message.get("unsubscribe", []):
+                hub.unsubscribe(subscriber, name)
+            for name in message.get("subscribe", []):
+                if len(subscriber.topics) >= _MAX_SUBSCRIBED:
+                    detail = f"at most {_MAX_SUBSCRIBED} locations per connection"
+                else:
+                    try:
+                        # admission control as for every other route; the
+                        # cache-only header has nowhere to go on a socket
+                        await _admitted(
+                            Response(),
+                            hub.subscribe,
+                            subscriber=subscriber,
+                            city_name=name,
+                        )
+                        continue
+                    except HTTPException as e:
+                        detail = str(e.detail)
+                    except Exception as e:
+                        detail = str(e) or type(e).__name__
+                await websocket.send_json(
+                    {"event": "error", "data": {"city": name, "detail": detail}}
+                )
+
+    async def send():
+        while True:
+            name, data = await subscriber.get()
+            await websocket.send_text(f'{{"event": "{name}", "data": {data}}}')
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # a disconnect (or a malformed message) ends both directions
+        for task in tasks:
+            task.cancel()
+        hub.unsubscribe_all(subscriber)
+
+
+@router.get("/locations/suggest", response_model=list[LocationSuggestion])
+def suggest_locations(
+    q: str = Query(..., min_length=1, max_length=100, description="Text typed so far"),
+    limit: int = Query(8, ge=1, le=16, description="Most suggestions returned"),
+):
+    """
+    Typeahead over known spots and previously geocoded places, ignoring accents
+    and case and tolerating typos. Served from memory, never from Nominatim.
+    """
+    return get_location_index().suggest(q, limit)
+
+
+@router.post("/alerts", response_model=AlertRule, status_code=status.HTTP_201_CREATED)
+def create_alert(rule: AlertRule):
+    """
+    Subscribe to condition alerts at a spot.
+
+    The rule is evaluated whenever the spot's forecast is refreshed, and each
+    new run of matching hours is delivered once to the configured alert sink.
+    """
+    get_engine().add_rule(rule)
+    return rule
+
+
+@router.get("/alerts", response_model=list[AlertRule])
+def list_alerts(
+    subscriber: Optional[str] = Query(None, description="Only this subscriber's rules"),
+):
+    """List alert rules."""
+    return get_engine().rules(subscriber)
+
+
+@router.delete("/alerts/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_alert(rule_id: str):
+    """Remove an alert rule."""
+    if not get_engine().remove_rule(rule_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Alert rule not found: {rule_id}",
+        )
+
+
+@router.get("/internal/{kind}", tags=["cluster"], include_in_schema=False)
+async def cluster_cell(
+    response: Response,
+    kind: Literal["marine", "weather"],
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    days: int = Query(..., ge=1, le=MAX_FORECAST_DAYS),
+    daily: bool = Query(...),
+    model: Optional[str] = Query(None),
+    priority: str = Query(INTERACTIVE),
+    from_cache: bool = Query(False, alias="cache_only"),
+    deadline_ms: Optional[int] = Query(None, ge=100, le=120_000),
+    x_surf_cluster_token: Optional[str] = Header(None),
+):
+    """Serve a grid cell's upstream response to the node that forwarded it."""
+    _cluster(x_surf_cluster_token)
+    params: dict[str, Any] = {"forecast_days": days, "include_daily": daily}
+    if model is not None:
+        params["model"] = model
+    return await _admitted(
+        response,
+        serve_peer,
+        kind=kind,
+        latitude=latitude,
+        longitude=longitude,
+        params=params,
+        priority_name=priority,
+        from_cache=from_cache,
+        deadline=_deadline(deadline_ms),
     )
-    return forecast
+
+
+def _cluster(token: Optional[str]) -> Cluster:
+    """
+    This node's cluster, for callers holding the cluster token: 404 when
+    cluster mode is off, 401 without a token and 403 with a wrong one.
+    """
+    cluster = get_cluster()
+    if cluster is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cluster mode is off (set SURF_CLUSTER_NODES and SURF_CLUSTER_SELF)",
+        )
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing X-Surf-Cluster-Token header",
+        )
+    if not cluster.authorized(token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid cluster token"
+        )
+    return cluster
+
+
+@router.get("/admin/cluster", tags=["admin"])
+def cluster_status(x_surf_cluster_token: Optional[str] = Header(None)):
+    """Cluster nodes, each one's share of grid cells and forwarding counts."""
+    return _cluster(x_surf_cluster_token).stats()
+
+
+@router.put("/admin/cluster", tags=["admin"])
+def update_cluster(
+    membership: ClusterMembership, x_surf_cluster_token: Optional[str] = Header(None)
+):
+    """
+    Replace the cluster membership.
+
+    Send the same list to every node; only the cells of added or removed
+    nodes change owner. Needs the cluster token.
+    """
+    cluster = _cluster(x_surf_cluster_token)
+    try:
+        cluster.set_nodes(membership.nodes)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+    return cluster.stats()
+
+
+@router.get("/admin/quota", tags=["admin"])
+def quota_usage():
+    """
+    Upstream calls, budgets and projected exhaustion per quota group.
+
+    Counts cover all workers in the current utc hour and day; the level is
+    how far forecasts are degraded to save calls (see api.quota).
+    """
+    return quota_report()
+
+
+@router.get("/admin/memory", tags=["admin"])
+def memory_usage(
+    top: int = Query(
+        10, ge=1, le=100, description="Allocation sites and models listed"
+    ),
+    models: bool = Query(
+        False, description="Count live pydantic models (walks the whole heap)"
+    ),
+):
+    """
+    Memory held by caches and stored models, and allocated per request type.
+
+    Only served with SURF_MEMORY_PROFILE=1; `python -m cli.memory_report`
+    prints it as tables.
+    """
+    if not profiling_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Memory profiling is disabled (set SURF_MEMORY_PROFILE=1)",
+        )
+    try:
+        stored = get_cache().scan("")
+    except Exception:
+        stored = None
+    return memory_report(top=top, stored=stored, models=models)
 
 
 @router.get("/health")
-def health():
+async def health():
     """Health check for load balancers and monitoring."""
     return {"status": "ok"}
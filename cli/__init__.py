@@ -0,0 +1,3 @@
+"""
+command line tools for operating the forecast service (run with python -m cli.<tool>)
+"""
@@ -0,0 +1,139 @@
+"""
+build the coastline index used to snap inland geocodes to the sea
+
+derives a global grid of land fractions from the 1 km GLOBE land mask of the
+`global-land-mask` package (pip install ".[coastline]"), keeps the sea cells
+next to land and gives each the bearing its shore faces: the direction
+opposite the distance-weighted pull of the land cells around it.
+
+usage:
+    python -m cli.build_coastline --cell-deg 0.05 --output services/data/coastline.npz
+"""
+
+import argparse
+import sys
+from typing import Optional
+
+import numpy as np
+
+from services.coast import DEFAULT_INDEX_PATH
+
+_DEFAULT_CELL_DEG = 0.05
+# a cell is sea below this land fraction and land from LAND_FRACTION up
+SEA_FRACTION = 0.1
+LAND_FRACTION = 0.5
+# cells around a coastal cell weighing on its shore direction
+_FACING_RADIUS = 3
+# rows of cells aggregated at a time (bounds memory of the 1 km mask)
+_ROW_BLOCK = 300
+
+
+def land_fraction_from_globe(cell_deg: float) -> np.ndarray:
+    """
+    fraction of land in each cell of a global grid, row 0 at 90°n
+
+    raises:
+        RuntimeError: if global-land-mask is not installed
+    """
+    try:
+        from global_land_mask import globe
+    except ImportError as e:
+        raise RuntimeError(
+            "building the coastline index requires the 'global-land-mask' package"
+        ) from e
+    # True over the ocean; lakes count as land
+    mask = globe._mask
+    factor = int(round(cell_deg * mask.shape[0] / 180))
+    rows, cols = mask.shape[0] // factor, mask.shape[1] // factor
+    fraction = np.empty((rows, cols), dtype=np.float32)
+    for start in range(0, rows, _ROW_BLOCK):
+        stop = min(start + _ROW_BLOCK, rows)
+        block = mask[start * factor : stop * factor, : cols * factor]
+        fraction[start:stop] = 1 - block.reshape(
+            stop - start, factor, cols, factor
+        ).mean(axis=(1, 3), dtype=np.float32)
+    return fraction
+
+
+def build_index(fraction: np.ndarray, cell_deg: float) -> dict[str, np.ndarray]:
+    """
+    coastal sea cells and their shore directions from a land-fraction grid
+
+    args:
+        fraction: land fraction per cell, shape (180 / cell_deg, 360 / cell_deg),
+            row 0 at 90°n, column 0 at 180°w
+        cell_deg: grid resolution in degrees
+
+    returns:
+        arrays in the services.coast index format
+    """
+    rows, cols = fraction.shape
+    land = (fraction >= LAND_FRACTION).astype(np.float32)
+    sea = fraction < SEA_FRACTION
+
+    # longitudes wrap around; latitudes are padded with nothing at the poles
+    def shifted(grid: np.ndarray, dr: int, dc: int) -> np.ndarray:
+        out = np.roll(grid, -dc, axis=1)
+        if dr > 0:
+            out = np.vstack([out[dr:], np.zeros((dr, cols), grid.dtype)])
+        elif dr < 0:
+            out = np.vstack([np.zeros((-dr, cols), grid.dtype), out[:dr]])
+        return out
+
+    near_land = np.zeros_like(sea)
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            if dr or dc:
+                near_land |= shifted(land, dr, dc) > 0
+    coastal = sea & near_land
+
+    # pull of surrounding land: east and north components, 1/distance weighted
+    latitudes = 90 - (np.arange(rows) + 0.5) * cell_deg
+    cos_lat = np.cos(np.radians(latitudes))[:, None].astype(np.float32)
+    east = np.zeros((rows, cols), dtype=np.float32)
+    north = np.zeros((rows, cols), dtype=np.float32)
+    for dr in range(-_FACING_RADIUS, _FACING_RADIUS + 1):
+        for dc in range(-_FACING_RADIUS, _FACING_RADIUS + 1):
+            if not (dr or dc):
+                continue
+            dx, dy = dc * cos_lat, np.float32(-dr)
+            norm = np.sqrt(dx * dx + dy * dy)
+            weight = shifted(land, dr, dc) / (norm * norm)
+            east += weight * dx
+            north += weight * dy
+
+    r, c = np.nonzero(coastal)
+    facing = np.degrees(np.arctan2(-east[r, c], -north[r, c])) % 360
+    keys = r.astype(np.int64) * cols + c
+    order = np.argsort(keys)
+    return {
+        "cell_deg": np.float64(cell_deg),
+        "keys": keys[order].astype(np.int32),
+        "facing": np.round(facing[order]).astype(np.int16) % 360,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.build_coastline",
+        description="Build the coastal sea cell index from the GLOBE land mask.",
+    )
+    parser.add_argument(
+        "--cell-deg",
+        type=float,
+        default=_DEFAULT_CELL_DEG,
+        help="grid resolution in degrees (default: 0.05)",
+    )
+    parser.add_argument(
+        "--output", default=DEFAULT_INDEX_PATH, help="index file to write (.npz)"
+    )
+    args = parser.parse_args(argv)
+
+    index = build_index(land_fraction_from_globe(args.cell_deg), args.cell_deg)
+    np.savez_compressed(args.output, **index)
+    print(f"wrote {len(index['keys'])} coastal cells to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
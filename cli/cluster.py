@@ -0,0 +1,111 @@
+"""
+run a local api cluster (api.cluster) for testing
+
+starts one uvicorn process per node on consecutive ports, each with its own
+cache and snapshot files as if on separate machines, and all of them with
+the same SURF_CLUSTER_NODES and SURF_CLUSTER_TOKEN (a random one unless
+set). stop them with ctrl-c.
+
+usage:
+    python -m cli.cluster --nodes 3 --port 8101 --dir ./cluster
+    curl -H "X-Surf-Cluster-Token: $TOKEN" localhost:8101/admin/cluster
+"""
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import time
+from typing import Optional
+
+_DEFAULT_NODES = 3
+_DEFAULT_PORT = 8101
+_DEFAULT_DIR = "./cluster"
+_HOST = "127.0.0.1"
+
+
+def node_env(
+    urls: list[str],
+    index: int,
+    directory: str,
+    token: str,
+    base: Optional[dict] = None,
+) -> dict[str, str]:
+    """environment of the index-th node of a local cluster"""
+    env = dict(os.environ if base is None else base)
+    env.update(
+        {
+            "SURF_CLUSTER_NODES": ",".join(urls),
+            "SURF_CLUSTER_SELF": urls[index],
+            "SURF_CLUSTER_TOKEN": token,
+            "SURF_CACHE_BACKEND": "sqlite",
+            "SURF_CACHE_PATH": os.path.join(directory, f"node-{index}.db"),
+            "SURF_SNAPSHOT_PATH": os.path.join(directory, f"node-{index}.bin"),
+        }
+    )
+    return env
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.cluster",
+        description="Run several Surf Forecast API nodes as a local cluster.",
+    )
+    parser.add_argument(
+        "--nodes", type=int, default=_DEFAULT_NODES, help="number of nodes"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=_DEFAULT_PORT,
+        help=f"port of the first node; the others follow (default: {_DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--dir",
+        default=_DEFAULT_DIR,
+        help=f"directory for the nodes' cache files (default: {_DEFAULT_DIR})",
+    )
+    args = parser.parse_args(argv)
+    if args.nodes < 1:
+        parser.error("--nodes must be at least 1")
+
+    os.makedirs(args.dir, exist_ok=True)
+    ports = [args.port + i for i in range(args.nodes)]
+    urls = [f"http://{_HOST}:{port}" for port in ports]
+    token = os.getenv("SURF_CLUSTER_TOKEN") or secrets.token_urlsafe(24)
+    print(f"cluster token: {token}", file=sys.stderr)
+    processes = []
+    for i, port in enumerate(ports):
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "backend.main:app",
+            "--host",
+            _HOST,
+            "--port",
+            str(port),
+        ]
+        processes.append(
+            subprocess.Popen(command, env=node_env(urls, i, args.dir, token))
+        )
+        print(f"node {i}: {urls[i]}", file=sys.stderr)
+
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(0.5)
+        print("a node exited, stopping the cluster", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+streaming batch export of hourly forecasts to csv or parquet
+
+takes a spot list (names, or a catalogue written by cli.geocode_import
+with coordinates), fetches spots with bounded concurrency through the api
+clients and writes each spot's hourly rows as soon as it arrives, so memory
+stays flat however many spots are exported. responses come from the shared
+cache, so re-running within a model cycle hardly touches the upstreams.
+
+usage:
+    python -m cli.export catalogue.json forecasts.parquet --days 7
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from api.geocoding import geocode_location
+from api.marine import get_marine_forecast
+from api.scheduler import BULK, priority
+from api.weather import weather_forecast
+from backend.models import MarineHourly, MarineResponse, WeatherHourly, WeatherResponse
+from cli.geocode_import import read_names
+from services.coast import snap_to_sea
+from services.helpers import MAX_FORECAST_DAYS
+from services.tracing import propagate
+
+_DEFAULT_WORKERS = 8
+_DEFAULT_DAYS = 7
+
+MARINE_FIELDS = tuple(name for name in MarineHourly.model_fields if name != "time")
+WEATHER_FIELDS = tuple(name for name in WeatherHourly.model_fields if name != "time")
+COLUMNS = ("spot", "latitude", "longitude", "time") + MARINE_FIELDS + WEATHER_FIELDS
+
+
+@dataclass(frozen=True)
+class Spot:
+    """a spot to export; coordinates are geocoded from the name when missing"""
+
+    name: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+def read_spots(path: str) -> list[Spot]:
+    """read spots from a catalogue (json objects with coordinates) or a name list"""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list) and all(
+            isinstance(item, dict) and "latitude" in item for item in data
+        ):
+            return [
+                Spot(item["name"], float(item["latitude"]), float(item["longitude"]))
+                for item in data
+            ]
+    return [Spot(name.strip()) for name in read_names(path) if name.strip()]
+
+
+def hourly_rows(
+    spot: str, lat: float, lon: float, marine: MarineResponse, weather: WeatherResponse
+) -> list[tuple]:
+    """one row per marine hour, with the weather values of the same hour"""
+    weather_index = {t: i for i, t in enumerate(weather.hourly.time)}
+    marine_columns = [getattr(marine.hourly, name) for name in MARINE_FIELDS]
+    weather_columns = [getattr(weather.hourly, name) for name in WEATHER_FIELDS]
+    rows = []
+    for i, t in enumerate(marine.hourly.time):
+        j = weather_index.get(t)
+        rows.append(
+            (spot, lat, lon, t)
+            + tuple(column[i] for column in marine_columns)
+            + tuple(None if j is None else column[j] for column in weather_columns)
+        )
+    return rows
+
+
+def fetch_spot(spot: Spot, days: int) -> list[tuple]:
+    """geocode (if needed) and fetch one spot, returning its hourly rows"""
+    if spot.latitude is None or spot.longitude is None:
+        lat, lon, _ = geocode_location(spot.name)
+    else:
+        lat, lon = spot.latitude, spot.longitude
+    # catalogues hold raw geocoder centroids, often inland: snap those too
+    point = snap_to_sea(lat, lon)
+    lat, lon = point.latitude, point.longitude
+    marine = get_marine_forecast(lat, lon, forecast_days=days)
+    weather = weather_forecast(lat, lon, forecast_days=days)
+    return hourly_rows(spot.name, lat, lon, marine, weather)
+
+
+class CsvSink:
+    """append rows to a csv file"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows: list[tuple]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    write rows to a parquet file, one row group per spot
+
+    requires the optional `pyarrow` package.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("parquet export requires the 'pyarrow' package") from e
+        self._pa = pa
+        fields = [
+            ("spot", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("time", pa.string()),
+        ]
+        fields += [(name, pa.float64()) for name in MARINE_FIELDS + WEATHER_FIELDS]
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: list[tuple]) -> None:
+        columns = list(zip(*rows))
+        self._writer.write_table(
+            self._pa.Table.from_arrays(
+                [self._pa.array(c, type=f.type) for c, f in zip(columns, self._schema)],
+                schema=self._schema,
+            )
+        )
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def open_sink(path: str):
+    """csv or parquet sink chosen by file extension"""
+    if path.endswith(".parquet"):
+        return ParquetSink(path)
+    if path.endswith(".csv"):
+        return CsvSink(path)
+    raise ValueError(f"{path}: expected a .csv or .parquet output file")
+
+
+@dataclass
+class ExportSummary:
+    spots: int = 0
+    failed: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        seconds = self.seconds or 1e-9
+        return (
+            f"exported {self.rows} rows for {self.spots - self.failed}/{self.spots} "
+            f"spots in {self.seconds:.1f}s ({self.spots / seconds:.1f} spots/s, "
+            f"{self.rows / seconds:.0f} rows/s)"
+        )
+
+
+def _completed(
+    spots: Iterable[Spot], days: int, workers: int
+) -> Iterator[tuple[Spot, Future]]:
+    """
+    yield (spot, finished future) in completion order, keeping at most
+    2 x workers spots in flight so a huge list is never materialized
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        pending: dict[Future, Spot] = {}
+        remaining = iter(spots)
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < 2 * workers:
+                spot = next(remaining, None)
+                if spot is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(propagate(fetch_spot), spot, days)] = spot
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+
+def export(
+    spots: Iterable[Spot],
+    sink,
+    days: int = _DEFAULT_DAYS,
+    workers: int = _DEFAULT_WORKERS,
+    errors=sys.stderr,
+) -> ExportSummary:
+    """
+    fetch spots concurrently and stream their hourly rows into sink
+
+    upstream calls run at bulk priority (api.scheduler), behind live requests
+
+    args:
+        spots: spots to export
+        sink: object with write(rows) (CsvSink, ParquetSink)
+        days: forecast horizon in days
+        workers: spots fetched concurrently
+        errors: stream receiving one line per failed spot
+
+    returns:
+        counts and elapsed time
+    """
+    summary = ExportSummary()
+    start = time.perf_counter()
+    with priority(BULK):
+        for spot, future in _completed(spots, days, workers):
+            summary.spots += 1
+            try:
+                rows = future.result()
+            except Exception as e:
+                summary.failed += 1
+                print(f"{spot.name}: {type(e).__name__}: {e}", file=errors)
+                continue
+            if rows:
+                sink.write(rows)
+                summary.rows += len(rows)
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.export",
+        description="Export hourly forecasts for a list of spots to CSV or Parquet.",
+    )
+    parser.add_argument("spots", help="spot names (.csv/.json) or a catalogue .json")
+    parser.add_argument("output", help="output .csv or .parquet file")
+    parser.add_argument(
+        "--days", type=int, default=_DEFAULT_DAYS, help="forecast horizon (1-16)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_DEFAULT_WORKERS,
+        help="spots fetched concurrently (default: 8)",
+    )
+    args = parser.parse_args(argv)
+    if not 1 <= args.days <= MAX_FORECAST_DAYS:
+        parser.error(f"--days must be between 1 and {MAX_FORECAST_DAYS}")
+
+    sink = open_sink(args.output)
+    try:
+        summary = export(
+            read_spots(args.spots), sink, days=args.days, workers=max(1, args.workers)
+        )
+    finally:
+        sink.close()
+    print(summary)
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
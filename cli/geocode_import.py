@@ -0,0 +1,257 @@
+"""
+bulk geocoding import for spot catalogues
+
+reads spot names from a csv (a "name" column, or the first column) or a
+json list (strings or objects with a "name"), geocodes each distinct name
+once under nominatim's one-request-per-second policy and stores the
+results in the geocoding cache. progress is appended to a json lines file
+after every name, so an interrupted run resumes where it stopped; names
+that failed transiently are retried on the next run.
+
+usage:
+    python -m cli.geocode_import spots.csv --catalogue catalogue.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Iterable, Optional
+
+from api.deadline import DeadlineExceeded
+from api.geocoding import geocode_cache_key, geocode_location
+from api.scheduler import BULK, priority
+from api.upstream import UpstreamUnavailableError
+from backend.models import GeocodedLocation
+from services.cache import get_model
+from services.helpers import normalize_location_name
+
+# nominatim usage policy: at most one request per second
+_REQUESTS_PER_SECOND = 1.0
+# waits for an open circuit before giving up on a name for this run
+_UNAVAILABLE_RETRIES = 3
+_MAX_UNAVAILABLE_WAIT = 60.0
+
+# statuses that are final; anything else is retried on the next run
+DONE_STATUSES = ("ok", "not_found")
+
+
+class RateLimiter:
+    """spaces calls at least 1/rate seconds apart"""
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+
+    def wait(self) -> None:
+        now = self._clock()
+        if now < self._next:
+            self._sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def read_names(path: str) -> list[str]:
+    """
+    read spot names from a csv or json file
+
+    raises:
+        ValueError: if the file format is not recognized
+    """
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"{path}: expected a json list of names")
+        return [item["name"] if isinstance(item, dict) else str(item) for item in data]
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return []
+        header = [cell.strip().lower() for cell in rows[0]]
+        if "name" in header:
+            column = header.index("name")
+            rows = rows[1:]
+        else:
+            column = 0
+        return [row[column] for row in rows if len(row) > column]
+    raise ValueError(f"{path}: expected a .csv or .json file")
+
+
+def dedupe(names: Iterable[str]) -> dict[str, str]:
+    """map normalized name -> first spelling seen, dropping blanks and repeats"""
+    distinct: dict[str, str] = {}
+    for name in names:
+        key = normalize_location_name(name)
+        if key and key not in distinct:
+            distinct[key] = name.strip()
+    return distinct
+
+
+def load_progress(path: str) -> dict[str, dict]:
+    """latest record per normalized name from a progress file"""
+    records: dict[str, dict] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a run killed mid-write leaves a partial last line
+                continue
+            records[record["key"]] = record
+    return records
+
+
+def _geocode(name: str, limiter: RateLimiter) -> dict:
+    """geocode one name, honouring the rate limit only for upstream queries"""
+    cached = get_model(geocode_cache_key(name), GeocodedLocation)
+    if cached is not None:
+        return {"status": "ok", "source": "cache", **cached.model_dump()}
+
+    error: Exception = RuntimeError("not attempted")
+    for attempt in range(_UNAVAILABLE_RETRIES):
+        if attempt:
+            # the circuit is open or nominatim is saturated: wait it out
+            retry_after = getattr(error, "retry_after", 1.0)
+            time.sleep(min(max(retry_after, 1.0), _MAX_UNAVAILABLE_WAIT))
+        limiter.wait()
+        try:
+            lat, lon, address = geocode_location(name)
+        except UpstreamUnavailableError as e:
+            error = e
+            continue
+        except ValueError as e:
+            return {"status": "not_found", "error": str(e)}
+        except (OSError, DeadlineExceeded) as e:
+            return {"status": "error", "error": str(e)}
+        return {
+            "status": "ok",
+            "source": "nominatim",
+            "latitude": lat,
+            "longitude": lon,
+            "address": address,
+        }
+    return {"status": "error", "error": str(error)}
+
+
+def import_names(
+    names: Iterable[str],
+    progress_path: str,
+    rate: float = _REQUESTS_PER_SECOND,
+    limiter: Optional[RateLimiter] = None,
+    log: Callable[[str], None] = lambda line: None,
+) -> dict[str, dict]:
+    """
+    geocode names not already done in the progress file, at bulk priority
+    (api.scheduler) so live lookups go first
+
+    args:
+        names: spot names, in any spelling
+        progress_path: json lines file recording one result per name
+        rate: upstream queries per second
+        limiter: rate limiter to use instead of one built from rate
+        log: called with one line per processed name
+
+    returns:
+        latest record per normalized name, including ones from earlier runs
+    """
+    limiter = limiter or RateLimiter(rate)
+    records = load_progress(progress_path)
+    todo = {
+        key: name
+        for key, name in dedupe(names).items()
+        if records.get(key, {}).get("status") not in DONE_STATUSES
+    }
+    with open(progress_path, "a", encoding="utf-8") as progress, priority(BULK):
+        for i, (key, name) in enumerate(todo.items(), 1):
+            record = {"key": key, "name": name, **_geocode(name, limiter)}
+            records[key] = record
+            progress.write(json.dumps(record) + "\n")
+            progress.flush()
+            log(f"[{i}/{len(todo)}] {name}: {record['status']}")
+    return records
+
+
+def write_catalogue(records: Iterable[dict], path: str) -> int:
+    """
+    write geocoded spots to a json or csv catalogue atomically
+
+    returns:
+        number of spots written
+    """
+    fields = ("name", "key", "latitude", "longitude", "address")
+    rows = [
+        {field: record[field] for field in fields}
+        for record in sorted(records, key=lambda r: r["key"])
+        if record["status"] == "ok"
+    ]
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalogue-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(rows)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.geocode_import",
+        description="Geocode a list of spot names into the cache and a catalogue.",
+    )
+    parser.add_argument("source", help="csv or json file of spot names")
+    parser.add_argument(
+        "--catalogue", help="write geocoded spots to this .json or .csv file"
+    )
+    parser.add_argument(
+        "--progress",
+        help="resumable progress file (default: <source>.progress.jsonl)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=_REQUESTS_PER_SECOND,
+        help="upstream queries per second (default: 1, nominatim's limit)",
+    )
+    args = parser.parse_args(argv)
+
+    progress_path = args.progress or f"{args.source}.progress.jsonl"
+    records = import_names(
+        read_names(args.source),
+        progress_path,
+        rate=args.rate,
+        log=lambda line: print(line, file=sys.stderr),
+    )
+    counts: dict[str, int] = {}
+    for record in records.values():
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    print(", ".join(f"{status}: {n}" for status, n in sorted(counts.items())))
+    if args.catalogue:
+        written = write_catalogue(records.values(), args.catalogue)
+        print(f"wrote {written} spots to {args.catalogue}")
+    return 1 if counts.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+memory report of a running api started with SURF_MEMORY_PROFILE=1
+
+prints what each in-process cache holds, cache entries per stored model
+type, the memory each request type leaves allocated and, from the sampled
+snapshot diffs, the source lines that allocated it.
+
+usage:
+    python -m cli.memory_report --url http://localhost:8000 --top 10 --models
+"""
+
+import argparse
+import json
+import sys
+from typing import Optional
+
+import requests
+
+_DEFAULT_URL = "http://localhost:8000"
+_TIMEOUT = 60
+
+
+def _size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def _table(headers: list[str], rows: list[list]) -> list[str]:
+    cells = [headers] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    lines = []
+    for n, row in enumerate(cells):
+        lines.append(
+            "  ".join(
+                value.ljust(width) if i == 0 else value.rjust(width)
+                for i, (value, width) in enumerate(zip(row, widths))
+            )
+        )
+        if n == 0:
+            lines.append("  ".join("-" * width for width in widths))
+    return lines
+
+
+def format_report(report: dict) -> str:
+    """the /admin/memory report as plain-text tables"""
+    lines = [
+        f"traced: {_size(report['traced_bytes'])} "
+        f"(peak {_size(report['traced_peak_bytes'])})"
+        if report.get("tracing")
+        else "traced: tracemalloc is off",
+        "",
+        "caches",
+    ]
+    lines += _table(
+        ["cache", "entries", "bytes"],
+        [
+            [name, stats["entries"], _size(stats["bytes"])]
+            for name, stats in report.get("caches", {}).items()
+        ],
+    )
+    if "stored_models" in report:
+        lines += ["", "stored models"]
+        lines += _table(
+            ["kind", "model", "entries", "bytes"],
+            [
+                [kind, stats["model"] or "-", stats["entries"], _size(stats["bytes"])]
+                for kind, stats in report["stored_models"].items()
+            ],
+        )
+    if "live_models" in report:
+        lines += ["", "live models"]
+        lines += _table(
+            ["model", "instances", "bytes"],
+            [
+                [name, stats["instances"], _size(stats["bytes"])]
+                for name, stats in report["live_models"].items()
+            ],
+        )
+    lines += ["", "requests"]
+    lines += _table(
+        ["request", "count", "avg net", "max net", "sampled"],
+        [
+            [
+                name,
+                stats["requests"],
+                _size(stats["avg_net_bytes"]),
+                _size(stats["max_net_bytes"]),
+                stats["sampled"],
+            ]
+            for name, stats in report.get("requests", {}).items()
+        ],
+    )
+    for name, stats in report.get("requests", {}).items():
+        if stats["top_sites"]:
+            lines += ["", f"allocation sites: {name}"]
+            lines += _table(
+                ["site", "bytes", "blocks"],
+                [
+                    [site["site"], _size(site["bytes"]), site["blocks"]]
+                    for site in stats["top_sites"]
+                ],
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.memory_report",
+        description="Print the memory report of a running Surf Forecast API.",
+    )
+    parser.add_argument(
+        "--url", default=_DEFAULT_URL, help=f"api base url (default: {_DEFAULT_URL})"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="allocation sites and models listed"
+    )
+    parser.add_argument(
+        "--models",
+        action="store_true",
+        help="count live pydantic models (walks the api's whole heap)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the raw report")
+    args = parser.parse_args(argv)
+
+    try:
+        response = requests.get(
+            f"{args.url.rstrip('/')}/admin/memory",
+            params={"top": args.top, "models": str(args.models).lower()},
+            timeout=_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        print(f"cannot reach {args.url}: {e}", file=sys.stderr)
+        return 1
+    if response.status_code == 404:
+        print(
+            "memory profiling is off: start the api with SURF_MEMORY_PROFILE=1",
+            file=sys.stderr,
+        )
+        return 1
+    response.raise_for_status()
+    report = response.json()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,11 @@ import streamlit as st
 from api.geocoding import geocode_location
 from api.marine import get_marine_forecast
 from api.weather import weather_forecast
+from frontend.charts import build_hourly_figure, frame_key, hourly_frame
 from services.forecast import ForecastService
+from services.helpers import MAX_FORECAST_DAYS
+from services.localize import Units, localize_forecast
+from services.suggest import get_index as get_location_index
 
 # SETUP
 st.set_page_config(page_title="Surf Forecast PT", page_icon="🌊", layout="wide")
@@ -72,33 +76,82 @@ PLOTLY_TEMPLATE, WG_TH_BG, _TEXT = use_theme(st.session_state.theme_mode)
 
 st.title("🌊 Surf Forecast")
 st.caption("Dados: Open-Meteo (Marine + Forecast) + Geocoding (Nominatim)")
-fs = None
-ts = None
-spots_to_show = []
+
+
+@st.cache_data(ttl=900, show_spinner=False)
+def load_spot(query: str, days: int):
+    """Geocodifica e busca a previsão completa (cache de 15 min por spot/horizonte)."""
+    lat, lon, full_name = geocode_location(query)
+    marine_data = get_marine_forecast(lat, lon, forecast_days=days)
+    weather_data = weather_forecast(lat, lon, forecast_days=days)
+    return lat, lon, full_name, marine_data, weather_data
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def hourly_figure(forecast_key: tuple, theme: str, _frames: dict):
+    """Figura Plotly em cache por (previsão, tema); _frames não entra no hash."""
+    return build_hourly_figure(_frames, template=PLOTLY_TEMPLATE)
+
 
 # ---------------------------- SIDEBAR CONTROLS ----------------------------
 st.sidebar.header("Localização")
 city_query = st.sidebar.text_input(
-    "Cidade (ex: Carcavelos, Portugal)", value="", help="Digite e pressione Enter"
+    "Cidade (ex: Carcavelos, Portugal)",
+    value="",
+    help="Digite e pressione Enter. Vários spots: separe com ';'",
 )
-if not city_query.strip():
+# typeahead: spots conhecidos e buscas já geocodificadas (sem ir ao Nominatim)
+*previous_spots, typing = city_query.split(";") if city_query else [""]
+suggestions = get_location_index().suggest(typing.strip(), limit=8)
+if suggestions and typing.strip() not in {s.name for s in suggestions}:
+    choice = st.sidebar.selectbox(
+        "Sugestões",
+        suggestions,
+        index=None,
+        format_func=lambda s: s.address,
+        placeholder="Escolha um local conhecido",
+    )
+    if choice is not None:
+        city_query = ";".join([*previous_spots, choice.name])
+days = st.sidebar.slider("Horizonte (dias)", 1, MAX_FORECAST_DAYS, 7)
+# unidades só do texto: os dados ficam em cache em kn, m e °C (UTC)
+units = Units(
+    wind=st.sidebar.selectbox("Vento", ["kn", "kmh", "ms", "mph"]),
+    height=st.sidebar.selectbox("Ondas", ["m", "ft"]),
+    temperature=st.sidebar.selectbox("Temperatura", ["c", "f"]),
+)
+spots_to_show = [q.strip() for q in city_query.split(";") if q.strip()]
+if not spots_to_show:
     st.info("Digite uma cidade na barra lateral para ver a previsão.")
     st.stop()
-try:
-    lat, lon, full_name = geocode_location(city_query.strip())
+
+frames = {}
+texts = {}
+for query in spots_to_show:
+    try:
+        lat, lon, full_name, marine_data, weather_data = load_spot(query, days)
+        forecast = ForecastService.parse_forecast_data(
+            marine_data, weather_data, full_name, lat, lon
+        )
+    except Exception as e:
+        st.error(f"Erro ao obter previsão para '{query}': {e}")
+        continue
     st.success(f"Localização: {full_name} ({lat:.4f}, {lon:.4f})")
-    marine_data = get_marine_forecast(lat, lon)
-    weather_data = weather_forecast(lat, lon)
-    forecast = ForecastService.parse_forecast_data(
-        marine_data, weather_data, full_name, lat, lon
-    )
+    frames[query] = hourly_frame(marine_data, weather_data, forecast.local_timezone)
+    texts[full_name] = localize_forecast(forecast).to_llm_context(units=units)
+
+if not frames:
+    st.stop()
+
+forecast_key = tuple((spot, frame_key(df)) for spot, df in frames.items())
+st.plotly_chart(
+    hourly_figure(forecast_key, st.session_state.theme_mode, frames),
+    use_container_width=True,
+)
+
+for full_name, text in texts.items():
     st.subheader(full_name)
-    text = forecast.to_llm_context()
     st.markdown(
         f'<pre style="color:#000000 !important; background:transparent !important; white-space:pre-wrap; font-family:inherit; font-size:1rem; line-height:1.5;">{html.escape(text)}</pre>',
         unsafe_allow_html=True,
     )
-    st.stop()
-except Exception as e:
-    st.error(f"Erro ao obter previsão: {e}")
-    st.stop()
@@ -0,0 +1,221 @@
+"""
+hourly forecast charts for the streamlit frontend
+
+data is flattened into a DataFrame in one step from the columnar hourly
+series, downsampled server-side and drawn with WebGL traces so long
+horizons with many spots stay responsive in the browser.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from backend.models import MarineResponse, WeatherResponse
+from services.helpers import degrees_to_compass
+from services.localize import local_times
+
+# hourly series pulled from each upstream response
+MARINE_COLUMNS = (
+    "wave_height",
+    "wave_period",
+    "wave_direction",
+    "wind_wave_height",
+    "swell_wave_height",
+    "swell_wave_period",
+    "swell_wave_direction",
+)
+WEATHER_COLUMNS = (
+    "windspeed_10m",
+    "windgusts_10m",
+    "winddirection_10m",
+    "temperature_2m",
+)
+
+# total points per figure shared by all traces of all spots; a 16-day
+# hourly horizon is 384 points, so one spot is never downsampled
+_POINT_BUDGET = 6000
+_MIN_POINTS_PER_TRACE = 96
+
+# (row, column, legend label, unit, direction column for hover or None)
+_TRACES = (
+    (1, "wave_height", "Waves", "m", "wave_direction"),
+    (1, "swell_wave_height", "Swell", "m", "swell_wave_direction"),
+    (1, "wind_wave_height", "Wind waves", "m", None),
+    (2, "wave_period", "Wave period", "s", None),
+    (2, "swell_wave_period", "Swell period", "s", None),
+    (3, "windspeed_10m", "Wind", "kn", "winddirection_10m"),
+    (3, "windgusts_10m", "Gusts", "kn", None),
+)
+_ROW_TITLES = ("Ondas (m)", "Período (s)", "Vento (kn)")
+
+
+def hourly_frame(
+    marine: MarineResponse, weather: WeatherResponse, zone: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    build a time-indexed DataFrame from the hourly marine and weather series
+
+    args:
+        marine: validated marine response
+        weather: validated weather response
+        zone: time zone of the index (services.localize); None keeps utc
+
+    returns:
+        DataFrame indexed by timestamp with one float column per variable;
+        missing upstream values are NaN
+    """
+
+    def index(times: list[str]) -> pd.DatetimeIndex:
+        return pd.to_datetime(local_times(times, zone)[0] if zone else times)
+
+    marine_df = pd.DataFrame(
+        marine.hourly.model_dump(include=set(MARINE_COLUMNS)), dtype=float
+    ).set_index(index(marine.hourly.time))
+    weather_df = pd.DataFrame(
+        weather.hourly.model_dump(include=set(WEATHER_COLUMNS)), dtype=float
+    ).set_index(index(weather.hourly.time))
+    return marine_df.join(weather_df, how="left")
+
+
+def frame_key(df: pd.DataFrame) -> int:
+    """
+    cheap content hash of a forecast frame, used as a figure cache key
+
+    args:
+        df: frame returned by hourly_frame
+
+    returns:
+        integer hash that changes whenever any value or timestamp changes
+    """
+    return int(pd.util.hash_pandas_object(df, index=True).sum())
+
+
+def minmax_downsample_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    pick indices that keep the min and max of each bucket of a series
+
+    keeps peaks visible (a swell maximum is never averaged away) while
+    bounding the number of points sent to the browser. the first and last
+    samples are always kept so the x range does not shrink.
+
+    args:
+        values: 1-d float array, may contain NaN
+        max_points: upper bound on the number of indices returned (at least 1)
+
+    returns:
+        sorted array of indices into values
+
+    raises:
+        ValueError: if max_points is below 1
+    """
+    if max_points < 1:
+        raise ValueError(f"max_points must be at least 1, got {max_points}")
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points == 1:
+        return np.array([n - 1])
+    # the samples between the first and last are split into buckets of equal
+    # size (the last one padded with NaN), each contributing its min and max,
+    # so 2 + 2 * buckets <= max_points
+    buckets = (max_points - 2) // 2
+    if not buckets:
+        return np.array([0, n - 1])
+    inner = values[1 : n - 1]
+    size = -(-len(inner) // buckets)
+    body = np.full(buckets * size, np.nan)
+    body[: len(inner)] = inner
+    body = body.reshape(buckets, size)
+    missing = np.isnan(body)
+    offsets = 1 + np.arange(buckets) * size
+    lo = np.argmin(np.where(missing, np.inf, body), axis=1) + offsets
+    hi = np.argmax(np.where(missing, -np.inf, body), axis=1) + offsets
+    # an all-padding bucket points past the series: it folds into the last sample
+    idx = np.minimum(np.concatenate(([0], lo, hi, [n - 1])), n - 1)
+    return np.unique(idx)
+
+
+def points_per_trace(n_spots: int) -> int:
+    """
+    split the figure point budget across traces and spots
+
+    args:
+        n_spots: number of spots drawn in the same figure
+
+    returns:
+        maximum points per trace
+    """
+    per_trace = _POINT_BUDGET // max(1, n_spots * len(_TRACES))
+    return max(_MIN_POINTS_PER_TRACE, per_trace)
+
+
+def build_hourly_figure(
+    frames: dict[str, pd.DataFrame],
+    template: str = "plotly_white",
+    max_points: Optional[int] = None,
+) -> go.Figure:
+    """
+    build the hourly wave / period / wind figure for one or more spots
+
+    args:
+        frames: mapping of spot label to frame returned by hourly_frame
+        template: plotly template name (from use_theme)
+        max_points: points per trace; defaults to points_per_trace(len(frames))
+
+    returns:
+        plotly figure using WebGL (Scattergl) traces
+    """
+    if max_points is None:
+        max_points = points_per_trace(len(frames))
+    multi = len(frames) > 1
+    fig = make_subplots(
+        rows=3,
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.06,
+        subplot_titles=_ROW_TITLES,
+    )
+    for spot, df in frames.items():
+        x = df.index.to_numpy()
+        for row, column, label, unit, direction_column in _TRACES:
+            if column not in df:
+                continue
+            y = df[column].to_numpy()
+            if np.isnan(y).all():
+                continue
+            idx = minmax_downsample_indices(y, max_points)
+            hover = f"%{{y:.1f}} {unit}"
+            customdata = None
+            if direction_column is not None and direction_column in df:
+                directions = df[direction_column].to_numpy()[idx]
+                customdata = [
+                    degrees_to_compass(d).upper() if not np.isnan(d) else "N/A"
+                    for d in directions
+                ]
+                hover += " from %{customdata}"
+            name = f"{spot} · {label}" if multi else label
+            fig.add_trace(
+                go.Scattergl(
+                    x=x[idx],
+                    y=y[idx],
+                    mode="lines",
+                    name=name,
+                    legendgroup=spot if multi else label,
+                    customdata=customdata,
+                    hovertemplate=f"{hover}<extra>{name}</extra>",
+                    connectgaps=False,
+                ),
+                row=row,
+                col=1,
+            )
+    fig.update_layout(
+        template=template,
+        height=720,
+        hovermode="x unified",
+        margin=dict(l=40, r=20, t=40, b=30),
+        legend=dict(orientation="h", yanchor="bottom", y=1.04, x=0),
+    )
+    return fig
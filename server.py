@@ -13,11 +13,15 @@ how to use the tool:
 mcp server --url http://localhost:8000 --tool get_surf_forecast --args "city_name"
 """
 
+from typing import Optional
+
 from fastmcp import FastMCP
-from api.geocoding import geocode_location
-from api.marine import get_marine_forecast
-from api.weather import weather_forecast
-from services import ForecastService
+from api.deadline import Deadline
+from services.ensemble import fetch_ensemble_forecast
+from services.localize import Units, get_zone, localize_forecast
+from services.pipeline import fetch_surf_forecast
+from services.snapshot import load_snapshot_fallback, save_snapshot
+from services.tracing import format_breakdown, span, start_trace
 
 # create server
 mcp = FastMCP("Surf Forecast Server")
@@ -73,13 +77,27 @@ def analyze_surf_conditions(location: str) -> str:
 
 
 @mcp.tool()
-def get_surf_forecast(city_name: str) -> str:
+def get_surf_forecast(
+    city_name: str,
+    deadline_seconds: Optional[float] = None,
+    allow_partial: bool = False,
+    daily_window: Optional[str] = None,
+    debug_timing: bool = False,
+    max_tokens: Optional[int] = None,
+    detail: str = "full",
+    ensemble: bool = False,
+    approximate: bool = False,
+    wind_unit: str = "kn",
+    height_unit: str = "m",
+    temperature_unit: str = "c",
+    timezone: Optional[str] = None,
+) -> str:
     """
     get surf forecast for a location by city name.
 
     returns current conditions and 5-day forecast including:
     - wave heights (total, swell, wind waves) with directions
-    - wind speed and direction (in knots) with gusts
+    - wind speed and direction (knots by default) with gusts
     - air temperature
     - surf quality assessment
 
@@ -88,26 +106,65 @@ def get_surf_forecast(city_name: str) -> str:
 
     args:
         city_name: name of the city/location (e.g., "livorno", "san diego", "biarritz")
+        deadline_seconds: optional overall time budget for the call
+        allow_partial: if weather misses the deadline, return waves only
+            (wind marked unavailable) instead of failing
+        daily_window: hours used for the daily summaries: "all" (default),
+            "daylight" (civil dawn to dusk at the spot) or "dawn" (dawn
+            patrol, first light to three hours after sunrise)
+        debug_timing: append a per-stage timing breakdown to the output
+        max_tokens: approximate token budget for the text; the least
+            informative hours and days are dropped to fit
+        detail: "full" (prose) or "compact" (tables, fewest tokens)
+        ensemble: append a multi-model wave ensemble summary (per-day spread
+            and agreement between models) to gauge forecast confidence
+        approximate: answer instantly from nearby cached grid cells when the
+            spot itself is not cached (the text says so)
+        wind_unit: "kn" (default), "kmh", "ms" or "mph"
+        height_unit: "m" (default) or "ft"
+        temperature_unit: "c" (default) or "f"
+        timezone: time zone of the times in the text (iana name such as
+            "Europe/Lisbon", "UTC" or "UTC+05:30"); default: the spot's own
 
     returns:
         formatted surf forecast text optimized for llm consumption
     """
-    # geocode the location
-    latitude, longitude, full_location = geocode_location(city_name)
-
-    # fetch marine and weather forecast data
-    marine_data = get_marine_forecast(latitude, longitude)
-    weather_data = weather_forecast(latitude, longitude)
-
-    # parse and structure the data
-    forecast = ForecastService.parse_forecast_data(
-        marine_data, weather_data, full_location, latitude, longitude
-    )
-
-    # return as llm-optimized text format
-    return forecast.to_llm_context()
+    deadline = Deadline(deadline_seconds) if deadline_seconds is not None else None
+    # validated before any upstream call
+    units = Units(wind=wind_unit, height=height_unit, temperature=temperature_unit)
+    if timezone is not None:
+        get_zone(timezone)
+
+    with start_trace("mcp get_surf_forecast", force=debug_timing) as trace:
+        # geocode, fetch marine and weather data and parse into a forecast
+        forecast = fetch_surf_forecast(
+            city_name,
+            deadline=deadline,
+            allow_partial=allow_partial,
+            daily_window=daily_window,
+            approximate=approximate,
+        )
+
+        # return as llm-optimized text format
+        with span("to_llm_context"):
+            text = localize_forecast(forecast, timezone).to_llm_context(
+                max_tokens=max_tokens, detail=detail, units=units
+            )
+
+        if ensemble:
+            members = fetch_ensemble_forecast(city_name, deadline=deadline)
+            text = f"{text}\n\n{members.to_llm_context()}"
+
+    if debug_timing:
+        text = f"{text}\n\n{format_breakdown(trace)}"
+    return text
 
 
 if __name__ == "__main__":
-    # start the FastMCP server
-    mcp.run()
+    # warm the cache from the last snapshot, start the FastMCP server,
+    # and snapshot the cache again when it stops
+    load_snapshot_fallback()
+    try:
+        mcp.run()
+    finally:
+        save_snapshot()
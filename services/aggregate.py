@@ -0,0 +1,192 @@
+"""
+daily aggregates computed locally from hourly series
+
+the upstream daily= variables are maxima, minima and dominant directions of
+the hourly data we already download, so they can be derived here in one
+vectorized pass, and restricted to hour windows (daylight, dawn patrol)
+the upstream cannot offer. when the location is known, the named windows
+follow the sun (services.solar) instead of fixed clock hours, the utc
+hourly times are grouped by the spot's local days (services.localize) and
+each day gets its first and last light.
+"""
+
+from typing import Optional, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from backend.models import DailyForecast
+from services.localize import date_offsets, local_times, spot_zone
+from services.solar import SOLAR_WINDOWS, first_and_last_light, light_mask
+
+# named hour windows [start, end) of the series' clock, used when the
+# location is unknown; otherwise the solar window of the same name applies
+DAILY_WINDOWS: dict[str, tuple[int, int]] = {
+    "all": (0, 24),
+    "daylight": (6, 20),
+    "dawn": (5, 9),
+}
+
+Window = Union[str, tuple[int, int], None]
+# (latitude, longitude, time zone or None) of a utc series; None uses the
+# nominal zone of the longitude
+Location = tuple[float, float, Optional[str]]
+
+# DailyForecast field -> (hourly field, reduction)
+MARINE_AGGREGATES = {
+    "wave_height_max_m": ("wave_height", "max"),
+    "swell_wave_height_max_m": ("swell_wave_height", "max"),
+    "wind_wave_height_max_m": ("wind_wave_height", "max"),
+    "wave_direction_dominant_deg": ("wave_direction", "direction"),
+    "swell_wave_direction_dominant_deg": ("swell_wave_direction", "direction"),
+    "wave_period_max_s": ("wave_period", "max"),
+    "swell_wave_period_max_s": ("swell_wave_period", "max"),
+}
+WEATHER_AGGREGATES = {
+    "wind_speed_max_knots": ("windspeed_10m", "max"),
+    "wind_direction_dominant_deg": ("winddirection_10m", "direction"),
+    "wind_gusts_max_knots": ("windgusts_10m", "max"),
+    "temperature_max_c": ("temperature_2m", "max"),
+    "temperature_min_c": ("temperature_2m", "min"),
+}
+
+
+def resolve_window(window: Window) -> tuple[int, int]:
+    """
+    turn a window name or (start, end) hour tuple into hour bounds
+
+    raises:
+        ValueError: if the name is unknown or the bounds are invalid
+    """
+    if window is None:
+        return DAILY_WINDOWS["all"]
+    if isinstance(window, str):
+        if window not in DAILY_WINDOWS:
+            raise ValueError(
+                f"unknown daily window: {window} (expected one of {', '.join(DAILY_WINDOWS)})"
+            )
+        return DAILY_WINDOWS[window]
+    start, end = window
+    if not 0 <= start < end <= 24:
+        raise ValueError(f"invalid daily window: {window}")
+    return start, end
+
+
+def _reduce(
+    values: np.ndarray, starts: np.ndarray, how: str, decimals: int
+) -> list[Optional[float]]:
+    """reduce sorted, NaN-masked values per day group"""
+    if how == "direction":
+        radians = np.deg2rad(values)
+        valid = ~np.isnan(radians)
+        sin = np.add.reduceat(np.where(valid, np.sin(radians), 0.0), starts)
+        cos = np.add.reduceat(np.where(valid, np.cos(radians), 0.0), starts)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        result = np.mod(np.rad2deg(np.arctan2(sin, cos)), 360.0)
+        result[counts == 0] = np.nan
+        decimals = 0
+    elif how == "max":
+        result = np.fmax.reduceat(values, starts)
+    else:
+        result = np.fmin.reduceat(values, starts)
+    result = np.round(result, decimals)
+    return [None if v != v else v for v in result.tolist()]
+
+
+def aggregate_series(
+    series: BaseModel,
+    fields: dict[str, tuple[str, str]],
+    window: Window = None,
+    location: Optional[Location] = None,
+) -> dict[str, dict[str, Optional[float]]]:
+    """
+    aggregate an hourly series model per day
+
+    args:
+        series: hourly model with a `time` list and one list per variable
+        fields: output field -> (hourly field, "max" | "min" | "direction")
+        window: hour window name or (start, end) tuple; None means the whole day
+        location: where the (utc) series is; days are then the spot's local
+            days and named windows follow the sun
+
+    returns:
+        mapping of date (yyyy-mm-dd) to output field values
+    """
+    start_hour, end_hour = resolve_window(window)
+    index = getattr(series, "time_index", None)
+    times = (
+        index.datetimes
+        if index is not None
+        else np.array(series.time, dtype="datetime64[m]")
+    )
+    if times.size == 0:
+        return {}
+    offsets = None
+    if location is not None:
+        latitude, longitude, zone = location
+        times, offsets = local_times(times, zone or spot_zone(None, None, longitude))
+    days = times.astype("datetime64[D]")
+    if offsets is not None and isinstance(window, str) and window in SOLAR_WINDOWS:
+        in_window = light_mask(times, latitude, longitude, offsets, window=window)
+    else:
+        hours = (times - days).astype("timedelta64[h]").astype(np.int64)
+        in_window = (hours >= start_hour) & (hours < end_hour)
+
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    dates = np.datetime_as_string(days[starts], unit="D").tolist()
+
+    columns = {}
+    for out_field, (hourly_field, how) in fields.items():
+        raw = np.array(getattr(series, hourly_field), dtype=np.float64)
+        masked = np.where(in_window, raw, np.nan)
+        columns[out_field] = _reduce(masked, starts, how, decimals=2)
+
+    return {
+        date: {name: values[i] for name, values in columns.items()}
+        for i, date in enumerate(dates)
+    }
+
+
+def daily_from_hourly(
+    marine_hourly: BaseModel,
+    weather_hourly: Optional[BaseModel] = None,
+    window: Window = None,
+    days: Optional[int] = None,
+    location: Optional[Location] = None,
+) -> list[DailyForecast]:
+    """
+    build DailyForecast rows from hourly marine and weather series
+
+    args:
+        marine_hourly: validated marine hourly series
+        weather_hourly: validated weather hourly series, or None if unavailable
+        window: hour window name or (start, end) tuple
+        days: maximum number of days to return
+        location: (latitude, longitude, time zone) of the utc series; days
+            are then local, named windows follow the sun and days get first
+            and last light
+
+    returns:
+        chronological list of DailyForecast
+    """
+    marine = aggregate_series(marine_hourly, MARINE_AGGREGATES, window, location)
+    weather = (
+        aggregate_series(weather_hourly, WEATHER_AGGREGATES, window, location)
+        if weather_hourly is not None
+        else {}
+    )
+    dates = list(marine)[:days]
+    light = [(None, None)] * len(dates)
+    if location is not None and dates:
+        latitude, longitude, zone = location
+        zone = zone or spot_zone(None, None, longitude)
+        light = first_and_last_light(
+            dates, latitude, longitude, date_offsets(dates, zone)
+        )
+    forecast = []
+    for date, (first, last) in zip(dates, light):
+        values = {**marine[date], **weather.get(date, {})}
+        forecast.append(
+            DailyForecast(date=date, first_light=first, last_light=last, **values)
+        )
+    return forecast
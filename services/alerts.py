@@ -0,0 +1,417 @@
+"""
+incremental condition alerts evaluated when forecasts are refreshed
+
+rules (thresholds, direction windows, a minimum run of hours) are indexed
+by forecast grid cell. when the api clients store a freshly fetched marine
+or weather response, the engine diffs it against the values it last saw
+for that cell and evaluates the cell's rules only around the hours that
+changed, so the cost of a refresh is proportional to the changed spot,
+not to the number of subscriptions. fired alerts go to a pluggable sink,
+called on a background thread so a slow webhook never delays the fetch
+that refreshed the forecast.
+
+configuration (environment):
+    SURF_ALERT_WEBHOOK: url fired alerts are POSTed to as json
+    SURF_ALERT_FILE: json lines file alerts are appended to when no webhook
+        is set (default ./surf_alerts.jsonl)
+    SURF_ALERT_REFRESH_SECONDS: how often the api refreshes cells with alert
+        rules or live update subscribers (default 900, 0 disables)
+"""
+
+import logging
+import operator
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Iterable, Optional, Protocol
+
+import requests
+from pydantic import BaseModel
+
+from backend.models import Alert, AlertRule
+from services.cache import add_refresh_listener, get_cache, get_model, put_model
+from services.helpers import cell_id
+
+_DEFAULT_ALERT_FILE = "./surf_alerts.jsonl"
+_WEBHOOK_TIMEOUT = 5
+_RULE_PREFIX = "alertrule:v1:"
+_RULE_TTL = 365 * 24 * 3600
+_DEFAULT_REFRESH_SECONDS = 900
+
+_log = logging.getLogger(__name__)
+
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+# forecast kinds (cache key prefixes) whose hourly series rules can use
+_REFRESH_KINDS = ("marine", "weather")
+
+
+class AlertSink(Protocol):
+    """where fired alerts are delivered"""
+
+    def deliver(self, alert: Alert) -> None:
+        ...
+
+
+class JsonLinesSink:
+    """append alerts to a json lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def deliver(self, alert: Alert) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(alert.model_dump_json() + "\n")
+
+
+class WebhookSink:
+    """POST each alert as json to a url"""
+
+    def __init__(self, url: str, session: Optional[requests.Session] = None):
+        self.url = url
+        self._session = session or requests.Session()
+
+    def deliver(self, alert: Alert) -> None:
+        response = self._session.post(
+            self.url, json=alert.model_dump(), timeout=_WEBHOOK_TIMEOUT
+        )
+        response.raise_for_status()
+
+
+class MemorySink:
+    """keep alerts in a list (tests, embedding)"""
+
+    def __init__(self):
+        self.alerts: list[Alert] = []
+
+    def deliver(self, alert: Alert) -> None:
+        self.alerts.append(alert)
+
+
+def sink_from_env() -> AlertSink:
+    url = os.getenv("SURF_ALERT_WEBHOOK")
+    if url:
+        return WebhookSink(url)
+    return JsonLinesSink(os.getenv("SURF_ALERT_FILE", _DEFAULT_ALERT_FILE))
+
+
+def _in_window(degrees: float, start: float, end: float) -> bool:
+    """clockwise window from start to end, wrapping through north if start > end"""
+    if start <= end:
+        return start <= degrees <= end
+    return degrees >= start or degrees <= end
+
+
+class _Cell:
+    """rules of one grid cell and the hourly values they were last evaluated on"""
+
+    def __init__(self):
+        self.rules: dict[str, AlertRule] = {}
+        # variable -> local iso hour -> value
+        self.values: dict[str, dict[str, Optional[float]]] = {}
+        # rule id -> start hours of runs already alerted
+        self.fired: dict[str, set[str]] = {}
+
+    def variables(self) -> set[str]:
+        names = set()
+        for rule in self.rules.values():
+            names.update(c.variable for c in rule.conditions)
+            names.update(d.variable for d in rule.directions)
+        return names
+
+    def merge(self, hourly: BaseModel) -> set[str]:
+        """store the variables rules use; return the hours whose values changed"""
+        changed: set[str] = set()
+        times = hourly.time
+        if not times:
+            return changed
+        for name in self.variables():
+            column = getattr(hourly, name, None)
+            if column is None:
+                continue
+            stored = self.values.setdefault(name, {})
+            for t, v in zip(times, column):
+                if t not in stored or stored[t] != v:
+                    stored[t] = v
+                    changed.add(t)
+        # forget hours before the refreshed series starts
+        cutoff = times[0]
+        for stored in self.values.values():
+            for t in [t for t in stored if t < cutoff]:
+                del stored[t]
+        for starts in self.fired.values():
+            starts.difference_update([t for t in starts if t < cutoff])
+        return changed
+
+    def matches(self, rule: AlertRule, t: str) -> bool:
+        for c in rule.conditions:
+            v = self.values.get(c.variable, {}).get(t)
+            if v is None or not _OPS[c.op](v, c.value):
+                return False
+        for d in rule.directions:
+            v = self.values.get(d.variable, {}).get(t)
+            if v is None or not _in_window(v, d.start_deg, d.end_deg):
+                return False
+        return True
+
+    def times(self) -> list[str]:
+        """sorted hours known for any variable"""
+        return sorted(set().union(*self.values.values()))
+
+    def evaluate(
+        self, rule: AlertRule, times: list[str], changed: list[int], cell: str
+    ) -> list[Alert]:
+        """
+        alerts for runs of matching hours that contain a changed hour
+
+        args:
+            rule: rule to evaluate
+            times: self.times()
+            changed: sorted indices into times of the hours that changed
+            cell: grid cell id reported in alerts
+        """
+        memo: dict[int, bool] = {}
+
+        def match(i: int) -> bool:
+            if i not in memo:
+                memo[i] = self.matches(rule, times[i])
+            return memo[i]
+
+        fired = self.fired.setdefault(rule.rule_id, set())
+        alerts = []
+        covered_until = -1
+        for i in changed:
+            if i <= covered_until or not match(i):
+                continue
+            start = end = i
+            while start > 0 and match(start - 1):
+                start -= 1
+            while end + 1 < len(times) and match(end + 1):
+                end += 1
+            covered_until = end
+            hours = end - start + 1
+            if hours >= rule.min_hours and times[start] not in fired:
+                fired.add(times[start])
+                alerts.append(
+                    Alert(
+                        rule_id=rule.rule_id,
+                        subscriber=rule.subscriber,
+                        cell=cell,
+                        start=times[start],
+                        end=times[end],
+                        hours=hours,
+                    )
+                )
+        return alerts
+
+
+class AlertEngine:
+    """
+    alert rules indexed by grid cell, evaluated incrementally on refresh
+
+    args:
+        sink: where fired alerts are delivered
+        persist: store rules in the cache backend so they survive restarts
+    """
+
+    def __init__(self, sink: AlertSink, persist: bool = False):
+        self.sink = sink
+        self.persist = persist
+        self._cells: dict[str, _Cell] = {}
+        self._rule_cells: dict[str, str] = {}
+        self._lock = threading.Lock()
+        # one worker: alerts reach the sink in the order they fired
+        self._delivery = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="alert-delivery"
+        )
+        self._delivered: Optional[Future] = None
+
+    def add_rule(self, rule: AlertRule) -> None:
+        """add or replace a rule (by rule_id)"""
+        self.remove_rule(rule.rule_id)
+        cell = cell_id(rule.latitude, rule.longitude)
+        with self._lock:
+            self._cells.setdefault(cell, _Cell()).rules[rule.rule_id] = rule
+            self._rule_cells[rule.rule_id] = cell
+        if self.persist:
+            put_model(
+                _RULE_PREFIX + rule.rule_id, rule, time.time(), _RULE_TTL, notify=False
+            )
+
+    def remove_rule(self, rule_id: str) -> bool:
+        """return True if the rule existed"""
+        with self._lock:
+            cell = self._rule_cells.pop(rule_id, None)
+            if cell is None:
+                return False
+            state = self._cells[cell]
+            del state.rules[rule_id]
+            state.fired.pop(rule_id, None)
+            if not state.rules:
+                del self._cells[cell]
+        if self.persist:
+            get_cache().delete(_RULE_PREFIX + rule_id)
+        return True
+
+    def load_rules(self) -> int:
+        """add every rule persisted in the cache backend; return how many"""
+        loaded = 0
+        for key, _ in get_cache().scan(_RULE_PREFIX):
+            rule = get_model(key, AlertRule)
+            if rule is not None:
+                self.add_rule(rule)
+                loaded += 1
+        return loaded
+
+    def rules(self, subscriber: Optional[str] = None) -> list[AlertRule]:
+        with self._lock:
+            return [
+                rule
+                for state in self._cells.values()
+                for rule in state.rules.values()
+                if subscriber is None or rule.subscriber == subscriber
+            ]
+
+    def cells(self) -> list[str]:
+        """grid cells with at least one rule"""
+        with self._lock:
+            return list(self._cells)
+
+    def on_refresh(self, key: str, model: BaseModel) -> None:
+        """
+        cache refresh listener: feed freshly fetched marine/weather responses
+
+        keys look like "marine:v2:38.66:-9.20:7:h"; other keys (including
+        per-model ensemble members, which carry a model suffix) are ignored.
+        """
+        parts = key.split(":")
+        # six parts: responses of the default model, not ensemble members
+        if parts[0] not in _REFRESH_KINDS or len(parts) != 6:
+            return
+        hourly = getattr(model, "hourly", None)
+        if hourly is not None:
+            self.update(f"{parts[2]}:{parts[3]}", hourly)
+
+    def update(self, cell: str, hourly: BaseModel) -> list[Alert]:
+        """
+        merge an hourly series into a cell and fire alerts for changed hours
+
+        args:
+            cell: grid cell id (services.helpers.cell_id)
+            hourly: hourly marine or weather series
+
+        returns:
+            alerts fired (queued for the sink; see flush)
+        """
+        with self._lock:
+            state = self._cells.get(cell)
+            if state is None:
+                return []
+            changed_hours = state.merge(hourly)
+            if not changed_hours:
+                return []
+            times = state.times()
+            changed = [i for i, t in enumerate(times) if t in changed_hours]
+            alerts = [
+                alert
+                for rule in state.rules.values()
+                for alert in state.evaluate(rule, times, changed, cell)
+            ]
+            if alerts:
+                self._delivered = self._delivery.submit(self._deliver, alerts)
+        return alerts
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """wait until queued alerts reached the sink; False on timeout"""
+        with self._lock:
+            delivered = self._delivered
+        if delivered is None:
+            return True
+        return not wait([delivered], timeout=timeout).not_done
+
+    def _deliver(self, alerts: list[Alert]) -> None:
+        for alert in alerts:
+            try:
+                self.sink.deliver(alert)
+            except Exception:
+                _log.exception(
+                    "alert %s for %s in cell %s not delivered",
+                    alert.rule_id,
+                    alert.subscriber,
+                    alert.cell,
+                )
+
+
+_engine: Optional[AlertEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AlertEngine:
+    """
+    process-wide engine: sink from the environment, rules loaded from the
+    cache backend, registered as a cache refresh listener on first use
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = AlertEngine(sink_from_env(), persist=True)
+                engine.load_rules()
+                add_refresh_listener(engine.on_refresh)
+                _engine = engine
+    return _engine
+
+
+def refresh_interval() -> float:
+    """seconds between background refreshes of subscribed cells (0 disables)"""
+    try:
+        return float(
+            os.getenv("SURF_ALERT_REFRESH_SECONDS", str(_DEFAULT_REFRESH_SECONDS))
+        )
+    except ValueError:
+        return float(_DEFAULT_REFRESH_SECONDS)
+
+
+def refresh_cells(cells: Iterable[str]) -> int:
+    """
+    fetch forecasts for grid cells so expired ones are refreshed
+
+    cells still cached cost nothing; refetched ones reach refresh listeners
+    (the alert engine, live update subscribers) through the cache. upstream
+    calls run at background priority (api.scheduler), and none are made
+    while the upstream quota is critical (api.quota).
+
+    args:
+        cells: grid cell ids (services.helpers.cell_id)
+
+    returns:
+        number of cells that failed to refresh
+    """
+    from api.marine import get_marine_forecast
+    from api.quota import CRITICAL, degraded
+    from api.scheduler import BACKGROUND, priority
+    from api.weather import weather_forecast
+
+    if degraded(CRITICAL):
+        return 0
+    failed = 0
+    with priority(BACKGROUND):
+        for cell in cells:
+            lat, lon = (float(part) for part in cell.split(":"))
+            try:
+                get_marine_forecast(lat, lon)
+                weather_forecast(lat, lon)
+            except Exception:
+                failed += 1
+    return failed
+
+
+def refresh_subscribed_cells(engine: Optional[AlertEngine] = None) -> int:
+    """
+    refresh every cell with alert rules (see refresh_cells)
+
+    returns:
+        number of cells that failed to refresh
+    """
+    return refresh_cells((engine or get_engine()).cells())
@@ -0,0 +1,485 @@
+"""
+pluggable cache backends for geocodes and upstream forecast responses
+
+backends store opaque bytes with a version (the fetch start time) and an
+expiry; set_if_newer only replaces an entry with an equal or newer version
+so a slow worker can never overwrite fresher data written by another one.
+
+configuration (environment):
+    SURF_CACHE_BACKEND: "sqlite" (default), "memory" or "redis"
+    SURF_CACHE_PATH: sqlite file shared by all workers (default ./surf_cache.db)
+    SURF_CACHE_URL: redis url for the redis backend (default redis://localhost:6379/0)
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Protocol, TypeVar
+
+from pydantic import BaseModel
+
+from services.memory import deep_size, register_cache
+
+_DEFAULT_SQLITE_PATH = "./surf_cache.db"
+_DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+_MEMORY_MAX_ENTRIES = 4096
+# sqlite writes between deletions of expired rows
+_SQLITE_PURGE_EVERY = 1000
+# models kept parsed per process (see get_model)
+_PARSED_MAX_ENTRIES = 128
+_REDIS_PREFIX = "surf:"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """a cached value with the version it was written with"""
+
+    value: bytes
+    version: float
+    expires_at: float
+
+
+class CacheBackend(ABC):
+    """interface shared by all cache backends"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """return the live entry for key, or None if missing or expired"""
+
+    @abstractmethod
+    def set_if_newer(self, key: str, value: bytes, version: float, ttl: float) -> bool:
+        """
+        atomically store value unless a live entry with a newer version exists
+
+        args:
+            key: cache key
+            value: serialized payload
+            version: monotonic-ish version, e.g. the fetch start time (epoch seconds)
+            ttl: seconds until the entry expires
+
+        returns:
+            True if the value was stored
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """remove key if present"""
+
+    @abstractmethod
+    def scan(self, prefix: str = "") -> Iterator[tuple[str, CacheEntry]]:
+        """iterate over live (key, entry) pairs whose key starts with prefix"""
+
+
+class InProcessCache(CacheBackend):
+    """thread-safe LRU dict; fast but private to one process"""
+
+    def __init__(self, max_entries: int = _MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        register_cache("cache:memory", self.usage)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set_if_newer(self, key: str, value: bytes, version: float, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            current = self._data.get(key)
+            if (
+                current is not None
+                and current.expires_at > now
+                and current.version > version
+            ):
+                return False
+            self._data[key] = CacheEntry(value, version, now + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def scan(self, prefix: str = "") -> Iterator[tuple[str, CacheEntry]]:
+        now = time.time()
+        with self._lock:
+            items = list(self._data.items())
+        for key, entry in items:
+            if key.startswith(prefix) and entry.expires_at > now:
+                yield key, entry
+
+    def usage(self) -> tuple[int, int]:
+        """(entries, approximate bytes) held, for services.memory"""
+        with self._lock:
+            items = list(self._data.items())
+        size = sys.getsizeof(self._data) + sum(
+            sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry.value)
+            for key, entry in items
+        )
+        return len(items), size
+
+
+class SQLiteCache(CacheBackend):
+    """
+    cache in a sqlite file in WAL mode, shared by every process on the host
+
+    reads skip expired rows; every purge_every writes of a process, the rows
+    expired by then are deleted so the file does not grow without bound.
+
+    args:
+        path: database file path
+        purge_every: writes between purges of expired rows (0 disables)
+    """
+
+    def __init__(
+        self, path: str = _DEFAULT_SQLITE_PATH, purge_every: int = _SQLITE_PURGE_EVERY
+    ):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " version REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT value, version, expires_at FROM cache"
+                " WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return CacheEntry(bytes(row[0]), row[1], row[2])
+
+    def set_if_newer(self, key: str, value: bytes, version: float, ttl: float) -> bool:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO cache (key, value, version, expires_at)"
+                " VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET"
+                "  value = excluded.value,"
+                "  version = excluded.version,"
+                "  expires_at = excluded.expires_at"
+                " WHERE excluded.version >= cache.version OR cache.expires_at <= ?",
+                (key, value, version, now + ttl, now),
+            )
+        if self.purge_every > 0:
+            with self._writes_lock:
+                self._writes += 1
+                due = self._writes >= self.purge_every
+                if due:
+                    self._writes = 0
+            if due:
+                self.purge()
+        return cursor.rowcount > 0
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge(self) -> int:
+        """delete expired rows; return how many"""
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+    def scan(self, prefix: str = "") -> Iterator[tuple[str, CacheEntry]]:
+        # range scan on the primary key instead of LIKE, which ignores the index
+        rows = self._conn().execute(
+            "SELECT key, value, version, expires_at FROM cache"
+            " WHERE key >= ? AND key < ? AND expires_at > ?",
+            (prefix, prefix + "\U0010ffff", time.time()),
+        )
+        for key, value, version, expires_at in rows:
+            yield key, CacheEntry(bytes(value), version, expires_at)
+
+
+class RedisCache(CacheBackend):
+    """
+    cache on any redis-protocol server (redis, valkey, a local stand-in)
+
+    uses WATCH/MULTI rather than lua so minimal servers can serve it.
+    requires the optional `redis` package.
+
+    args:
+        url: redis connection url
+        client: pre-built redis-py compatible client (overrides url)
+    """
+
+    def __init__(self, url: str = _DEFAULT_REDIS_URL, client=None):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "SURF_CACHE_BACKEND=redis requires the 'redis' package"
+            ) from e
+        self._watch_error = redis.WatchError
+        self._redis = client if client is not None else redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        fields = self._redis.hmget(
+            _REDIS_PREFIX + key, "value", "version", "expires_at"
+        )
+        if fields[0] is None:
+            return None
+        entry = CacheEntry(fields[0], float(fields[1]), float(fields[2]))
+        if entry.expires_at <= time.time():
+            return None
+        return entry
+
+    def set_if_newer(self, key: str, value: bytes, version: float, ttl: float) -> bool:
+        name = _REDIS_PREFIX + key
+        now = time.time()
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    current = pipe.hmget(name, "version", "expires_at")
+                    if (
+                        current[0] is not None
+                        and float(current[1]) > now
+                        and float(current[0]) > version
+                    ):
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.hset(
+                        name,
+                        mapping={
+                            "value": value,
+                            "version": version,
+                            "expires_at": now + ttl,
+                        },
+                    )
+                    pipe.pexpire(name, int(ttl * 1000))
+                    pipe.execute()
+                    return True
+                except self._watch_error:
+                    continue
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(_REDIS_PREFIX + key)
+
+    def scan(self, prefix: str = "") -> Iterator[tuple[str, CacheEntry]]:
+        for name in self._redis.scan_iter(match=f"{_REDIS_PREFIX}{prefix}*"):
+            key = name.decode() if isinstance(name, bytes) else name
+            entry = self.get(key[len(_REDIS_PREFIX) :])
+            if entry is not None:
+                yield key[len(_REDIS_PREFIX) :], entry
+
+
+def create_cache_from_env() -> CacheBackend:
+    """build the backend selected by SURF_CACHE_BACKEND"""
+    kind = os.getenv("SURF_CACHE_BACKEND", "sqlite").lower()
+    if kind == "memory":
+        return InProcessCache()
+    if kind == "sqlite":
+        return SQLiteCache(os.getenv("SURF_CACHE_PATH", _DEFAULT_SQLITE_PATH))
+    if kind == "redis":
+        return RedisCache(os.getenv("SURF_CACHE_URL", _DEFAULT_REDIS_URL))
+    raise ValueError(f"unknown SURF_CACHE_BACKEND: {kind}")
+
+
+class ModelSource(Protocol):
+    """read-only source consulted on cache misses (e.g. a disk snapshot)"""
+
+    def load_model(
+        self, key: str, model_cls: type[ModelT]
+    ) -> Optional[tuple[ModelT, float, float]]:
+        """return (model, version, expires_at) for key, or None"""
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+_fallbacks: list[ModelSource] = []
+_listeners: list[Callable[[str, BaseModel], None]] = []
+# (key, model class) -> (version, expires_at, model) of recent get_model hits
+_parsed: "OrderedDict[tuple[str, type], tuple[float, float, BaseModel]]" = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """process-wide cache backend, created from the environment on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache_from_env()
+    return _cache
+
+
+def set_cache(backend: Optional[CacheBackend]) -> None:
+    """replace the process-wide backend (None re-reads the environment)"""
+    global _cache
+    with _cache_lock:
+        _cache = backend
+    with _parsed_lock:
+        _parsed.clear()
+
+
+def add_fallback(source: ModelSource) -> None:
+    """register a read-only source consulted (in order) on cache misses"""
+    _fallbacks.append(source)
+
+
+def clear_fallbacks() -> None:
+    """drop every registered fallback source"""
+    _fallbacks.clear()
+
+
+def add_refresh_listener(listener: Callable[[str, BaseModel], None]) -> None:
+    """
+    call listener(key, model) whenever put_model stores freshly fetched data
+
+    listeners run synchronously in the fetching thread and must be quick;
+    their exceptions are swallowed so they can never fail a fetch.
+    """
+    _listeners.append(listener)
+
+
+def remove_refresh_listener(listener: Callable[[str, BaseModel], None]) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def get_model(key: str, model_cls: type[ModelT]) -> Optional[ModelT]:
+    """
+    read and deserialize a pydantic model from the cache
+
+    on a miss, registered fallback sources are tried and a hit is promoted
+    into the cache backend with its original version and expiry.
+
+    recently read models are kept parsed in this process while the stored
+    entry keeps the same version and expiry, so repeated reads skip json
+    validation and keep derived state such as HourlySeries.time_index.
+    the same instance is then returned to every caller: treat it as
+    read-only (model_copy to change it).
+
+    args:
+        key: cache key
+        model_cls: model class to validate the cached json into
+
+    returns:
+        model instance, or None on a miss (or an undecodable entry)
+    """
+    try:
+        entry = get_cache().get(key)
+        if entry is not None:
+            return _parsed_model(key, model_cls, entry)
+    except Exception:
+        # the cache is best-effort: a broken or locked backend is a miss
+        pass
+    for source in _fallbacks:
+        found = source.load_model(key, model_cls)
+        if found is None:
+            continue
+        model, version, expires_at = found
+        put_model(key, model, version, expires_at - time.time(), notify=False)
+        return model
+    return None
+
+
+def _parsed_model(key: str, model_cls: type[ModelT], entry: CacheEntry) -> ModelT:
+    """the entry's model, parsed once per version and expiry"""
+    slot = (key, model_cls)
+    with _parsed_lock:
+        kept = _parsed.get(slot)
+        if kept is not None and kept[:2] == (entry.version, entry.expires_at):
+            _parsed.move_to_end(slot)
+            return kept[2]
+    model = model_cls.model_validate_json(entry.value)
+    with _parsed_lock:
+        _parsed[slot] = (entry.version, entry.expires_at, model)
+        _parsed.move_to_end(slot)
+        while len(_parsed) > _PARSED_MAX_ENTRIES:
+            _parsed.popitem(last=False)
+    return model
+
+
+def _parsed_usage() -> tuple[int, int]:
+    """(models, approximate bytes) kept parsed, for services.memory"""
+    with _parsed_lock:
+        items = list(_parsed.values())
+    return len(items), sum(deep_size(model) for _, _, model in items)
+
+
+register_cache("cache:parsed", _parsed_usage)
+
+
+def put_model(
+    key: str, model: BaseModel, version: float, ttl: float, notify: bool = True
+) -> bool:
+    """
+    serialize a pydantic model into the cache if it is not older than the stored one
+
+    args:
+        key: cache key
+        model: model to store
+        version: fetch start time (epoch seconds)
+        ttl: seconds until the entry expires
+        notify: tell refresh listeners when stored (off for restored entries)
+
+    returns:
+        True if stored
+    """
+    try:
+        stored = get_cache().set_if_newer(
+            key, model.model_dump_json().encode(), version, ttl
+        )
+    except Exception:
+        return False
+    if stored and notify:
+        for listener in list(_listeners):
+            try:
+                listener(key, model)
+            except Exception:
+                pass
+    return stored
@@ -0,0 +1,185 @@
+"""
+coastline index: snap inland geocodes to the sea and find the way a shore faces
+
+nominatim often returns town centroids inland, where the marine api answers
+with null series. the bundled index (services/data/coastline.npz, built by
+`python -m cli.build_coastline`) lists every coastal sea cell of a global
+0.05° grid with the direction its shore faces, i.e. the bearing from land
+out to sea. a geocoded point is moved to the nearest such cell before the
+marine api is called, and the facing direction labels wind as offshore,
+onshore or cross-shore.
+
+index format (numpy .npz):
+    cell_deg: grid resolution in degrees
+    keys: int32 row * cols + col of each coastal sea cell, sorted; row 0 is
+        the band just south of 90°n, col 0 the band just east of 180°w
+    facing: int16 shore-facing bearing of each cell in degrees (0 = north)
+
+configuration (environment):
+    SURF_COAST_SNAP_KM: farthest a point is moved to reach the sea (default 25,
+        0 disables snapping)
+    SURF_COAST_INDEX: alternative index file
+"""
+
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), "data", "coastline.npz")
+_DEFAULT_SNAP_KM = 25.0
+_EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEGREE = math.pi * _EARTH_RADIUS_KM / 180
+
+
+@dataclass(frozen=True)
+class CoastPoint:
+    """where a location's marine forecast is fetched"""
+
+    latitude: float
+    longitude: float
+    # bearing the shore faces (land to sea), None away from any coast
+    shore_facing_deg: Optional[float]
+    distance_km: float
+
+
+def snap_distance_km() -> float:
+    try:
+        return float(os.getenv("SURF_COAST_SNAP_KM", str(_DEFAULT_SNAP_KM)))
+    except ValueError:
+        return _DEFAULT_SNAP_KM
+
+
+class CoastIndex:
+    """coastal sea cells of a regular lat/lon grid, searchable by location"""
+
+    def __init__(self, cell_deg: float, keys: np.ndarray, facing: np.ndarray):
+        self.cell_deg = float(cell_deg)
+        self.rows = int(round(180 / self.cell_deg))
+        self.cols = int(round(360 / self.cell_deg))
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.facing = np.asarray(facing, dtype=np.float64)
+
+    @classmethod
+    def load(cls, path: str) -> "CoastIndex":
+        with np.load(path) as data:
+            return cls(float(data["cell_deg"]), data["keys"], data["facing"])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def center(self, key: int) -> tuple[float, float]:
+        row, col = divmod(int(key), self.cols)
+        return (
+            90 - (row + 0.5) * self.cell_deg,
+            -180 + (col + 0.5) * self.cell_deg,
+        )
+
+    def nearest(
+        self, latitude: float, longitude: float, max_km: float
+    ) -> Optional[tuple[int, float]]:
+        """
+        the closest coastal sea cell within max_km
+
+        returns:
+            (position in keys, distance in km), or None if there is none
+        """
+        row = min(int((90 - latitude) / self.cell_deg), self.rows - 1)
+        col = min(int((longitude + 180) / self.cell_deg), self.cols - 1)
+        row_span = int(max_km / (_KM_PER_DEGREE * self.cell_deg)) + 1
+        cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+        col_span = min(
+            int(max_km / (_KM_PER_DEGREE * self.cell_deg * cos_lat)) + 1,
+            self.cols // 2,
+        )
+
+        # one sorted-range lookup per grid row, with longitude wraparound
+        candidates = []
+        for r in range(max(row - row_span, 0), min(row + row_span, self.rows - 1) + 1):
+            base = r * self.cols
+            start, end = col - col_span, col + col_span
+            ranges = [(max(start, 0), min(end, self.cols - 1))]
+            if start < 0:
+                ranges.append((self.cols + start, self.cols - 1))
+            if end >= self.cols:
+                ranges.append((0, end - self.cols))
+            for lo, hi in ranges:
+                i, j = np.searchsorted(self.keys, (base + lo, base + hi + 1))
+                if j > i:
+                    candidates.append(np.arange(i, j))
+        if not candidates:
+            return None
+        positions = np.concatenate(candidates)
+        rows, cols = np.divmod(self.keys[positions], self.cols)
+        lats = np.radians(90 - (rows + 0.5) * self.cell_deg)
+        lons = np.radians(-180 + (cols + 0.5) * self.cell_deg)
+        p = math.radians(latitude)
+        a = (
+            np.sin((lats - p) / 2) ** 2
+            + math.cos(p)
+            * np.cos(lats)
+            * np.sin((lons - math.radians(longitude)) / 2) ** 2
+        )
+        distances = 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        best = int(np.argmin(distances))
+        if distances[best] > max_km:
+            return None
+        return int(positions[best]), float(distances[best])
+
+    def snap(
+        self, latitude: float, longitude: float, max_km: Optional[float] = None
+    ) -> CoastPoint:
+        """
+        the nearest coastal sea point to a location, or the location itself
+        (with no shore direction) if no coast is within max_km
+        """
+        max_km = snap_distance_km() if max_km is None else max_km
+        found = self.nearest(latitude, longitude, max_km) if max_km > 0 else None
+        if found is None:
+            return CoastPoint(latitude, longitude, None, 0.0)
+        position, distance = found
+        lat, lon = self.center(int(self.keys[position]))
+        return CoastPoint(
+            round(lat, 4), round(lon, 4), float(self.facing[position]), distance
+        )
+
+
+_index: Optional[CoastIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[CoastIndex]:
+    """the bundled (or SURF_COAST_INDEX) index, None if the file is missing"""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                path = os.getenv("SURF_COAST_INDEX", DEFAULT_INDEX_PATH)
+                try:
+                    _index = CoastIndex.load(path)
+                except (OSError, KeyError, ValueError):
+                    _index = None
+                _index_loaded = True
+    return _index
+
+
+def snap_to_sea(latitude: float, longitude: float) -> CoastPoint:
+    """
+    where to fetch the marine forecast of a geocoded location
+
+    args:
+        latitude: geocoded latitude
+        longitude: geocoded longitude
+
+    returns:
+        the nearest coastal sea cell within SURF_COAST_SNAP_KM with its shore
+        direction, or the location itself when no index or coast is available
+    """
+    index = get_index()
+    if index is None:
+        return CoastPoint(latitude, longitude, None, 0.0)
+    return index.snap(latitude, longitude)
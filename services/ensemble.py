@@ -0,0 +1,212 @@
+"""
+multi-model wave ensemble: fetch several marine models concurrently, align
+them on a common time axis and compute per-hour mean, spread and agreement
+in one vectorized pass
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Sequence
+
+import numpy as np
+
+from api.deadline import Deadline, DeadlineExceeded
+from api.geocoding import geocode_location
+from api.marine import MARINE_MODELS, get_marine_forecast
+from api.upstream import UpstreamUnavailableError
+from backend.models import EnsembleForecast, EnsembleSeries, MarineResponse
+from services.coast import snap_to_sea
+from services.helpers import validate_forecast_days
+from services.localize import convert_times, spot_zone
+from services.pipeline import LocationNotFoundError
+from services.tracing import propagate, span
+
+# members used when the caller does not pick models (global coverage)
+DEFAULT_MODELS = ("ecmwf_wam025", "ncep_gfswave025", "meteofrance_wave", "dwd_gwam")
+ENSEMBLE_VARIABLES = (
+    "wave_height",
+    "wave_period",
+    "wave_direction",
+    "swell_wave_height",
+    "swell_wave_period",
+    "swell_wave_direction",
+    "wind_wave_height",
+)
+
+_ENSEMBLE_WORKERS = 16
+_executor = ThreadPoolExecutor(
+    max_workers=_ENSEMBLE_WORKERS, thread_name_prefix="ensemble-fetch"
+)
+
+
+def _aligned(
+    responses: dict[str, MarineResponse], variable: str, times: np.ndarray
+) -> np.ndarray:
+    """models x hours matrix of one variable on the common axis, NaN where missing"""
+    matrix = np.full((len(responses), times.size), np.nan)
+    for row, response in enumerate(responses.values()):
+        own = np.array(response.hourly.time, dtype="datetime64[m]")
+        values = np.array(getattr(response.hourly, variable), dtype=np.float64)
+        matrix[row, np.searchsorted(times, own)] = values
+    return matrix
+
+
+def _round(values: np.ndarray, decimals: int) -> list[Optional[float]]:
+    return [None if v != v else v for v in np.round(values, decimals).tolist()]
+
+
+def _stats(matrix: np.ndarray, circular: bool) -> EnsembleSeries:
+    """per-hour (column) mean, spread and agreement over members (rows)"""
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if circular:
+            radians = np.deg2rad(matrix)
+            sin = np.where(valid, np.sin(radians), 0.0).sum(axis=0) / counts
+            cos = np.where(valid, np.cos(radians), 0.0).sum(axis=0) / counts
+            mean = np.mod(np.rad2deg(np.arctan2(sin, cos)), 360.0)
+            resultant = np.clip(np.hypot(sin, cos), 1e-12, 1.0)
+            spread = np.rad2deg(np.sqrt(-2.0 * np.log(resultant)))
+            agreement = resultant
+        else:
+            mean = np.where(valid, matrix, 0.0).sum(axis=0) / counts
+            deviation = np.where(valid, (matrix - mean) ** 2, 0.0)
+            spread = np.sqrt(deviation.sum(axis=0) / counts)
+            agreement = np.clip(1.0 - spread / np.abs(mean), 0.0, 1.0)
+            agreement[(mean == 0) & (spread == 0)] = 1.0
+    missing = counts == 0
+    for column in (mean, spread, agreement):
+        column[missing] = np.nan
+    decimals = 0 if circular else 2
+    return EnsembleSeries(
+        mean=_round(mean, decimals),
+        spread=_round(spread, decimals),
+        agreement=_round(agreement, 2),
+    )
+
+
+def ensemble_statistics(
+    responses: dict[str, MarineResponse],
+) -> tuple[list[str], list[int], dict[str, EnsembleSeries]]:
+    """
+    align member responses on the union of their hours and reduce them
+
+    args:
+        responses: model name -> validated marine response
+
+    returns:
+        (time axis, members with data per hour, statistics per variable)
+    """
+    times = np.unique(
+        np.concatenate(
+            [np.array(r.hourly.time, dtype="datetime64[m]") for r in responses.values()]
+        )
+    )
+    variables = {}
+    members = np.zeros(times.size, dtype=np.int64)
+    for variable in ENSEMBLE_VARIABLES:
+        matrix = _aligned(responses, variable, times)
+        members = np.maximum(members, (~np.isnan(matrix)).sum(axis=0))
+        variables[variable] = _stats(matrix, circular="direction" in variable)
+    axis = np.datetime_as_string(times, unit="m").tolist()
+    return axis, members.tolist(), variables
+
+
+def fetch_ensemble(
+    latitude: float,
+    longitude: float,
+    models: Optional[Sequence[str]] = None,
+    forecast_days: int = 7,
+    deadline: Optional[Deadline] = None,
+) -> tuple[dict[str, MarineResponse], list[str]]:
+    """
+    fetch one marine response per model concurrently
+
+    returns:
+        (model -> response for models that answered, models that did not)
+
+    raises:
+        ValueError: if a model name or forecast_days is invalid
+    """
+    models = list(dict.fromkeys(models or DEFAULT_MODELS))
+    for model in models:
+        if model not in MARINE_MODELS:
+            raise ValueError(
+                f"unknown marine model: {model} (expected one of {', '.join(MARINE_MODELS)})"
+            )
+    validate_forecast_days(forecast_days)
+    futures = {
+        model: _executor.submit(
+            propagate(get_marine_forecast),
+            latitude,
+            longitude,
+            forecast_days=forecast_days,
+            deadline=deadline,
+            model=model,
+        )
+        for model in models
+    }
+    wait(futures.values(), timeout=None if deadline is None else deadline.remaining())
+    responses, failed = {}, []
+    for model, future in futures.items():
+        if future.done() and future.exception() is None:
+            responses[model] = future.result()
+        else:
+            failed.append(model)
+    return responses, failed
+
+
+def fetch_ensemble_forecast(
+    city_name: str,
+    models: Optional[Sequence[str]] = None,
+    forecast_days: int = 7,
+    deadline: Optional[Deadline] = None,
+) -> EnsembleForecast:
+    """
+    geocode a location and build its multi-model wave ensemble
+
+    args:
+        city_name: name of the city or location
+        models: wave models to combine (defaults to DEFAULT_MODELS)
+        forecast_days: forecast horizon in days
+        deadline: optional request deadline; models missing it are left out
+
+    returns:
+        validated EnsembleForecast
+
+    raises:
+        LocationNotFoundError: if the location cannot be geocoded
+        UpstreamUnavailableError: if no model answered
+        ValueError: if a model name or forecast_days is invalid
+    """
+    try:
+        lat, lon, full_name = geocode_location(city_name, deadline=deadline)
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise LocationNotFoundError(str(e)) from e
+    point = snap_to_sea(lat, lon)
+    lat, lon = point.latitude, point.longitude
+
+    with span("ensemble.fetch"):
+        responses, failed = fetch_ensemble(
+            lat, lon, models=models, forecast_days=forecast_days, deadline=deadline
+        )
+    if not responses:
+        raise UpstreamUnavailableError(
+            "open-meteo-marine", retry_after=1.0, reason="no ensemble member answered"
+        )
+    with span("ensemble.statistics"):
+        time_axis, members, variables = ensemble_statistics(responses)
+    # members are fetched in utc; the axis is shown in the spot's local time
+    first = next(iter(responses.values()))
+    zone = spot_zone(first.timezone, first.utc_offset_seconds, lon)
+    return EnsembleForecast(
+        location=full_name,
+        latitude=lat,
+        longitude=lon,
+        models=list(responses),
+        unavailable_models=failed,
+        time=convert_times(time_axis, zone),
+        members=members,
+        variables=variables,
+    )
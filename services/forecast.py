@@ -2,6 +2,9 @@
 surf forecast service - business logic for combining and interpreting data
 """
 
+import time
+from typing import Optional
+
 from backend.models import (
     CurrentConditions,
     DailyForecast,
@@ -9,18 +12,29 @@ from backend.models import (
     MarineResponse,
     WeatherResponse,
 )
+from services.aggregate import Window, daily_from_hourly
+from services.localize import date_offsets, local_times, spot_zone
+from services.solar import first_and_last_light, light_mask
+
+# hours between the hourly forecasts picked after the current hour, and how many
+_HOURLY_STEP = 3
+_HOURLY_COUNT = 4
+
+# utc epoch seconds of "now"
+_clock = time.time
 
 
 class ForecastService:
     """service for processing and interpreting surf forecast data"""
 
     @staticmethod
-    def assess_surf_quality(current: dict) -> str:
+    def assess_surf_quality(current: dict, first_light: Optional[str] = None) -> str:
         """
         provide surf quality assessment based on wave and wind data
 
         args:
             current: current conditions dictionary
+            first_light: next first light (local iso time), noted when it is dark
 
         returns:
             human-readable surf quality assessment string
@@ -28,7 +42,7 @@ class ForecastService:
         wave_height = current.get("wave_height_m") or 0
         swell_height = current.get("swell_wave_height_m") or 0
         period = current.get("wave_period_s") or 0
-        wind_speed = current.get("wind_speed_knots") or 0
+        wind_speed = current.get("wind_speed_knots")
 
         notes = []
 
@@ -45,7 +59,9 @@ class ForecastService:
             notes.append("big waves - advanced surfers only")
 
         # wind conditions assessment
-        if wind_speed < 5:
+        if wind_speed is None:
+            notes.append("wind data unavailable")
+        elif wind_speed < 5:
             notes.append("light winds - glassy conditions")
         elif wind_speed < 10:
             notes.append("light breeze - good conditions")
@@ -72,34 +88,69 @@ class ForecastService:
             else:
                 notes.append("wind waves present - may be choppy")
 
+        if current.get("daylight") is False:
+            notes.append(
+                f"dark now - first light at {first_light[-5:]}"
+                if first_light
+                else "dark now - wait for first light"
+            )
+
         return " | ".join(notes)
 
     @staticmethod
     def parse_forecast_data(
         marine_data: MarineResponse,
-        weather_data: WeatherResponse,
+        weather_data: Optional[WeatherResponse],
         location_name: str,
         latitude: float,
         longitude: float,
+        daily_window: Window = None,
+        shore_facing_deg: Optional[float] = None,
+        now: Optional[float] = None,
     ) -> SurfForecast:
         """
         parse the validated api responses into structured surf forecast
 
         args:
             marine_data: validated marine api response
-            weather_data: validated weather api response
+            weather_data: validated weather api response, or None when the
+                weather upstream missed the deadline (partial forecast)
             location_name: full location name
             latitude: latitude coordinate
             longitude: longitude coordinate
+            daily_window: hour window for daily aggregates ("daylight",
+                "dawn" or (start, end)); when set, or when upstream daily
+                data was not requested, days are aggregated from hourly data.
+                the named windows follow the sun at the location
+            shore_facing_deg: bearing the shore faces (services.coast), if known
+            now: utc epoch seconds of the current conditions; None for the
+                clock. the series' hour containing it is "now" (its first
+                hour if it starts later, its last if it is stale)
 
         returns:
-            validated structured SurfForecast object
+            validated structured SurfForecast object, in utc (see
+            services.localize.localize_forecast for local times)
 
         raises:
             ValidationError: if constructed models fail validation
         """
-        # get current conditions (first hourly data point)
-        current_idx = 0
+        # current hour: bisection on the series' epoch index, parsed once
+        # per (cached) response
+        index = marine_data.hourly.time_index
+        when = _clock() if now is None else now
+        current_idx = index.at(when)
+
+        # the spot's zone, and daylight from the sun's position in its local time
+        zone_name, utc_offset = marine_data.timezone, marine_data.utc_offset_seconds
+        if weather_data is not None and zone_name in (None, "GMT", "UTC"):
+            zone_name = weather_data.timezone or zone_name
+            utc_offset = utc_offset or weather_data.utc_offset_seconds
+        zone = spot_zone(zone_name, utc_offset, longitude)
+        times = marine_data.hourly.time
+        local, offsets = local_times(index.datetimes, zone)
+        light = light_mask(local, latitude, longitude, offsets)
+        ahead = index.ahead(when, range(_HOURLY_STEP, len(times), _HOURLY_STEP))
+        daylight_hours = [int(i) for i in ahead if i >= 0 and light[i]][:_HOURLY_COUNT]
 
         def _v(lst, i):
             if i < len(lst):
@@ -107,6 +158,29 @@ class ForecastService:
                 return v if v is not None else None
             return None
 
+        weather_hourly = weather_data.hourly if weather_data is not None else None
+        weather_daily = weather_data.daily if weather_data is not None else None
+
+        def _w(series, field, i):
+            return _v(getattr(series, field), i) if series is not None else None
+
+        # the same instants in the weather series, which need not be aligned
+        selected = [current_idx, *daylight_hours]
+        weather_idx = (
+            dict(
+                zip(
+                    selected,
+                    weather_hourly.time_index.find(index.epochs[selected]).tolist(),
+                )
+            )
+            if weather_hourly is not None
+            else {}
+        )
+
+        def _wh(field, i):
+            j = weather_idx.get(i, -1)
+            return _v(getattr(weather_hourly, field), j) if j >= 0 else None
+
         current = CurrentConditions(
             timestamp=marine_data.hourly.time[current_idx],
             wave_height_m=_v(marine_data.hourly.wave_height, current_idx),
@@ -118,71 +192,101 @@ class ForecastService:
             ),
             wave_period_s=_v(marine_data.hourly.wave_period, current_idx),
             swell_wave_period_s=_v(marine_data.hourly.swell_wave_period, current_idx),
-            wind_speed_knots=_v(weather_data.hourly.windspeed_10m, current_idx),
-            wind_direction_deg=_v(weather_data.hourly.winddirection_10m, current_idx),
-            wind_gusts_knots=_v(weather_data.hourly.windgusts_10m, current_idx),
-            temperature_c=_v(weather_data.hourly.temperature_2m, current_idx),
+            wind_speed_knots=_wh("windspeed_10m", current_idx),
+            wind_direction_deg=_wh("winddirection_10m", current_idx),
+            wind_gusts_knots=_wh("windgusts_10m", current_idx),
+            temperature_c=_wh("temperature_2m", current_idx),
+            daylight=bool(light[current_idx]),
+            hours_ahead=0,
         )
 
-        # get next 6 hours (every 3 hours: +3, +6, +9, +12 hours)
+        # next daylight hours, every 3 hours from +3 (nights are skipped)
         hourly_forecasts = []
-        for hour_idx in [3, 6, 9, 12]:
-            if hour_idx < len(marine_data.hourly.time):
-                hour_forecast = CurrentConditions(
-                    timestamp=marine_data.hourly.time[hour_idx],
-                    wave_height_m=_v(marine_data.hourly.wave_height, hour_idx),
-                    swell_wave_height_m=_v(
-                        marine_data.hourly.swell_wave_height, hour_idx
+        for hour_idx in daylight_hours:
+            hour_forecast = CurrentConditions(
+                timestamp=marine_data.hourly.time[hour_idx],
+                wave_height_m=_v(marine_data.hourly.wave_height, hour_idx),
+                swell_wave_height_m=_v(marine_data.hourly.swell_wave_height, hour_idx),
+                wind_wave_height_m=_v(marine_data.hourly.wind_wave_height, hour_idx),
+                wave_direction_deg=_v(marine_data.hourly.wave_direction, hour_idx),
+                swell_wave_direction_deg=_v(
+                    marine_data.hourly.swell_wave_direction, hour_idx
+                ),
+                wave_period_s=_v(marine_data.hourly.wave_period, hour_idx),
+                swell_wave_period_s=_v(marine_data.hourly.swell_wave_period, hour_idx),
+                wind_speed_knots=_wh("windspeed_10m", hour_idx),
+                wind_direction_deg=_wh("winddirection_10m", hour_idx),
+                wind_gusts_knots=_wh("windgusts_10m", hour_idx),
+                temperature_c=_wh("temperature_2m", hour_idx),
+                daylight=True,
+                hours_ahead=index.hours_between(current_idx, hour_idx),
+            )
+            hourly_forecasts.append(hour_forecast)
+
+        # get 5 day forecast, from upstream daily data when it was requested
+        upstream_daily = (
+            daily_window is None
+            and marine_data.daily is not None
+            and (weather_data is None or weather_daily is not None)
+        )
+        if upstream_daily:
+            forecast_days = []
+            dates = marine_data.daily.time[:5]
+            light_times = first_and_last_light(
+                dates, latitude, longitude, date_offsets(dates, zone) if dates else 0
+            )
+            for i in range(len(dates)):
+                day_forecast = DailyForecast(
+                    date=marine_data.daily.time[i],
+                    first_light=light_times[i][0],
+                    last_light=light_times[i][1],
+                    wave_height_max_m=_v(marine_data.daily.wave_height_max, i),
+                    swell_wave_height_max_m=_v(
+                        marine_data.daily.swell_wave_height_max, i
+                    ),
+                    wind_wave_height_max_m=_v(
+                        marine_data.daily.wind_wave_height_max, i
                     ),
-                    wind_wave_height_m=_v(
-                        marine_data.hourly.wind_wave_height, hour_idx
+                    wave_direction_dominant_deg=_v(
+                        marine_data.daily.wave_direction_dominant, i
                     ),
-                    wave_direction_deg=_v(marine_data.hourly.wave_direction, hour_idx),
-                    swell_wave_direction_deg=_v(
-                        marine_data.hourly.swell_wave_direction, hour_idx
+                    swell_wave_direction_dominant_deg=_v(
+                        marine_data.daily.swell_wave_direction_dominant, i
                     ),
-                    wave_period_s=_v(marine_data.hourly.wave_period, hour_idx),
-                    swell_wave_period_s=_v(
-                        marine_data.hourly.swell_wave_period, hour_idx
+                    wave_period_max_s=_v(marine_data.daily.wave_period_max, i),
+                    swell_wave_period_max_s=_v(
+                        marine_data.daily.swell_wave_period_max, i
                     ),
-                    wind_speed_knots=_v(weather_data.hourly.windspeed_10m, hour_idx),
-                    wind_direction_deg=_v(
-                        weather_data.hourly.winddirection_10m, hour_idx
+                    wind_speed_max_knots=_w(weather_daily, "windspeed_10m_max", i),
+                    wind_direction_dominant_deg=_w(
+                        weather_daily, "winddirection_10m_dominant", i
                     ),
-                    wind_gusts_knots=_v(weather_data.hourly.windgusts_10m, hour_idx),
-                    temperature_c=_v(weather_data.hourly.temperature_2m, hour_idx),
+                    wind_gusts_max_knots=_w(weather_daily, "windgusts_10m_max", i),
+                    temperature_max_c=_w(weather_daily, "temperature_2m_max", i),
+                    temperature_min_c=_w(weather_daily, "temperature_2m_min", i),
                 )
-                hourly_forecasts.append(hour_forecast)
-
-        # get 5 day forecast
-        forecast_days = []
-        for i in range(min(5, len(marine_data.daily.time))):
-            day_forecast = DailyForecast(
-                date=marine_data.daily.time[i],
-                wave_height_max_m=_v(marine_data.daily.wave_height_max, i),
-                swell_wave_height_max_m=_v(marine_data.daily.swell_wave_height_max, i),
-                wind_wave_height_max_m=_v(marine_data.daily.wind_wave_height_max, i),
-                wave_direction_dominant_deg=_v(
-                    marine_data.daily.wave_direction_dominant, i
-                ),
-                swell_wave_direction_dominant_deg=_v(
-                    marine_data.daily.swell_wave_direction_dominant, i
-                ),
-                wave_period_max_s=_v(marine_data.daily.wave_period_max, i),
-                swell_wave_period_max_s=_v(marine_data.daily.swell_wave_period_max, i),
-                wind_speed_max_knots=_v(weather_data.daily.windspeed_10m_max, i),
-                wind_direction_dominant_deg=_v(
-                    weather_data.daily.winddirection_10m_dominant, i
-                ),
-                wind_gusts_max_knots=_v(weather_data.daily.windgusts_10m_max, i),
-                temperature_max_c=_v(weather_data.daily.temperature_2m_max, i),
-                temperature_min_c=_v(weather_data.daily.temperature_2m_min, i),
+                forecast_days.append(day_forecast)
+        else:
+            forecast_days = daily_from_hourly(
+                marine_data.hourly,
+                weather_hourly,
+                window=daily_window,
+                days=5,
+                location=(latitude, longitude, zone),
             )
-            forecast_days.append(day_forecast)
 
         # assess surf quality
         current_dict = current.model_dump()
-        quality_notes = ForecastService.assess_surf_quality(current_dict)
+        now_local = str(local[current_idx])[:16] if len(local) else ""
+        next_light = next(
+            (
+                f"{day.date}T{day.first_light}"
+                for day in forecast_days
+                if day.first_light and f"{day.date}T{day.first_light}" > now_local
+            ),
+            None,
+        )
+        quality_notes = ForecastService.assess_surf_quality(current_dict, next_light)
 
         return SurfForecast(
             location=location_name,
@@ -192,4 +296,8 @@ class ForecastService:
             hourly_forecast=hourly_forecasts,
             forecast_5day=forecast_days,
             surf_quality_notes=quality_notes,
+            unavailable_sources=[] if weather_data is not None else ["weather"],
+            shore_facing_deg=shore_facing_deg,
+            timezone="UTC",
+            local_timezone=zone,
         )
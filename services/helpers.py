@@ -2,6 +2,14 @@
 helper utilities for data formatting and conversion
 """
 
+import os
+import unicodedata
+from typing import Optional
+
+# forecasts are fetched and cached per grid cell of this many decimal degrees
+# (2 decimals is ~1.1 km, finer than any open-meteo model grid)
+GRID_DECIMALS = 2
+
 
 def validate_coordinates(latitude: float, longitude: float) -> None:
     """
@@ -24,6 +32,133 @@ def validate_coordinates(latitude: float, longitude: float) -> None:
         )
 
 
+# open-meteo serves at most 16 days of forecast
+MAX_FORECAST_DAYS = 16
+
+
+def validate_forecast_days(forecast_days: int) -> None:
+    """
+    Validate the requested forecast horizon is supported upstream.
+
+    args:
+        forecast_days: number of forecast days (1 to MAX_FORECAST_DAYS)
+
+    raises:
+        ValueError: if forecast_days is out of range
+    """
+    if not 1 <= forecast_days <= MAX_FORECAST_DAYS:
+        raise ValueError(
+            f"Invalid forecast_days: must be between 1 and {MAX_FORECAST_DAYS}, "
+            f"got {forecast_days}"
+        )
+
+
+def upstream_daily_enabled() -> bool:
+    """
+    whether api clients request daily= aggregates upstream
+
+    set SURF_UPSTREAM_DAILY=0 to fetch hourly series only and derive daily
+    values locally (services.aggregate), which shrinks upstream payloads.
+    """
+    return os.getenv("SURF_UPSTREAM_DAILY", "1").lower() not in ("0", "false", "no")
+
+
+def grid_cell(latitude: float, longitude: float) -> tuple[float, float]:
+    """
+    snap coordinates to the center of their forecast grid cell
+
+    args:
+        latitude: latitude in degrees
+        longitude: longitude in degrees
+
+    returns:
+        tuple of (cell latitude, cell longitude)
+    """
+    return round(latitude, GRID_DECIMALS), round(longitude, GRID_DECIMALS)
+
+
+def cell_id(latitude: float, longitude: float) -> str:
+    """
+    stable string id of the grid cell containing the coordinates, e.g. "38.66:-9.20"
+    """
+    lat, lon = grid_cell(latitude, longitude)
+    return f"{lat:.{GRID_DECIMALS}f}:{lon:.{GRID_DECIMALS}f}"
+
+
+def forecast_cache_key(
+    kind: str,
+    latitude: float,
+    longitude: float,
+    forecast_days: int,
+    include_daily: bool,
+    model: Optional[str] = None,
+) -> str:
+    """
+    cache key of an upstream forecast response, e.g. "marine:v2:38.66:-9.20:7:hd"
+    (v2: hourly times in utc)
+
+    args:
+        kind: "marine" or "weather"
+        latitude: latitude in degrees (snapped to its grid cell)
+        longitude: longitude in degrees
+        forecast_days: forecast horizon in days
+        include_daily: whether upstream daily aggregates were requested
+        model: upstream model, for responses of a specific model only
+    """
+    key = (
+        f"{kind}:v2:{cell_id(latitude, longitude)}:{forecast_days}"
+        f":{'hd' if include_daily else 'h'}"
+    )
+    return key if model is None else f"{key}:{model}"
+
+
+def normalize_location_name(name: str) -> str:
+    """
+    normalize a location query for cache keys and deduplication
+
+    strips accents, case and redundant whitespace, so "São  Jacinto" and
+    "sao jacinto" map to the same key.
+
+    args:
+        name: location name as typed by a user
+
+    returns:
+        normalized name
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+# 16-point compass rose for more precision
+# each direction covers 22.5 degrees (360/16); built once, not per call
+COMPASS_POINTS = (
+    "n",
+    "nne",
+    "ne",
+    "ene",
+    "e",
+    "ese",
+    "se",
+    "sse",
+    "s",
+    "ssw",
+    "sw",
+    "wsw",
+    "w",
+    "wnw",
+    "nw",
+    "nnw",
+)
+COMPASS_POINTS_UPPER = tuple(point.upper() for point in COMPASS_POINTS)
+
+
+def compass_index(degrees: float) -> int:
+    """index into COMPASS_POINTS for a direction in degrees"""
+    # normalize to 0-360 and add 11.25 to center each range
+    return int((degrees % 360 + 11.25) / 22.5) % 16
+
+
 def degrees_to_compass(degrees: float) -> str:
     """
     convert degrees to compass direction (n, ne, e, se, s, sw, w, nw)
@@ -34,34 +169,30 @@ def degrees_to_compass(degrees: float) -> str:
     returns:
         compass direction string
     """
-    # normalize to 0-360
-    degrees = degrees % 360
-
-    # 16-point compass rose for more precision
-    # each direction covers 22.5 degrees (360/16)
-    directions = [
-        "n",
-        "nne",
-        "ne",
-        "ene",
-        "e",
-        "ese",
-        "se",
-        "sse",
-        "s",
-        "ssw",
-        "sw",
-        "wsw",
-        "w",
-        "wnw",
-        "nw",
-        "nnw",
-    ]
-
-    # calculate index (add 11.25 to center each range)
-    index = int((degrees + 11.25) / 22.5) % 16
-
-    return directions[index]
+    return COMPASS_POINTS[compass_index(degrees)]
+
+
+def compass_upper(degrees: float) -> str:
+    """uppercase compass direction ("WNW") straight from the lookup table"""
+    return COMPASS_POINTS_UPPER[compass_index(degrees)]
+
+
+def shore_wind(wind_from_deg: float, shore_facing_deg: float) -> str:
+    """
+    label wind relative to a shore: "offshore" (blowing from land to sea),
+    "onshore" or "cross-shore"
+
+    args:
+        wind_from_deg: direction the wind blows from in degrees
+        shore_facing_deg: bearing the shore faces, from land out to sea
+    """
+    # angle between where the wind comes from and where the sea is
+    diff = abs((wind_from_deg - shore_facing_deg + 180) % 360 - 180)
+    if diff <= 45:
+        return "onshore"
+    if diff >= 135:
+        return "offshore"
+    return "cross-shore"
 
 
 def format_direction(degrees: float, uppercase: bool = True) -> str:
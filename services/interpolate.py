@@ -0,0 +1,294 @@
+"""
+approximate forecasts interpolated from nearby cached grid cells
+
+when a location's own cell is not cached but neighbouring cells are, an
+answer can be built without an upstream round trip: each hourly (and daily)
+value is the inverse-distance weighted mean of the nearest cached cells,
+with directions averaged as unit vectors so 350° and 10° give 0°, not 180°.
+
+the index of cached cells is built from one scan of the cache backend on
+first use and then kept current by the cache refresh listener, so it only
+sees other workers' writes made before that scan.
+
+configuration (environment):
+    SURF_INTERPOLATE_MAX_KM: farthest cached cell used (default 15)
+"""
+
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TypeVar
+
+import numpy as np
+from pydantic import BaseModel
+
+from services.cache import add_refresh_listener, get_cache, get_model
+from services.helpers import cell_id
+from services.memory import deep_size, register_cache
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+_DEFAULT_MAX_KM = 15.0
+_NEIGHBOURS = 4
+# inverse distance weighting exponent
+_POWER = 2.0
+# index buckets of this many degrees; queries look at the 3x3 around a point
+_BUCKET_DEG = 0.25
+_EARTH_RADIUS_KM = 6371.0
+_INDEXED_KINDS = ("marine", "weather")
+
+
+def max_distance_km() -> float:
+    try:
+        return float(os.getenv("SURF_INTERPOLATE_MAX_KM", str(_DEFAULT_MAX_KM)))
+    except ValueError:
+        return _DEFAULT_MAX_KM
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """great-circle (haversine) distance"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * _EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _bucket(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / _BUCKET_DEG), math.floor(lon / _BUCKET_DEG)
+
+
+class CellIndex:
+    """cached forecast keys bucketed by location"""
+
+    def __init__(self):
+        # (kind, days, variant) -> bucket -> {key: (lat, lon)}
+        self._buckets: dict[tuple, dict[tuple[int, int], dict[str, tuple]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(key: str) -> Optional[tuple[tuple, float, float]]:
+        parts = key.split(":")
+        # six parts: default-model responses ("marine:v2:lat:lon:days:variant")
+        if len(parts) != 6 or parts[0] not in _INDEXED_KINDS:
+            return None
+        try:
+            lat, lon = float(parts[2]), float(parts[3])
+        except ValueError:
+            return None
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return None
+        return (parts[0], parts[4], parts[5]), lat, lon
+
+    def add(self, key: str) -> None:
+        parsed = self._parse(key)
+        if parsed is None:
+            return
+        series, lat, lon = parsed
+        with self._lock:
+            buckets = self._buckets.setdefault(series, {})
+            buckets.setdefault(_bucket(lat, lon), {})[key] = (lat, lon)
+
+    def discard(self, key: str) -> None:
+        parsed = self._parse(key)
+        if parsed is None:
+            return
+        series, lat, lon = parsed
+        with self._lock:
+            self._buckets.get(series, {}).get(_bucket(lat, lon), {}).pop(key, None)
+
+    def on_refresh(self, key: str, model: BaseModel) -> None:
+        """cache refresh listener"""
+        self.add(key)
+
+    def usage(self) -> tuple[int, int]:
+        """(indexed keys, approximate bytes), for services.memory"""
+        with self._lock:
+            count = sum(
+                len(cells)
+                for buckets in self._buckets.values()
+                for cells in buckets.values()
+            )
+            return count, deep_size(self._buckets)
+
+    def nearest(
+        self, key: str, max_km: float, count: int = _NEIGHBOURS
+    ) -> list[tuple[str, float]]:
+        """
+        cached keys of the same series as key around its cell, nearest first
+
+        args:
+            key: cache key of the cell being asked for (excluded from results)
+            max_km: farthest cell returned
+            count: most cells returned
+
+        returns:
+            (key, distance in km) pairs
+        """
+        parsed = self._parse(key)
+        if parsed is None:
+            return []
+        series, lat, lon = parsed
+        row, col = _bucket(lat, lon)
+        found = []
+        with self._lock:
+            buckets = self._buckets.get(series, {})
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    for other, (olat, olon) in buckets.get(
+                        (row + dr, col + dc), {}
+                    ).items():
+                        if other == key:
+                            continue
+                        d = distance_km(lat, lon, olat, olon)
+                        if d <= max_km:
+                            found.append((other, d))
+        found.sort(key=lambda pair: pair[1])
+        return found[:count]
+
+
+_index: Optional[CellIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> CellIndex:
+    """process-wide index, seeded from the cache backend on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = CellIndex()
+                add_refresh_listener(index.on_refresh)
+                register_cache("interpolate:cells", index.usage)
+                for kind in _INDEXED_KINDS:
+                    try:
+                        for key, _ in get_cache().scan(f"{kind}:"):
+                            index.add(key)
+                    except Exception:
+                        # the backend itself failed (add skips keys it cannot
+                        # parse, so one bad entry never ends the seed)
+                        pass
+                _index = index
+    return _index
+
+
+def _interpolate_section(sections: list[BaseModel], weights: np.ndarray) -> BaseModel:
+    """weighted combination of series models on the first one's time axis"""
+    base = sections[0]
+    times = base.time
+    position = {t: i for i, t in enumerate(times)}
+    data: dict[str, list] = {"time": list(times)}
+    for name in type(base).model_fields:
+        if name == "time":
+            continue
+        matrix = np.full((len(sections), len(times)), np.nan)
+        for row, section in enumerate(sections):
+            for t, v in zip(section.time, getattr(section, name)):
+                i = position.get(t)
+                if i is not None and v is not None:
+                    matrix[row, i] = v
+        valid = ~np.isnan(matrix)
+        w = np.where(valid, weights[:, None], 0.0)
+        total = w.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if "direction" in name:
+                radians = np.deg2rad(np.where(valid, matrix, 0.0))
+                sin = (w * np.sin(radians)).sum(axis=0)
+                cos = (w * np.cos(radians)).sum(axis=0)
+                values = np.mod(np.round(np.rad2deg(np.arctan2(sin, cos))), 360.0)
+            else:
+                values = np.round(
+                    (w * np.where(valid, matrix, 0.0)).sum(axis=0) / total, 2
+                )
+        values[total == 0] = np.nan
+        data[name] = [None if v != v else v for v in values.tolist()]
+    return type(base).model_validate(data)
+
+
+def interpolate_response(
+    key: str, model_cls: type[ResponseT], max_km: Optional[float] = None
+) -> Optional[tuple[ResponseT, list[str]]]:
+    """
+    build a response for key from cached neighbouring cells
+
+    args:
+        key: cache key of the (uncached) cell wanted
+        model_cls: MarineResponse or WeatherResponse
+        max_km: farthest neighbour used (defaults to max_distance_km())
+
+    returns:
+        (interpolated response, neighbour cell ids), or None if no cached
+        cell is close enough
+    """
+    index = get_index()
+    neighbours = []
+    for other, distance in index.nearest(key, max_km or max_distance_km()):
+        model = get_model(other, model_cls)
+        if model is None:
+            # expired or evicted since it was indexed
+            index.discard(other)
+            continue
+        neighbours.append((other, distance, model))
+    if not neighbours:
+        return None
+
+    # an (almost) exact hit takes all the weight instead of dividing by zero
+    distances = np.array([max(d, 1e-3) for _, d, _ in neighbours])
+    weights = 1.0 / distances**_POWER
+    data = {}
+    for name in model_cls.model_fields:
+        sections = [getattr(m, name) for _, _, m in neighbours]
+        if not isinstance(sections[0], BaseModel) and sections[0] is not None:
+            # scalars such as the utc offset: the nearest cell's
+            data[name] = sections[0]
+            continue
+        if any(section is None for section in sections):
+            # e.g. daily aggregates missing from one neighbour
+            data[name] = None
+            continue
+        data[name] = _interpolate_section(sections, weights)
+    cells = [":".join(other.split(":")[2:4]) for other, _, _ in neighbours]
+    return model_cls.model_validate(data), cells
+
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="exact-refresh"
+)
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_exact_cell(latitude: float, longitude: float) -> bool:
+    """
+    fetch the exact cell in the background so the next request hits the cache
+
+    returns:
+        False if a refresh of the cell is already running, or skipped while
+        the upstream quota runs low (api.quota)
+    """
+    from api.marine import get_marine_forecast
+    from api.quota import degraded
+    from api.scheduler import BACKGROUND, priority
+    from api.weather import weather_forecast
+
+    if degraded():
+        return False
+    cell = cell_id(latitude, longitude)
+    with _refreshing_lock:
+        if cell in _refreshing:
+            return False
+        _refreshing.add(cell)
+
+    def refresh():
+        try:
+            with priority(BACKGROUND):
+                get_marine_forecast(latitude, longitude)
+                weather_forecast(latitude, longitude)
+        except Exception:
+            pass
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(cell)
+
+    _refresh_executor.submit(refresh)
+    return True
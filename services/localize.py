@@ -0,0 +1,292 @@
+"""
+canonical forecasts and their conversion to local time and display units
+
+upstream responses are fetched and cached in one canonical form whatever
+the caller prefers: hourly times in utc, wave heights in metres, wind in
+knots and temperatures in celsius. the spot's time zone travels with the
+data, so one cache entry serves every time zone and unit preference and the
+conversion happens per request when a forecast is rendered:
+
+- times: utc timestamps are shifted to the spot's zone (the default) or any
+  other in one numpy pass, with the offset resolved once per day and per
+  hour only on days with a daylight-saving transition.
+- units: Units converts values for rendered text (knots, km/h, m/s or mph;
+  metres or feet; celsius or fahrenheit). json field names keep their
+  canonical units (wave_height_m, wind_speed_knots, ...).
+
+daily values stay keyed by the spot's local dates: upstream aggregates them
+per local day.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Optional, Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+from backend.models import SurfForecast
+from services.solar import nominal_utc_offset
+
+UTC = "UTC"
+# zone names open-meteo answers with when timezone=auto finds no zone (open sea)
+_UNKNOWN_ZONES = ("GMT", "UTC", "")
+_OFFSET_ZONE = re.compile(r"^UTC([+-])(\d{2}):(\d{2})$")
+
+# unit -> (factor from the canonical unit, label)
+WIND_UNITS = {
+    "kn": (1.0, "kn"),
+    "kmh": (1.852, "km/h"),
+    "ms": (0.514444, "m/s"),
+    "mph": (1.150779, "mph"),
+}
+HEIGHT_UNITS = {"m": (1.0, "m"), "ft": (3.28084, "ft")}
+TEMPERATURE_UNITS = {"c": "°C", "f": "°F"}
+
+Times = Union[Sequence[str], np.ndarray]
+
+
+def offset_zone_name(seconds: int) -> str:
+    """fixed-offset zone name, e.g. "UTC+01:00" (plain "UTC" for 0)"""
+    if seconds == 0:
+        return UTC
+    sign = "+" if seconds > 0 else "-"
+    hours, minutes = divmod(abs(seconds) // 60, 60)
+    return f"UTC{sign}{hours:02d}:{minutes:02d}"
+
+
+def get_zone(name: str) -> tzinfo:
+    """
+    tzinfo of an iana zone name, "UTC" or a fixed offset ("UTC+05:30")
+
+    raises:
+        ValueError: if the zone is unknown
+    """
+    if name == UTC:
+        return timezone.utc
+    match = _OFFSET_ZONE.match(name)
+    if match:
+        sign, hours, minutes = match.groups()
+        delta = timedelta(hours=int(hours), minutes=int(minutes))
+        return timezone(-delta if sign == "-" else delta)
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown time zone: {name}") from None
+
+
+def spot_zone(
+    timezone_name: Optional[str], utc_offset_seconds: Optional[int], longitude: float
+) -> str:
+    """
+    the time zone of a spot from what the upstream reported
+
+    the zone name when there is one, else the reported offset, else the
+    nominal offset of the longitude (open sea cells report no zone)
+    """
+    if timezone_name not in _UNKNOWN_ZONES and timezone_name is not None:
+        try:
+            get_zone(timezone_name)
+            return timezone_name
+        except ValueError:
+            pass
+    if utc_offset_seconds:
+        return offset_zone_name(utc_offset_seconds)
+    return offset_zone_name(nominal_utc_offset(longitude))
+
+
+def utc_offsets(utc: np.ndarray, zone: str) -> np.ndarray:
+    """
+    offset in seconds of a zone at each utc instant
+
+    args:
+        utc: datetime64 utc instants
+        zone: as get_zone
+    """
+    tz = get_zone(zone)
+    utc = utc.astype("datetime64[m]")
+    if isinstance(tz, timezone):
+        return np.full(utc.shape, int(tz.utcoffset(None).total_seconds()), np.int64)
+
+    def offset(instant: np.datetime64) -> int:
+        moment = datetime.fromtimestamp(
+            int(instant.astype("datetime64[s]").astype(np.int64)), timezone.utc
+        )
+        return int(moment.astimezone(tz).utcoffset().total_seconds())
+
+    # offsets change at most once or twice a year: resolve them per day and
+    # hour by hour only on days whose start and end disagree
+    days = utc.astype("datetime64[D]")
+    unique, inverse = np.unique(days, return_inverse=True)
+    starts = np.array([offset(day) for day in unique], dtype=np.int64)
+    ends = np.array([offset(day + 1) for day in unique], dtype=np.int64)
+    offsets = starts[inverse]
+    for i in np.flatnonzero(starts != ends):
+        for j in np.flatnonzero(inverse == i):
+            offsets[j] = offset(utc[j])
+    return offsets
+
+
+def local_times(times: Times, zone: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    utc timestamps as wall-clock times of a zone
+
+    returns:
+        (local datetime64[m] times, utc offset in seconds of each)
+    """
+    utc = np.array(times, dtype="datetime64[m]")
+    if utc.size == 0:
+        return utc, np.zeros(0, dtype=np.int64)
+    offsets = utc_offsets(utc, zone)
+    return utc + (offsets // 60).astype("timedelta64[m]"), offsets
+
+
+def date_offsets(dates: Sequence[str], zone: str) -> np.ndarray:
+    """offset in seconds of a zone around noon of each local date"""
+    noon = np.array(dates, dtype="datetime64[D]") + np.timedelta64(12 * 60, "m")
+    return utc_offsets(noon, zone)
+
+
+def _iso(times: np.ndarray) -> list[str]:
+    return np.datetime_as_string(times, unit="m").tolist()
+
+
+def utc_series(payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    an open-meteo response fetched with timeformat=unixtime in canonical form
+
+    hourly times (utc epoch seconds) become utc iso timestamps and daily
+    times (epoch seconds of local midnights) local dates. returns a copy;
+    series already holding iso strings are left alone.
+    """
+    data = dict(payload)
+    offset = data.get("utc_offset_seconds") or 0
+    hourly = data.get("hourly")
+    if hourly and hourly.get("time") and not isinstance(hourly["time"][0], str):
+        seconds = np.array(hourly["time"], dtype=np.int64)
+        data["hourly"] = {
+            **hourly,
+            "time": _iso(seconds.astype("datetime64[s]").astype("datetime64[m]")),
+        }
+    daily = data.get("daily")
+    if daily and daily.get("time") and not isinstance(daily["time"][0], str):
+        seconds = np.array(daily["time"], dtype=np.int64) + offset
+        days = seconds.astype("datetime64[s]").astype("datetime64[D]")
+        data["daily"] = {**daily, "time": np.datetime_as_string(days).tolist()}
+    return data
+
+
+def convert_times(times: Sequence[str], zone: str) -> list[str]:
+    """utc iso timestamps as iso wall-clock times of a zone"""
+    return _iso(local_times(times, zone)[0]) if times else []
+
+
+def localize_forecast(
+    forecast: SurfForecast, zone: Optional[str] = None
+) -> SurfForecast:
+    """
+    a canonical (utc) forecast with its timestamps in a time zone
+
+    args:
+        forecast: forecast as built by ForecastService.parse_forecast_data
+        zone: iana zone, "UTC" or "UTC+hh:mm"; None for the spot's own zone
+
+    returns:
+        a copy with converted timestamps (the forecast itself if nothing changes)
+
+    raises:
+        ValueError: if the zone is unknown or the forecast is not in utc
+    """
+    spot = forecast.local_timezone or UTC
+    target = zone or spot
+    get_zone(target)
+    if target == forecast.timezone:
+        return forecast
+    if forecast.timezone != UTC:
+        raise ValueError(f"forecast is already in {forecast.timezone}")
+
+    hours = [forecast.current_conditions, *forecast.hourly_forecast]
+    stamps = convert_times([h.timestamp for h in hours], target)
+    converted = [h.model_copy(update={"timestamp": t}) for h, t in zip(hours, stamps)]
+
+    days = forecast.forecast_5day
+    if target != spot:
+        # first and last light are wall-clock times of the spot
+        dates = [d.date for d in days]
+        shift = (
+            (date_offsets(dates, target) - date_offsets(dates, spot)) // 60
+            if dates
+            else np.zeros(0, dtype=np.int64)
+        )
+        days = [
+            d.model_copy(
+                update={
+                    "first_light": _shifted(d.first_light, int(minutes)),
+                    "last_light": _shifted(d.last_light, int(minutes)),
+                }
+            )
+            for d, minutes in zip(days, shift)
+        ]
+    return forecast.model_copy(
+        update={
+            "current_conditions": converted[0],
+            "hourly_forecast": converted[1:],
+            "forecast_5day": days,
+            "timezone": target,
+        }
+    )
+
+
+def _shifted(clock: Optional[str], minutes: int) -> Optional[str]:
+    """an "HH:MM" wall-clock time moved by minutes, wrapping around midnight"""
+    if clock is None:
+        return None
+    total = (int(clock[:2]) * 60 + int(clock[3:]) + minutes) % 1440
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+@dataclass(frozen=True)
+class Units:
+    """display units of rendered forecasts (values are stored in kn, m and °C)"""
+
+    wind: str = "kn"
+    height: str = "m"
+    temperature: str = "c"
+
+    def __post_init__(self):
+        for value, allowed, name in (
+            (self.wind, WIND_UNITS, "wind"),
+            (self.height, HEIGHT_UNITS, "height"),
+            (self.temperature, TEMPERATURE_UNITS, "temperature"),
+        ):
+            if value not in allowed:
+                raise ValueError(
+                    f"unknown {name} unit: {value} (expected one of {', '.join(allowed)})"
+                )
+
+    @property
+    def wind_label(self) -> str:
+        return WIND_UNITS[self.wind][1]
+
+    @property
+    def height_label(self) -> str:
+        return HEIGHT_UNITS[self.height][1]
+
+    @property
+    def temperature_label(self) -> str:
+        return TEMPERATURE_UNITS[self.temperature]
+
+    def speed(self, knots: Optional[float]) -> Optional[float]:
+        return None if knots is None else knots * WIND_UNITS[self.wind][0]
+
+    def length(self, metres: Optional[float]) -> Optional[float]:
+        return None if metres is None else metres * HEIGHT_UNITS[self.height][0]
+
+    def degrees(self, celsius: Optional[float]) -> Optional[float]:
+        if celsius is None or self.temperature == "c":
+            return celsius
+        return celsius * 9 / 5 + 32
+
+
+CANONICAL_UNITS = Units()
@@ -0,0 +1,325 @@
+"""
+opt-in memory instrumentation: what the caches hold and what requests allocate
+
+three views, all reported by memory_report():
+
+- caches: in-process structures (cache backend, stale upstream payloads,
+  location and cell indexes) register a usage callback with
+  register_cache(); the report lists their entries and approximate bytes.
+- stored models: bytes of cache entries per kind and model type
+  (MarineResponse, WeatherResponse, ...), from one scan of the backend.
+- live models: pydantic instances found by the garbage collector, counted
+  and sized per class (SurfForecast, MarineHourly, ...), on request only
+  since it walks the whole heap.
+
+with SURF_MEMORY_PROFILE=1 tracemalloc runs from startup and the api
+records, per request type, the change in traced memory across each request
+(approximate under concurrency: other requests allocate meanwhile) and, for
+a SURF_MEMORY_SAMPLE_RATE fraction of requests, a snapshot diff of the
+allocation sites that grew. snapshots cost tens of milliseconds, which is
+why they are sampled.
+
+this module imports nothing from the project so any module can register.
+"""
+
+import gc
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+_DEFAULT_SAMPLE_RATE = 0.05
+# frames kept per traced allocation; sites are grouped by the innermost one
+_TRACE_FRAMES = int(os.getenv("SURF_MEMORY_FRAMES", "1"))
+# allocation sites kept per request type between reports
+_SITES_KEPT = 50
+
+# model type stored under each cache key prefix
+STORED_MODELS = {
+    "marine": "MarineResponse",
+    "weather": "WeatherResponse",
+    "geocode": "GeocodedLocation",
+    "alertrule": "AlertRule",
+    "quota": "QuotaUsage",
+}
+
+Usage = tuple[int, int]
+
+_caches: dict[str, Callable[[], Optional[Usage]]] = {}
+_caches_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("SURF_MEMORY_PROFILE", "0").lower() not in ("0", "false", "no")
+
+
+def sample_rate() -> float:
+    try:
+        return float(os.getenv("SURF_MEMORY_SAMPLE_RATE", str(_DEFAULT_SAMPLE_RATE)))
+    except ValueError:
+        return _DEFAULT_SAMPLE_RATE
+
+
+def deep_size(obj: Any, seen: Optional[set[int]] = None, models: bool = True) -> int:
+    """
+    approximate bytes held by obj and everything it references
+
+    args:
+        obj: object to size
+        seen: ids already counted (shared structures are counted once)
+        models: descend into nested pydantic models; False counts only what
+            obj owns itself, so per-class totals do not double count
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    first = True
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        if not models and not first and isinstance(item, BaseModel):
+            continue
+        first = False
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, bytearray, int, float, bool)) or item is None:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            state = getattr(item, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+            for name in getattr(type(item), "__slots__", ()):
+                value = getattr(item, name, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+
+def register_cache(name: str, usage: Callable[[], Optional[Usage]]) -> None:
+    """
+    report an in-process structure as a cache
+
+    args:
+        name: label in reports; registering a name again replaces it
+        usage: returns (entries, approximate bytes), or None when there is
+            nothing to report; bound methods are held weakly so registering
+            does not keep their object alive
+    """
+    if hasattr(usage, "__self__") and hasattr(usage, "__func__"):
+        method = weakref.WeakMethod(usage)
+
+        def usage() -> Optional[Usage]:
+            bound = method()
+            return None if bound is None else bound()
+
+    with _caches_lock:
+        _caches[name] = usage
+
+
+def cache_usage() -> dict[str, dict[str, int]]:
+    """{name: {"entries", "bytes"}} of every registered cache"""
+    with _caches_lock:
+        caches = dict(_caches)
+    report = {}
+    for name, usage in sorted(caches.items()):
+        try:
+            found = usage()
+        except Exception:
+            continue
+        if found is not None:
+            entries, size = found
+            report[name] = {"entries": entries, "bytes": size}
+    return report
+
+
+def stored_model_usage(entries) -> dict[str, dict[str, Any]]:
+    """
+    cache entries and value bytes per key kind
+
+    args:
+        entries: (key, entry) pairs, e.g. from CacheBackend.scan()
+    """
+    kinds: dict[str, dict[str, Any]] = {}
+    for key, entry in entries:
+        kind = key.split(":", 1)[0]
+        stats = kinds.setdefault(
+            kind, {"model": STORED_MODELS.get(kind), "entries": 0, "bytes": 0}
+        )
+        stats["entries"] += 1
+        stats["bytes"] += len(key) + len(entry.value)
+    return dict(sorted(kinds.items(), key=lambda item: -item[1]["bytes"]))
+
+
+def live_model_usage(top: int = 20) -> dict[str, dict[str, int]]:
+    """
+    live pydantic instances per class, with the bytes each class owns
+    (nested models are counted under their own class)
+    """
+    counts: dict[str, int] = defaultdict(int)
+    sizes: dict[str, int] = defaultdict(int)
+    seen: set[int] = set()
+    for obj in gc.get_objects():
+        if isinstance(obj, BaseModel):
+            name = type(obj).__name__
+            counts[name] += 1
+            sizes[name] += deep_size(obj, seen, models=False)
+    ranked = sorted(sizes, key=lambda name: -sizes[name])[:top]
+    return {name: {"instances": counts[name], "bytes": sizes[name]} for name in ranked}
+
+
+@dataclass
+class _RequestMemory:
+    requests: int = 0
+    net_bytes: int = 0
+    max_net_bytes: int = 0
+    sampled: int = 0
+    # "file:line" -> [bytes, blocks] grown over sampled requests
+    sites: dict[str, list[int]] = field(default_factory=dict)
+
+
+class MemoryProfiler:
+    """tracemalloc deltas and sampled snapshot diffs per request type"""
+
+    def __init__(
+        self, sample: Optional[float] = None, rng: Optional[random.Random] = None
+    ):
+        self.sample = sample_rate() if sample is None else sample
+        self._rng = rng or random.Random()
+        self._requests: dict[str, _RequestMemory] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    @staticmethod
+    def start() -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACE_FRAMES)
+
+    def begin(self) -> Optional[tuple[int, Optional[tracemalloc.Snapshot]]]:
+        """mark the start of a request; None when tracemalloc is off"""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = (
+            tracemalloc.take_snapshot() if self._rng.random() < self.sample else None
+        )
+        return tracemalloc.get_traced_memory()[0], snapshot
+
+    def end(self, token: Optional[tuple], request_type: str) -> None:
+        """record the request begun with token under request_type"""
+        if token is None or not tracemalloc.is_tracing():
+            return
+        before, snapshot = token
+        net = tracemalloc.get_traced_memory()[0] - before
+        grown = []
+        if snapshot is not None:
+            after = tracemalloc.take_snapshot()
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            diff = after.filter_traces(ignore).compare_to(
+                snapshot.filter_traces(ignore), "lineno"
+            )
+            grown = [stat for stat in diff if stat.size_diff > 0][:_SITES_KEPT]
+        with self._lock:
+            stats = self._requests.setdefault(request_type, _RequestMemory())
+            stats.requests += 1
+            stats.net_bytes += net
+            stats.max_net_bytes = max(stats.max_net_bytes, net)
+            if snapshot is not None:
+                stats.sampled += 1
+                for stat in grown:
+                    frame = stat.traceback[0]
+                    site = stats.sites.setdefault(
+                        f"{frame.filename}:{frame.lineno}", [0, 0]
+                    )
+                    site[0] += stat.size_diff
+                    site[1] += stat.count_diff
+                if len(stats.sites) > _SITES_KEPT:
+                    kept = sorted(stats.sites.items(), key=lambda item: -item[1][0])
+                    stats.sites = dict(kept[:_SITES_KEPT])
+
+    def report(self, top: int = 10) -> dict[str, Any]:
+        """per request type totals and the allocation sites that grew most"""
+        with self._lock:
+            requests = {
+                name: {
+                    "requests": stats.requests,
+                    "avg_net_bytes": stats.net_bytes // max(stats.requests, 1),
+                    "max_net_bytes": stats.max_net_bytes,
+                    "sampled": stats.sampled,
+                    "top_sites": [
+                        {"site": site, "bytes": size, "blocks": blocks}
+                        for site, (size, blocks) in sorted(
+                            stats.sites.items(), key=lambda item: -item[1][0]
+                        )[:top]
+                    ],
+                }
+                for name, stats in sorted(self._requests.items())
+            }
+        current, peak = (
+            tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        )
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "requests": requests,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._requests.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+
+_profiler: Optional[MemoryProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> MemoryProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = MemoryProfiler()
+    return _profiler
+
+
+def memory_report(
+    top: int = 10, stored: Optional[Any] = None, models: bool = False
+) -> dict[str, Any]:
+    """
+    everything above in one json-ready dict
+
+    args:
+        top: allocation sites and model classes listed
+        stored: cache (key, entry) pairs to account per model type, if any;
+            read once as a stream (e.g. CacheBackend.scan()), and the section
+            is left out if reading them fails
+        models: include the live pydantic instance census (walks the heap)
+    """
+    report = {
+        "generated_at": time.time(),
+        "caches": cache_usage(),
+        **get_profiler().report(top),
+    }
+    if stored is not None:
+        try:
+            report["stored_models"] = stored_model_usage(stored)
+        except Exception:
+            pass
+    if models:
+        report["live_models"] = live_model_usage(top)
+    return report
@@ -0,0 +1,205 @@
+"""
+end-to-end forecast pipeline shared by the api and the mcp server:
+geocode, fetch marine and weather concurrently, parse
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from api.deadline import Deadline, DeadlineExceeded
+from api.geocoding import geocode_location
+from api.quota import CRITICAL, degraded
+from api.marine import get_marine_forecast
+from api.upstream import UpstreamUnavailableError
+from api.weather import weather_forecast
+from backend.models import (
+    ForecastBatch,
+    MarineResponse,
+    SurfForecast,
+    WeatherResponse,
+)
+from services.aggregate import Window, resolve_window
+from services.cache import get_model
+from services.coast import snap_to_sea
+from services.forecast import ForecastService
+from services.helpers import forecast_cache_key, upstream_daily_enabled
+from services.interpolate import interpolate_response, refresh_exact_cell
+from services.tracing import propagate, span
+
+# horizon the api clients fetch by default, so their cache keys match
+_FORECAST_DAYS = 7
+_FETCH_WORKERS = 16
+_executor = ThreadPoolExecutor(
+    max_workers=_FETCH_WORKERS, thread_name_prefix="forecast-fetch"
+)
+# batch cities run on their own pool: they submit weather fetches to _executor
+# and must never wait on a pool they occupy
+_BATCH_WORKERS = 4
+_batch_executor = ThreadPoolExecutor(
+    max_workers=_BATCH_WORKERS, thread_name_prefix="forecast-batch"
+)
+
+
+class LocationNotFoundError(ValueError):
+    """raised when a location cannot be geocoded"""
+
+
+def fetch_surf_forecast(
+    city_name: str,
+    deadline: Optional[Deadline] = None,
+    allow_partial: bool = False,
+    daily_window: Window = None,
+    approximate: bool = False,
+) -> SurfForecast:
+    """
+    geocode a location and build its surf forecast
+
+    marine and weather are fetched concurrently; both share the deadline.
+
+    args:
+        city_name: name of the city or location
+        deadline: optional request deadline propagated to every upstream call
+        allow_partial: return a marine-only forecast (wind marked unavailable)
+            when weather misses the deadline or its upstream is down
+        daily_window: hour window for daily aggregates ("daylight", "dawn"
+            or (start, end)); None uses whole days
+        approximate: when the (sea-snapped) location's grid cell is not cached, answer from
+            nearby cached cells (interpolated_from lists them) and refresh
+            the exact cell in the background; always on while the upstream
+            quota is critical (api.quota)
+
+    returns:
+        validated SurfForecast
+
+    raises:
+        LocationNotFoundError: if the location cannot be geocoded
+        UpstreamUnavailableError: if a required upstream is failing
+        DeadlineExceeded: if required data misses the deadline
+        ValueError: if an upstream response is invalid
+    """
+    try:
+        lat, lon, full_name = geocode_location(city_name, deadline=deadline)
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise LocationNotFoundError(str(e)) from e
+
+    # inland centroids get null marine series: fetch at the nearest sea cell
+    with span("coast"):
+        point = snap_to_sea(lat, lon)
+    lat, lon, facing = point.latitude, point.longitude, point.shore_facing_deg
+
+    if approximate or degraded(CRITICAL):
+        with span("interpolate"):
+            nearby = _interpolated(lat, lon)
+        if nearby is not None:
+            marine_data, weather_data, cells = nearby
+            refresh_exact_cell(lat, lon)
+            with span("parse_forecast_data"):
+                forecast = ForecastService.parse_forecast_data(
+                    marine_data,
+                    weather_data,
+                    full_name,
+                    lat,
+                    lon,
+                    daily_window=daily_window,
+                    shore_facing_deg=facing,
+                )
+            return forecast.model_copy(update={"interpolated_from": cells})
+
+    weather_future = _executor.submit(
+        propagate(weather_forecast), lat, lon, deadline=deadline
+    )
+    marine_data = get_marine_forecast(lat, lon, deadline=deadline)
+
+    try:
+        timeout = None if deadline is None else deadline.remaining()
+        weather_data = weather_future.result(timeout=timeout)
+    except FutureTimeoutError as e:
+        if not allow_partial:
+            raise DeadlineExceeded("weather: deadline exceeded") from e
+        weather_data = None
+    except (DeadlineExceeded, UpstreamUnavailableError):
+        if not allow_partial:
+            raise
+        weather_data = None
+
+    with span("parse_forecast_data"):
+        return ForecastService.parse_forecast_data(
+            marine_data,
+            weather_data,
+            full_name,
+            lat,
+            lon,
+            daily_window=daily_window,
+            shore_facing_deg=facing,
+        )
+
+
+def fetch_surf_forecasts(
+    city_names: list[str],
+    deadline: Optional[Deadline] = None,
+    daily_window: Window = None,
+    approximate: bool = False,
+) -> ForecastBatch:
+    """
+    forecasts for several locations, fetched a few at a time
+
+    args:
+        city_names: names of cities or locations (duplicates fetched once)
+        deadline: optional deadline shared by the whole batch
+        daily_window: hour window for daily aggregates, as fetch_surf_forecast
+        approximate: as fetch_surf_forecast
+
+    returns:
+        ForecastBatch with the forecasts in request order and an error
+        message for every city that failed
+
+    raises:
+        ValueError: if daily_window is invalid (it would fail every city)
+    """
+    resolve_window(daily_window)
+    names = list(dict.fromkeys(city_names))
+    futures = [
+        _batch_executor.submit(
+            propagate(fetch_surf_forecast),
+            name,
+            deadline=deadline,
+            daily_window=daily_window,
+            approximate=approximate,
+        )
+        for name in names
+    ]
+    forecasts, errors = [], {}
+    for name, future in zip(names, futures):
+        try:
+            forecasts.append(future.result())
+        except Exception as e:
+            errors[name] = str(e) or type(e).__name__
+    return ForecastBatch(forecasts=forecasts, errors=errors)
+
+
+def _interpolated(
+    lat: float, lon: float
+) -> Optional[tuple[MarineResponse, WeatherResponse, list[str]]]:
+    """
+    marine and weather responses interpolated from cached neighbour cells,
+    or None when the exact cell is cached or no neighbour is close enough
+    """
+    include_daily = upstream_daily_enabled()
+    marine_key = forecast_cache_key("marine", lat, lon, _FORECAST_DAYS, include_daily)
+    weather_key = forecast_cache_key("weather", lat, lon, _FORECAST_DAYS, include_daily)
+    if get_model(marine_key, MarineResponse) is not None:
+        return None
+    marine = interpolate_response(marine_key, MarineResponse)
+    if marine is None:
+        return None
+    weather = get_model(weather_key, WeatherResponse)
+    if weather is None:
+        found = interpolate_response(weather_key, WeatherResponse)
+        if found is None:
+            return None
+        weather = found[0]
+    marine_data, cells = marine
+    return marine_data, weather, cells
@@ -0,0 +1,254 @@
+"""
+compact binary snapshots of cached forecast responses for warm restarts
+
+file layout (little-endian):
+    8 bytes   magic b"SURFSNP1"
+    4 bytes   header length (uint32)
+    header    utf-8 json: per entry its key, model kind, location, version
+              (fetch time), expiry, scalar metadata and, per section
+              (hourly / daily), the variable list, row count and offsets
+    padding   to an 8-byte boundary
+    data      per section: an int64 time column (minutes since epoch) then
+              one float32 column per variable, NaN where upstream had null
+
+readers memory-map the file and decode an entry only when it is asked for,
+so loading a snapshot costs one header parse regardless of its size.
+
+configuration (environment):
+    SURF_SNAPSHOT_PATH: snapshot file written on shutdown and loaded on
+        startup; snapshots are disabled when unset
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from backend.models import MarineResponse, WeatherResponse
+from services.cache import CacheBackend, ModelT, add_fallback, get_cache
+
+MAGIC = b"SURFSNP1"
+_ALIGN = 8
+# float32 keeps ~7 significant digits; upstream values have at most 2 decimals
+_DECIMALS = 3
+
+# cache key prefix -> response model stored under it
+SNAPSHOT_MODELS: dict[str, type[BaseModel]] = {
+    "marine": MarineResponse,
+    "weather": WeatherResponse,
+}
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def _encode_section(section: BaseModel) -> tuple[dict, list[bytes]]:
+    """turn an hourly/daily series model into a header dict and column blobs"""
+    data = section.model_dump()
+    times = data.pop("time")
+    variables = list(data)
+    unit = "m" if times and "T" in times[0] else "D"
+    minutes = np.array(times, dtype="datetime64[m]").astype(np.int64)
+    matrix = np.array(
+        [[np.nan if v is None else v for v in data[name]] for name in variables],
+        dtype=np.float32,
+    ).reshape(len(variables), len(times))
+    meta = {"variables": variables, "rows": len(times), "unit": unit}
+    return meta, [minutes.tobytes(), matrix.tobytes()]
+
+
+def write_snapshot(
+    path: str, entries: Iterable[tuple[str, BaseModel, float, float]]
+) -> int:
+    """
+    write responses to a snapshot file atomically
+
+    args:
+        path: destination file
+        entries: (cache key, response model, version, expires_at) tuples
+
+    returns:
+        number of entries written
+    """
+    index = []
+    blobs: list[bytes] = []
+    offset = 0
+    for key, model, version, expires_at in entries:
+        record = {
+            "key": key,
+            "kind": key.split(":", 1)[0],
+            "version": version,
+            "expires_at": expires_at,
+            "meta": {},
+            "sections": {},
+        }
+        parts = key.split(":")
+        if len(parts) >= 4:
+            record["latitude"], record["longitude"] = float(parts[2]), float(parts[3])
+        for name, value in model:
+            if isinstance(value, BaseModel):
+                meta, columns = _encode_section(value)
+                meta["offset"] = offset
+                record["sections"][name] = meta
+                for column in columns:
+                    blobs.append(column + b"\0" * _pad(len(column)))
+                    offset += len(blobs[-1])
+            else:
+                record["meta"][name] = value
+        index.append(record)
+
+    header = json.dumps({"created_at": time.time(), "entries": index}).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * _pad(len(prefix))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(prefix)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(index)
+
+
+def snapshot_cache(path: str, cache: CacheBackend) -> int:
+    """
+    dump every live marine/weather response in a cache backend to a snapshot
+
+    args:
+        path: destination file
+        cache: backend to read from
+
+    returns:
+        number of entries written
+    """
+
+    def entries():
+        for kind, model_cls in SNAPSHOT_MODELS.items():
+            for key, entry in cache.scan(f"{kind}:"):
+                try:
+                    model = model_cls.model_validate_json(entry.value)
+                except ValueError:
+                    continue
+                yield key, model, entry.version, entry.expires_at
+
+    return write_snapshot(path, entries())
+
+
+class SnapshotReader:
+    """
+    memory-mapped snapshot usable as a cache fallback source
+
+    args:
+        path: snapshot file written by write_snapshot
+
+    raises:
+        ValueError: if the file is not a snapshot
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"not a forecast snapshot: {path}")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start : start + header_len])
+        self._data_start = start + header_len + _pad(start + header_len)
+        self.created_at: float = header["created_at"]
+        self.entries: dict[str, dict] = {e["key"]: e for e in header["entries"]}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _decode_section(self, meta: dict) -> dict:
+        rows, variables = meta["rows"], meta["variables"]
+        offset = self._data_start + meta["offset"]
+        minutes = np.frombuffer(self._mmap, dtype=np.int64, count=rows, offset=offset)
+        matrix = np.frombuffer(
+            self._mmap,
+            dtype=np.float32,
+            count=rows * len(variables),
+            offset=offset + minutes.nbytes + _pad(minutes.nbytes),
+        ).reshape(len(variables), rows)
+        times = np.datetime_as_string(
+            minutes.astype("datetime64[m]"), unit=meta["unit"]
+        )
+        values = np.round(matrix.astype(np.float64), _DECIMALS)
+        section = {"time": times.tolist()}
+        for name, column in zip(variables, values):
+            section[name] = [None if v != v else v for v in column.tolist()]
+        return section
+
+    def load_model(
+        self, key: str, model_cls: type[ModelT]
+    ) -> Optional[tuple[ModelT, float, float]]:
+        """
+        decode one entry
+
+        args:
+            key: cache key
+            model_cls: response model to validate into
+
+        returns:
+            (model, version, expires_at), or None if absent or expired
+        """
+        record = self.entries.get(key)
+        if record is None or record["expires_at"] <= time.time():
+            return None
+        data = dict(record["meta"])
+        for name, meta in record["sections"].items():
+            data[name] = self._decode_section(meta)
+        return model_cls.model_validate(data), record["version"], record["expires_at"]
+
+
+def snapshot_path() -> Optional[str]:
+    """configured snapshot file, or None when snapshots are disabled"""
+    return os.getenv("SURF_SNAPSHOT_PATH") or None
+
+
+def load_snapshot_fallback() -> Optional[SnapshotReader]:
+    """
+    map the configured snapshot and register it as a cache fallback
+
+    returns:
+        the reader, or None if snapshots are disabled or the file is missing/invalid
+    """
+    path = snapshot_path()
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        reader = SnapshotReader(path)
+    except (OSError, ValueError):
+        return None
+    add_fallback(reader)
+    return reader
+
+
+def save_snapshot() -> int:
+    """
+    write the process cache to the configured snapshot file
+
+    returns:
+        number of entries written (0 when snapshots are disabled)
+    """
+    path = snapshot_path()
+    if path is None:
+        return 0
+    return snapshot_cache(path, get_cache())
@@ -0,0 +1,198 @@
+"""
+sunrise, sunset and civil twilight computed locally, vectorized over dates
+
+the noaa solar position equations (accurate to about a minute between
+latitudes ±72°) need only the location and the date, so daylight-aware
+forecasts cost no upstream call. every function works on whole arrays of
+dates or hourly timestamps in one numpy pass.
+
+the functions take local wall-clock times and their utc offset, a single
+one or one per timestamp (services.localize resolves them from the spot's
+time zone, daylight saving included). when it is unknown the nominal
+offset of the longitude, round(longitude / 15) hours, is used instead.
+
+polar days and nights are handled: a day on which the sun never sets is
+light throughout, and one on which it never rises is dark throughout.
+"""
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+# zenith angles of the sun's centre: sunrise/sunset (refraction and the
+# solar disc) and civil twilight (6° below the horizon, enough light to surf)
+SUNRISE_ZENITH = 90.833
+CIVIL_ZENITH = 96.0
+
+# named windows: (start event, minutes after it, end event, minutes after it)
+SOLAR_WINDOWS: dict[str, tuple[str, int, str, int]] = {
+    "daylight": ("dawn", 0, "dusk", 0),
+    "dawn": ("dawn", 0, "sunrise", 180),
+}
+
+Offsets = Union[int, np.ndarray]
+
+_EPOCH_JULIAN_DAY = 2440587.5
+_J2000 = 2451545.0
+
+
+def nominal_utc_offset(longitude: float) -> int:
+    """utc offset in seconds of the nominal time zone of a longitude"""
+    return int(round(longitude / 15.0)) * 3600
+
+
+def _solar_terms(longitude: float, dates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(declination in radians, equation of time in minutes) at each date's solar noon"""
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    julian_day = days + _EPOCH_JULIAN_DAY + 0.5 - longitude / 360.0
+    t = (julian_day - _J2000) / 36525.0
+
+    mean_longitude = np.radians(
+        np.mod(280.46646 + t * (36000.76983 + t * 0.0003032), 360)
+    )
+    anomaly = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    centre = (
+        np.sin(anomaly) * (1.914602 - t * (0.004817 + 0.000014 * t))
+        + np.sin(2 * anomaly) * (0.019993 - 0.000101 * t)
+        + np.sin(3 * anomaly) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_longitude = np.radians(
+        np.degrees(mean_longitude) + centre - 0.00569 - 0.00478 * np.sin(omega)
+    )
+    mean_obliquity = (
+        23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    )
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_longitude))
+
+    y = np.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * np.degrees(
+        y * np.sin(2 * mean_longitude)
+        - 2 * eccentricity * np.sin(anomaly)
+        + 4 * eccentricity * y * np.sin(anomaly) * np.cos(2 * mean_longitude)
+        - 0.5 * y * y * np.sin(4 * mean_longitude)
+        - 1.25 * eccentricity * eccentricity * np.sin(2 * anomaly)
+    )
+    return declination, equation_of_time
+
+
+def crossings(
+    latitude: float, longitude: float, dates: np.ndarray, zenith: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    when the sun rises above and sets below a zenith angle on each date
+
+    args:
+        latitude: degrees north
+        longitude: degrees east
+        dates: datetime64 dates
+        zenith: SUNRISE_ZENITH, CIVIL_ZENITH or any angle in degrees
+
+    returns:
+        (rise, set) as float minutes after utc midnight of each date;
+        (-inf, inf) when the sun stays above the angle all day and
+        (inf, -inf) when it never gets above it, so that
+        rise <= minute <= set tests for light in every case
+    """
+    declination, equation_of_time = _solar_terms(longitude, dates)
+    lat = np.radians(latitude)
+    cos_hour_angle = np.cos(np.radians(zenith)) / (
+        np.cos(lat) * np.cos(declination)
+    ) - np.tan(lat) * np.tan(declination)
+    hour_angle = np.degrees(np.arccos(np.clip(cos_hour_angle, -1.0, 1.0)))
+    noon = 720 - 4 * longitude - equation_of_time
+    rise = noon - 4 * hour_angle
+    sets = noon + 4 * hour_angle
+    always = cos_hour_angle < -1
+    never = cos_hour_angle > 1
+    rise[always], sets[always] = -np.inf, np.inf
+    rise[never], sets[never] = np.inf, -np.inf
+    return rise, sets
+
+
+def _events(
+    latitude: float, longitude: float, dates: np.ndarray
+) -> dict[str, np.ndarray]:
+    dawn, dusk = crossings(latitude, longitude, dates, CIVIL_ZENITH)
+    sunrise, sunset = crossings(latitude, longitude, dates, SUNRISE_ZENITH)
+    return {"dawn": dawn, "sunrise": sunrise, "sunset": sunset, "dusk": dusk}
+
+
+def light_mask(
+    times: Union[Sequence[str], np.ndarray],
+    latitude: float,
+    longitude: float,
+    utc_offset_seconds: Optional[Offsets] = None,
+    window: str = "daylight",
+) -> np.ndarray:
+    """
+    which hourly timestamps fall in a solar window
+
+    args:
+        times: local iso timestamps ("2026-02-10T07:00") or datetime64 times
+        latitude: degrees north
+        longitude: degrees east
+        utc_offset_seconds: offset of the timestamps from utc, one or one per
+            timestamp; None uses the nominal offset of the longitude
+        window: a SOLAR_WINDOWS name; "daylight" is civil dawn to civil dusk
+
+    returns:
+        boolean array, one value per timestamp
+    """
+    start_event, start_after, end_event, end_after = SOLAR_WINDOWS[window]
+    local = np.array(times, dtype="datetime64[m]")
+    if local.size == 0:
+        return np.zeros(0, dtype=bool)
+    if utc_offset_seconds is None:
+        utc_offset_seconds = nominal_utc_offset(longitude)
+    days = local.astype("datetime64[D]")
+    dates, inverse = np.unique(days, return_inverse=True)
+    events = _events(latitude, longitude, dates)
+    start = (events[start_event] + start_after)[inverse]
+    end = (events[end_event] + end_after)[inverse]
+    # minutes after utc midnight of each timestamp's local date
+    minutes = (local - days).astype(np.int64) - np.asarray(utc_offset_seconds) // 60
+    return (minutes >= start) & (minutes <= end)
+
+
+def first_and_last_light(
+    dates: Sequence[str],
+    latitude: float,
+    longitude: float,
+    utc_offset_seconds: Optional[Offsets] = None,
+) -> list[tuple[Optional[str], Optional[str]]]:
+    """
+    civil dawn and dusk of each date as local "HH:MM"
+
+    args:
+        dates: local dates ("2026-02-10")
+        latitude: degrees north
+        longitude: degrees east
+        utc_offset_seconds: local offset from utc, one or one per date; None
+            uses the nominal one
+
+    returns:
+        (first light, last light) per date; None on polar days and nights
+    """
+    if not dates:
+        return []
+    if utc_offset_seconds is None:
+        utc_offset_seconds = nominal_utc_offset(longitude)
+    dawn, dusk = crossings(
+        latitude, longitude, np.array(dates, dtype="datetime64[D]"), CIVIL_ZENITH
+    )
+
+    offsets = np.broadcast_to(np.asarray(utc_offset_seconds), dawn.shape).tolist()
+
+    def label(minutes: float, offset: int) -> Optional[str]:
+        if not np.isfinite(minutes):
+            return None
+        local = int(round(minutes + offset / 60)) % 1440
+        return f"{local // 60:02d}:{local % 60:02d}"
+
+    return [
+        (label(a, offset), label(b, offset))
+        for a, b, offset in zip(dawn.tolist(), dusk.tolist(), offsets)
+    ]
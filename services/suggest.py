@@ -0,0 +1,283 @@
+"""
+location typeahead over cached geocodes and the spot catalogue
+
+names are indexed in a trie under their normalized form (no accents or
+case) at every word boundary, so "cap" finds "Costa da Caparica". each trie
+node keeps the best few locations of its subtree, which makes an exact
+prefix lookup a walk of len(query) nodes. when that finds nothing, the
+trie is searched again with a bounded edit distance (one typo from four
+characters on, two from eight), pruning every branch whose best distance
+is already over budget. typos in the first letter are rare, so the search
+starts below it: that alone cuts the nodes visited some twentyfold.
+
+the index is built from one scan of the cache and the catalogue on first
+use, then kept current by the cache refresh listener as new names are
+geocoded.
+
+configuration (environment):
+    SURF_SPOTS_CATALOGUE: spot catalogue (json or csv, as written by
+        cli.geocode_import --catalogue) suggested ahead of geocoded queries
+"""
+
+import csv
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from pydantic import BaseModel
+
+from backend.models import GeocodedLocation, LocationSuggestion
+from services.cache import add_refresh_listener, get_cache
+from services.helpers import normalize_location_name
+from services.memory import deep_size, register_cache
+
+_GEOCODE_PREFIX = "geocode:v1:"
+# locations kept per trie node, and so the most a lookup returns
+_NODE_TOP = 16
+# typeahead repeats the same prefixes across users; answers are cached
+# until the next location is added
+_RESULT_CACHE_SIZE = 1024
+_WORD = re.compile(r"[^\W_]+")
+
+
+def _rank(suggestion: LocationSuggestion) -> tuple:
+    """catalogue spots first, then shorter (more specific) names"""
+    return (suggestion.source != "spot", len(suggestion.name), suggestion.name)
+
+
+def _terms(text: str) -> set[str]:
+    """the normalized text from each word on: "costa da caparica", "da caparica", ..."""
+    words = _WORD.findall(normalize_location_name(text))
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+def max_typos(query: str) -> int:
+    """edits tolerated for a query: none below 4 characters, 2 from 8 on"""
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) < 8 else 2
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        # entry ids of the best-ranked locations in this subtree
+        self.top: list[int] = []
+
+
+class LocationIndex:
+    """trie of location names with typo-tolerant prefix search"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._entries: list[LocationSuggestion] = []
+        self._ranks: list[tuple] = []
+        self._ids: dict[tuple[str, str], int] = {}
+        self._results: "OrderedDict[tuple[str, int], list[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, suggestion: LocationSuggestion) -> bool:
+        """index a location under its name and address; False if already known"""
+        key = (suggestion.source, normalize_location_name(suggestion.name))
+        with self._lock:
+            if key in self._ids:
+                return False
+            entry = len(self._entries)
+            self._ids[key] = entry
+            self._entries.append(suggestion)
+            self._ranks.append(_rank(suggestion))
+            first_part = suggestion.address.split(",", 1)[0]
+            for term in _terms(suggestion.name) | _terms(first_part):
+                self._insert(term, entry)
+            self._results.clear()
+        return True
+
+    def _insert(self, term: str, entry: int) -> None:
+        # caller holds the lock
+        node = self._root
+        self._offer(node, entry)
+        for char in term:
+            node = node.children.setdefault(char, _Node())
+            self._offer(node, entry)
+
+    def _offer(self, node: _Node, entry: int) -> None:
+        top = node.top
+        if entry in top:
+            return
+        rank = self._ranks[entry]
+        if len(top) >= _NODE_TOP and rank >= self._ranks[top[-1]]:
+            return
+        i = len(top)
+        while i > 0 and self._ranks[top[i - 1]] > rank:
+            i -= 1
+        top.insert(i, entry)
+        del top[_NODE_TOP:]
+
+    def suggest(self, query: str, limit: int = 8) -> list[LocationSuggestion]:
+        """
+        locations whose name or address has a word starting with query
+
+        typo-tolerant matches are looked up only when no name starts with query.
+
+        args:
+            query: text typed so far
+            limit: most suggestions returned
+        """
+        words = _WORD.findall(normalize_location_name(query))
+        text = " ".join(words)
+        if not text:
+            return []
+        with self._lock:
+            found = self._results.get((text, limit))
+            if found is None:
+                node = self._walk(text)
+                found = list(node.top[:limit]) if node is not None else []
+                if not found and max_typos(text) > 0:
+                    matches = sorted(self._fuzzy(text, max_typos(text)))
+                    found = [entry for _, entry in matches[:limit]]
+                self._results[(text, limit)] = found
+                if len(self._results) > _RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+            else:
+                self._results.move_to_end((text, limit))
+            return [self._entries[entry] for entry in found]
+
+    def _walk(self, prefix: str) -> Optional[_Node]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy(self, query: str, budget: int) -> list[tuple[tuple, int]]:
+        """
+        ((distance, rank), entry) of locations within budget edits of a
+        prefix of one of their terms
+        """
+        found: dict[int, tuple] = {}
+        first = self._root.children.get(query[0])
+        if first is None:
+            return []
+        n = len(query)
+        over = budget + 1
+        # row of the first letter, which must match; cells further than
+        # budget from the diagonal can never come back under it, so only
+        # the band around it is computed and the rest stays "over"
+        first_row = [min(i, over) for i in range(-1, n)]
+        first_row[0] = 1
+        stack = [(child, char, first_row, 2) for char, child in first.children.items()]
+        while stack:
+            node, char, previous, depth = stack.pop()
+            row = [over] * (n + 1)
+            row[0] = min(depth, over)
+            best = row[0]
+            for i in range(max(1, depth - budget), min(n, depth + budget) + 1):
+                cost = min(
+                    row[i - 1] + 1,
+                    previous[i] + 1,
+                    previous[i - 1] + (query[i - 1] != char),
+                    over,
+                )
+                row[i] = cost
+                if cost < best:
+                    best = cost
+            if row[n] <= budget:
+                # the whole query matched this path: its subtree all qualifies
+                for entry in node.top:
+                    score = (row[n], self._ranks[entry])
+                    if entry not in found or score < found[entry]:
+                        found[entry] = score
+                continue
+            if best <= budget:
+                stack.extend(
+                    (child, next_char, row, depth + 1)
+                    for next_char, child in node.children.items()
+                )
+        return [(score, entry) for entry, score in found.items()]
+
+    def usage(self) -> tuple[int, int]:
+        """(locations, approximate bytes of trie, entries and results), for services.memory"""
+        with self._lock:
+            return len(self._entries), deep_size(
+                (self._root, self._entries, self._ranks, self._ids, self._results)
+            )
+
+    def on_refresh(self, key: str, model: BaseModel) -> None:
+        """cache refresh listener: index newly geocoded queries"""
+        if key.startswith(_GEOCODE_PREFIX) and isinstance(model, GeocodedLocation):
+            self.add(_from_geocode(key[len(_GEOCODE_PREFIX) :], model))
+
+
+def _from_geocode(query: str, location: GeocodedLocation) -> LocationSuggestion:
+    return LocationSuggestion(
+        name=query,
+        address=location.address,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        source="geocode",
+    )
+
+
+def read_catalogue(path: str) -> list[LocationSuggestion]:
+    """spots of a json or csv catalogue written by cli.geocode_import"""
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f)) if path.endswith(".csv") else json.load(f)
+    return [
+        LocationSuggestion(
+            name=row["name"],
+            address=row.get("address") or row["name"],
+            latitude=float(row["latitude"]),
+            longitude=float(row["longitude"]),
+            source="spot",
+        )
+        for row in rows
+    ]
+
+
+def build_index(catalogue: Optional[str] = None) -> LocationIndex:
+    """index the spot catalogue and every geocode in the cache backend"""
+    index = LocationIndex()
+    if catalogue:
+        try:
+            for spot in read_catalogue(catalogue):
+                index.add(spot)
+        except (OSError, ValueError, KeyError):
+            pass
+    try:
+        for key, entry in get_cache().scan(_GEOCODE_PREFIX):
+            try:
+                location = GeocodedLocation.model_validate_json(entry.value)
+            except ValueError:
+                # a malformed or outdated entry: skip it, keep indexing
+                continue
+            index.add(_from_geocode(key[len(_GEOCODE_PREFIX) :], location))
+    except Exception:
+        # the backend itself failed: best-effort like the cache
+        pass
+    return index
+
+
+_index: Optional[LocationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> LocationIndex:
+    """process-wide index, built and registered as a refresh listener on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = build_index(os.getenv("SURF_SPOTS_CATALOGUE"))
+                add_refresh_listener(index.on_refresh)
+                register_cache("suggest:locations", index.usage)
+                _index = index
+    return _index
@@ -0,0 +1,79 @@
+"""
+parsed time index of an hourly series, searched by bisection
+
+hourly series carry their times as utc iso strings ("2026-02-10T08:00").
+TimeIndex parses them once into sorted int64 epoch seconds (the hourly
+models keep it next to the series, see backend.models.HourlySeries), so
+finding the current hour or the hour n hours from now is a binary search
+instead of string comparisons or datetime parsing on every request.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+HOUR = 3600
+
+
+class TimeIndex:
+    """sorted utc epoch seconds of an hourly series"""
+
+    __slots__ = ("epochs",)
+
+    def __init__(self, times: Sequence[str]):
+        self.epochs = np.array(times, dtype="datetime64[s]").astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    @property
+    def datetimes(self) -> np.ndarray:
+        """the times as datetime64[m], without parsing the strings again"""
+        return self.epochs.astype("datetime64[s]").astype("datetime64[m]")
+
+    def at(self, when: float) -> int:
+        """
+        position of the hour containing an instant
+
+        the last time at or before `when`; the first one when the series
+        starts later, the last one when it ended earlier (stale data)
+
+        raises:
+            IndexError: if the series is empty
+        """
+        if not len(self.epochs):
+            raise IndexError("empty time index")
+        i = int(np.searchsorted(self.epochs, when, side="right")) - 1
+        return max(i, 0)
+
+    def find(self, epochs: Sequence[int]) -> np.ndarray:
+        """
+        positions of exact times, e.g. another series' hours in this one
+
+        returns:
+            int array, one position per time; -1 where it is not in the series
+        """
+        wanted = np.asarray(epochs, dtype=np.int64)
+        if not len(self.epochs):
+            return np.full(wanted.shape, -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.epochs, wanted), len(self.epochs) - 1)
+        return np.where(self.epochs[found] == wanted, found, -1)
+
+    def ahead(self, when: float, hours: Sequence[int]) -> np.ndarray:
+        """
+        positions of the hours some hours after the hour containing `when`
+
+        args:
+            when: utc epoch seconds, e.g. time.time()
+            hours: offsets in hours (+3 for "three hours from now")
+
+        returns:
+            int array, one position per offset; -1 where the series has no
+            time at exactly that hour (past its end or in a gap)
+        """
+        start = self.epochs[self.at(when)]
+        return self.find(start + np.asarray(hours, dtype=np.int64) * HOUR)
+
+    def hours_between(self, start: int, end: int) -> int:
+        """whole hours from position start to position end"""
+        return int(self.epochs[end] - self.epochs[start]) // HOUR
@@ -0,0 +1,244 @@
+"""
+lightweight per-request tracing with a timing breakdown per stage
+
+a trace is started per api request or mcp tool call; code marks stages
+with `span("marine")`. spans are only recorded when the trace is sampled
+(SURF_TRACE_SAMPLE_RATE) or forced (e.g. ?debug=timing), so unsampled
+requests pay one context variable lookup per stage.
+
+configuration (environment):
+    SURF_TRACE_SAMPLE_RATE: fraction of requests traced and exported (default 0)
+    SURF_TRACE_FILE: json lines file sampled traces are appended to
+        (default ./surf_traces.jsonl)
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+_DEFAULT_TRACE_FILE = "./surf_traces.jsonl"
+
+
+@dataclass
+class Span:
+    """one timed stage of a trace"""
+
+    name: str
+    parent: Optional[str]
+    start: float
+    duration: float = 0.0
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    def set(self, key: str, value: Any) -> None:
+        """attach an attribute (e.g. cache="hit")"""
+        self.attributes[key] = value
+
+
+class Trace:
+    """spans recorded for one request"""
+
+    def __init__(self, name: str, recorded: bool, sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.recorded = recorded
+        self.sampled = sampled
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> dict[str, float]:
+        """milliseconds per span name (repeated names are summed), plus total"""
+        totals: dict[str, float] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration * 1000
+        totals["total"] = self.duration * 1000
+        return totals
+
+    def server_timing(self) -> str:
+        """value for the Server-Timing response header"""
+        return ", ".join(
+            f"{name.replace(' ', '_')};dur={ms:.1f}"
+            for name, ms in self.breakdown().items()
+        )
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [
+                {
+                    "name": s.name,
+                    "parent": s.parent,
+                    "offset_ms": round((s.start - self._start) * 1000, 3),
+                    "duration_ms": round(s.duration * 1000, 3),
+                    "attributes": s.attributes,
+                }
+                for s in spans
+            ],
+        }
+
+
+class JsonLinesExporter:
+    """append finished traces to a json lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "surf_trace", default=None
+)
+_span_name: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "surf_span", default=None
+)
+_exporter: Optional[JsonLinesExporter] = None
+
+
+def sample_rate() -> float:
+    try:
+        return float(os.getenv("SURF_TRACE_SAMPLE_RATE", "0"))
+    except ValueError:
+        return 0.0
+
+
+def get_exporter() -> JsonLinesExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = JsonLinesExporter(os.getenv("SURF_TRACE_FILE", _DEFAULT_TRACE_FILE))
+    return _exporter
+
+
+def set_exporter(exporter: Optional[JsonLinesExporter]) -> None:
+    """replace the exporter (None re-reads the environment)"""
+    global _exporter
+    _exporter = exporter
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def start_trace(name: str, force: bool = False) -> Iterator[Trace]:
+    """
+    run a request under a new trace
+
+    args:
+        name: trace name, e.g. "GET /forecast"
+        force: record spans even if the trace is not sampled (debug mode)
+
+    yields:
+        the trace; sampled traces are exported when the block exits
+    """
+    rate = sample_rate()
+    sampled = rate > 0 and random.random() < rate
+    trace = Trace(name, recorded=sampled or force, sampled=sampled)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace._start
+        _trace.reset(token)
+        if sampled:
+            try:
+                get_exporter().export(trace)
+            except OSError:
+                pass
+
+
+class _NoopSpan:
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    time a stage of the current trace
+
+    args:
+        name: stage name, e.g. "marine" or "marine.validate"
+        attributes: initial span attributes
+
+    yields:
+        the span (or a no-op stand-in when the trace is not recorded)
+    """
+    trace = _trace.get()
+    if trace is None or not trace.recorded:
+        yield _NOOP_SPAN
+        return
+    current = Span(name, _span_name.get(), time.perf_counter(), attributes=attributes)
+    token = _span_name.set(name)
+    try:
+        yield current
+    except BaseException as e:
+        current.set("error", type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _span_name.reset(token)
+        trace.add(current)
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """decorator running the whole function inside span(name)"""
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    bind fn to the caller's trace context, for work submitted to thread pools
+
+    args:
+        fn: callable to run in another thread
+
+    returns:
+        callable running fn inside a copy of the current context
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def format_breakdown(trace: Trace) -> str:
+    """human-readable timing table, appended to mcp tool output in debug mode"""
+    lines = ["## Timing (ms)"]
+    lines.extend(f"{name}: {ms:.1f}" for name, ms in trace.breakdown().items())
+    return "\n".join(lines)
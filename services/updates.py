@@ -0,0 +1,268 @@
+"""
+live forecast updates pushed to subscribed clients
+
+clients (sse streams, websockets) subscribe to locations. when the api
+clients store a freshly fetched marine or weather response for a
+location's grid cell, the hub rebuilds that location's forecast once from
+the cache and, if it differs from the last one pushed, fans the same
+serialized payload out to every subscriber of the location. dashboards get
+a handful of pushes a day instead of polling /forecast every minute.
+
+refresh listeners run in fetching threads, so forecasts are rebuilt on a
+small worker pool and handed to each subscriber's event loop thread-safely.
+cells with subscribers are refreshed periodically by the api alongside cells
+with alert rules (SURF_ALERT_REFRESH_SECONDS).
+"""
+
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from pydantic import BaseModel
+
+from backend.models import MarineResponse, SurfForecast, WeatherResponse
+from services.cache import add_refresh_listener, get_model
+from services.forecast import ForecastService
+from services.helpers import cell_id, forecast_cache_key, upstream_daily_enabled
+from services.localize import localize_forecast
+
+# forecast kinds (cache key prefixes) a location's forecast is built from
+_REFRESH_KINDS = ("marine", "weather")
+# horizon of the forecasts served by /forecast (services.pipeline)
+_FORECAST_DAYS = 7
+# events a slow subscriber may lag behind before the oldest are dropped;
+# every event is a full snapshot, so only the latest per location matters
+_QUEUE_SIZE = 16
+
+Event = tuple[str, str]
+
+
+class Subscriber:
+    """one connected client: a bounded event queue fed from any thread"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = _QUEUE_SIZE):
+        self._loop = loop
+        self._queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=maxsize)
+        # query as sent by the client -> topic key
+        self.topics: dict[str, tuple[str, str]] = {}
+
+    def push(self, event: Event) -> None:
+        """queue (event name, json data) for the client; safe from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the client's loop is closed: it is going away
+            pass
+
+    def _put(self, event: Event) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(event)
+
+    async def get(self) -> Event:
+        return await self._queue.get()
+
+
+@dataclass
+class _Topic:
+    """one subscribed location"""
+
+    location: str
+    latitude: float
+    longitude: float
+    shore_facing_deg: Optional[float] = None
+    digest: Optional[bytes] = None
+    subscribers: set[Subscriber] = field(default_factory=set)
+
+
+def _digest(payload: str) -> bytes:
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+
+def _payload(forecast: SurfForecast) -> str:
+    # pushed as /forecast answers by default: in the spot's local time
+    return localize_forecast(forecast).model_dump_json()
+
+
+class UpdateHub:
+    """subscriptions by grid cell, fed by the cache refresh listener"""
+
+    def __init__(self, workers: int = 2):
+        # cell -> location name -> topic
+        self._cells: dict[str, dict[str, _Topic]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="forecast-updates"
+        )
+
+    def subscribe(self, subscriber: Subscriber, city_name: str) -> str:
+        """
+        subscribe to a location and push its current forecast to subscriber
+
+        blocking (geocodes and fetches): call from a worker thread.
+
+        args:
+            subscriber: the client
+            city_name: city or location name
+
+        returns:
+            the resolved location name
+
+        raises:
+            as services.pipeline.fetch_surf_forecast
+        """
+        from services.pipeline import fetch_surf_forecast
+
+        forecast = fetch_surf_forecast(city_name)
+        payload = _payload(forecast)
+        key = (cell_id(forecast.latitude, forecast.longitude), forecast.location)
+        with self._lock:
+            previous = subscriber.topics.get(city_name)
+            if previous is not None and previous != key:
+                self._drop(subscriber, previous)
+            topic = self._cells.setdefault(key[0], {}).setdefault(
+                key[1],
+                _Topic(
+                    forecast.location,
+                    forecast.latitude,
+                    forecast.longitude,
+                    forecast.shore_facing_deg,
+                ),
+            )
+            if topic.digest is None:
+                topic.digest = _digest(payload)
+            topic.subscribers.add(subscriber)
+            subscriber.topics[city_name] = key
+        subscriber.push(("forecast", payload))
+        return forecast.location
+
+    def unsubscribe(self, subscriber: Subscriber, city_name: str) -> bool:
+        """stop updates of one location; False if it was not subscribed"""
+        with self._lock:
+            key = subscriber.topics.pop(city_name, None)
+            if key is None:
+                return False
+            if key not in subscriber.topics.values():
+                self._drop(subscriber, key)
+        return True
+
+    def unsubscribe_all(self, subscriber: Subscriber) -> None:
+        """forget a disconnected client"""
+        with self._lock:
+            for key in set(subscriber.topics.values()):
+                self._drop(subscriber, key)
+            subscriber.topics.clear()
+
+    def _drop(self, subscriber: Subscriber, key: tuple[str, str]) -> None:
+        # caller holds the lock
+        cell, location = key
+        topics = self._cells.get(cell, {})
+        topic = topics.get(location)
+        if topic is None:
+            return
+        topic.subscribers.discard(subscriber)
+        if not topic.subscribers:
+            del topics[location]
+            if not topics:
+                del self._cells[cell]
+
+    def cells(self) -> list[str]:
+        """grid cells with at least one subscriber"""
+        with self._lock:
+            return list(self._cells)
+
+    def on_refresh(self, key: str, model: BaseModel) -> None:
+        """
+        cache refresh listener: rebuild forecasts of a refreshed cell's
+        subscribed locations in the background
+
+        keys look like "marine:v2:38.66:-9.20:7:hd"; other horizons, daily
+        variants and per-model ensemble members do not feed /forecast.
+        """
+        parts = key.split(":")
+        if (
+            len(parts) != 6
+            or parts[0] not in _REFRESH_KINDS
+            or parts[4] != str(_FORECAST_DAYS)
+        ):
+            return
+        cell = f"{parts[2]}:{parts[3]}"
+        with self._lock:
+            if cell not in self._cells:
+                return
+        self._executor.submit(self.publish, cell)
+
+    def publish(self, cell: str) -> int:
+        """
+        push forecasts of a cell's locations that changed since the last push
+
+        returns:
+            number of locations pushed
+        """
+        with self._lock:
+            topics = list(self._cells.get(cell, {}).values())
+        pushed = 0
+        for topic in topics:
+            forecast = _cached_forecast(topic)
+            if forecast is None:
+                continue
+            payload = _payload(forecast)
+            digest = _digest(payload)
+            with self._lock:
+                if digest == topic.digest:
+                    continue
+                topic.digest = digest
+                subscribers = list(topic.subscribers)
+            for subscriber in subscribers:
+                subscriber.push(("forecast", payload))
+            pushed += 1
+        return pushed
+
+
+def _cached_forecast(topic: _Topic) -> Optional[SurfForecast]:
+    """a location's forecast built from the cache alone, None until both halves are cached"""
+    include_daily = upstream_daily_enabled()
+    marine = get_model(
+        forecast_cache_key(
+            "marine", topic.latitude, topic.longitude, _FORECAST_DAYS, include_daily
+        ),
+        MarineResponse,
+    )
+    weather = get_model(
+        forecast_cache_key(
+            "weather", topic.latitude, topic.longitude, _FORECAST_DAYS, include_daily
+        ),
+        WeatherResponse,
+    )
+    if marine is None or weather is None:
+        return None
+    try:
+        return ForecastService.parse_forecast_data(
+            marine,
+            weather,
+            topic.location,
+            topic.latitude,
+            topic.longitude,
+            shore_facing_deg=topic.shore_facing_deg,
+        )
+    except Exception:
+        return None
+
+
+_hub: Optional[UpdateHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> UpdateHub:
+    """process-wide hub, registered as a cache refresh listener on first use"""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                hub = UpdateHub()
+                add_refresh_listener(hub.on_refresh)
+                _hub = hub
+    return _hub
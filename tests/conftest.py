@@ -5,3 +5,23 @@ import sys
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+
+import pytest  # noqa: E402
+
+from services.cache import InProcessCache, set_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache():
+    """keep tests off the shared sqlite cache file"""
+    set_cache(InProcessCache())
+    yield
+    set_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def _forecast_clock(monkeypatch):
+    """ "now" is the first hour of the fixture series (2026-02-10T08:00 utc)"""
+    from services import forecast
+
+    monkeypatch.setattr(forecast, "_clock", lambda: 1770710400.0)
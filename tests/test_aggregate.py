@@ -0,0 +1,73 @@
+import pytest
+
+from backend.models import MarineHourly, WeatherHourly
+from services.aggregate import aggregate_series, daily_from_hourly
+from services.forecast import ForecastService
+from tests.test_forecast import _marine_response, _weather_response
+
+_HOURS = [f"2026-02-10T{h:02d}:00" for h in range(24)] + ["2026-02-11T00:00"]
+
+
+def _hourly(**overrides):
+    n = len(_HOURS)
+    values = dict(
+        time=_HOURS,
+        wave_height=[1.0] * n,
+        wave_direction=[350.0] * 12 + [10.0] * (n - 12),
+        wave_period=[8.0] * n,
+        wind_wave_height=[0.2] * n,
+        wind_wave_direction=[0.0] * n,
+        wind_wave_period=[4.0] * n,
+        swell_wave_height=[0.8] * n,
+        swell_wave_direction=[None] * n,
+        swell_wave_period=[10.0] * n,
+    )
+    values.update(overrides)
+    return MarineHourly(**values)
+
+
+def test_directions_use_circular_mean_and_nulls_stay_missing():
+    days = daily_from_hourly(_hourly())
+
+    assert [d.date for d in days] == ["2026-02-10", "2026-02-11"]
+    assert days[0].wave_direction_dominant_deg in (0.0, 360.0)
+    assert days[0].swell_wave_direction_dominant_deg is None
+    assert days[0].wind_speed_max_knots is None
+
+
+def test_window_restricts_hours():
+    heights = [5.0 if h < 5 else 1.0 for h in range(24)] + [1.0]
+    hourly = _hourly(wave_height=heights)
+
+    assert daily_from_hourly(hourly)[0].wave_height_max_m == 5.0
+    assert daily_from_hourly(hourly, window="dawn")[0].wave_height_max_m == 1.0
+    with pytest.raises(ValueError):
+        daily_from_hourly(hourly, window="midnight")
+
+
+def test_weather_min_max_temperatures():
+    weather = WeatherHourly(
+        time=_HOURS[:3],
+        temperature_2m=[10.0, 14.5, None],
+        windspeed_10m=[5.0, 12.0, 7.0],
+        winddirection_10m=[90.0, 90.0, 90.0],
+        windgusts_10m=[8.0, 20.0, 9.0],
+    )
+
+    day = aggregate_series(
+        weather,
+        {"tmin": ("temperature_2m", "min"), "tmax": ("temperature_2m", "max")},
+    )["2026-02-10"]
+    assert (day["tmin"], day["tmax"]) == (10.0, 14.5)
+
+
+def test_parse_without_upstream_daily_aggregates_hourly():
+    marine, weather = _marine_response(), _weather_response()
+    marine.daily = None
+    weather.daily = None
+
+    forecast = ForecastService.parse_forecast_data(marine, weather, "Test", 0.0, 0.0)
+
+    assert len(forecast.forecast_5day) == 1
+    assert forecast.forecast_5day[0].wave_height_max_m == 2.0
+    assert forecast.forecast_5day[0].temperature_max_c == 20.0
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from backend.models import AlertRule, MarineHourly, WeatherHourly
+from services.alerts import AlertEngine, MemorySink
+from services.cache import add_refresh_listener, put_model, remove_refresh_listener
+from services.helpers import cell_id
+from tests.test_forecast import _marine_response
+
+TIMES = [f"2026-02-10T{h:02d}:00" for h in range(6)]
+CELL = cell_id(38.66, -9.2)
+
+
+def _marine(swell):
+    n = len(swell)
+    return MarineHourly(
+        time=TIMES[:n],
+        wave_height=swell,
+        wave_direction=[0] * n,
+        wave_period=[10] * n,
+        wind_wave_height=[0] * n,
+        wind_wave_direction=[0] * n,
+        wind_wave_period=[0] * n,
+        swell_wave_height=swell,
+        swell_wave_direction=[0] * n,
+        swell_wave_period=[10] * n,
+    )
+
+
+def _weather(direction):
+    n = len(direction)
+    return WeatherHourly(
+        time=TIMES[:n],
+        temperature_2m=[15] * n,
+        windspeed_10m=[8] * n,
+        winddirection_10m=direction,
+        windgusts_10m=[12] * n,
+    )
+
+
+@pytest.fixture
+def engine():
+    engine = AlertEngine(MemorySink())
+    engine.add_rule(
+        AlertRule(
+            rule_id="offshore",
+            subscriber="ana",
+            latitude=38.66,
+            longitude=-9.2,
+            conditions=[{"variable": "swell_wave_height", "op": ">", "value": 1.5}],
+            # easterly (offshore on a west-facing coast), wrapping through north
+            directions=[
+                {"variable": "winddirection_10m", "start_deg": 350, "end_deg": 120}
+            ],
+            min_hours=2,
+        )
+    )
+    return engine
+
+
+def test_fires_once_per_run_of_matching_hours(engine):
+    engine.update(CELL, _weather([90, 90, 90, 10, 200, 200]))
+    alerts = engine.update(CELL, _marine([1.0, 2.0, 2.0, 2.0, 2.0, 1.0]))
+
+    assert [(a.start, a.end, a.hours) for a in alerts] == [
+        ("2026-02-10T01:00", "2026-02-10T03:00", 3)
+    ]
+    assert engine.flush(timeout=5)
+    assert engine.sink.alerts == alerts
+    # identical refresh: nothing changed, nothing evaluated
+    assert engine.update(CELL, _marine([1.0, 2.0, 2.0, 2.0, 2.0, 1.0])) == []
+
+
+def test_short_runs_and_other_cells_do_not_fire(engine):
+    engine.update(CELL, _weather([90] * 6))
+    assert engine.update(CELL, _marine([2.0, 1.0, 2.0, 1.0, 1.0, 1.0])) == []
+    assert engine.update(cell_id(10, 10), _marine([3.0] * 6)) == []
+
+
+def test_changed_hours_extend_a_new_run(engine):
+    engine.update(CELL, _weather([90] * 6))
+    engine.update(CELL, _marine([2.0, 2.0, 1.0, 1.0, 1.0, 1.0]))
+
+    alerts = engine.update(CELL, _marine([2.0, 2.0, 1.0, 1.0, 2.0, 2.0]))
+
+    assert [a.start for a in alerts] == ["2026-02-10T04:00"]
+
+
+def test_cache_refreshes_feed_the_engine(engine):
+    engine.update(CELL, _weather([90] * 6))
+    marine = _marine_response()
+    marine.hourly = _marine([2.0] * 6)
+
+    add_refresh_listener(engine.on_refresh)
+    try:
+        put_model(f"marine:v1:{CELL}:7:h", marine, version=1.0, ttl=60)
+    finally:
+        remove_refresh_listener(engine.on_refresh)
+
+    assert engine.flush(timeout=5)
+    assert len(engine.sink.alerts) == 1
+
+
+def test_slow_or_failing_sinks_do_not_hold_up_the_refresh(engine, caplog):
+    release = threading.Event()
+
+    class _StuckWebhook:
+        def deliver(self, alert):
+            release.wait(5)
+            raise ConnectionError("webhook down")
+
+    engine.sink = _StuckWebhook()
+    engine.update(CELL, _weather([90] * 6))
+    started = time.monotonic()
+    alerts = engine.update(CELL, _marine([2.0] * 6))
+
+    assert len(alerts) == 1
+    assert time.monotonic() - started < 1
+    assert not engine.flush(timeout=0.05)
+    release.set()
+    assert engine.flush(timeout=5)
+    assert "alert offshore for ana" in caplog.text
+
+
+def test_rule_needs_a_condition():
+    with pytest.raises(ValueError):
+        AlertRule(subscriber="ana", latitude=0, longitude=0)
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from backend.models import GeocodedLocation
+from services.cache import InProcessCache, SQLiteCache, get_model, put_model, set_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InProcessCache()
+    return SQLiteCache(str(tmp_path / "cache.db"))
+
+
+def test_set_if_newer_keeps_fresher_entry(backend):
+    assert backend.set_if_newer("k", b"new", version=200.0, ttl=60)
+    assert not backend.set_if_newer("k", b"old", version=100.0, ttl=60)
+    assert backend.get("k").value == b"new"
+    assert backend.set_if_newer("k", b"newer", version=300.0, ttl=60)
+    assert backend.get("k").value == b"newer"
+
+
+def test_expired_entries_are_misses_and_replaceable(backend):
+    backend.set_if_newer("k", b"v", version=200.0, ttl=-1)
+
+    assert backend.get("k") is None
+    assert backend.set_if_newer("k", b"older", version=100.0, ttl=60)
+
+
+def test_sqlite_cache_is_shared_across_threads(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = SQLiteCache(path)
+    reader = SQLiteCache(path)
+    thread = threading.Thread(
+        target=lambda: writer.set_if_newer("k", b"v", version=1.0, ttl=60)
+    )
+    thread.start()
+    thread.join()
+
+    assert reader.get("k").value == b"v"
+
+
+def test_models_round_trip_through_cache(backend):
+    set_cache(backend)
+    location = GeocodedLocation(latitude=38.7, longitude=-9.1, address="Lisboa")
+
+    assert put_model("geocode:v1:lisboa", location, version=1.0, ttl=60)
+    assert get_model("geocode:v1:lisboa", GeocodedLocation) == location
+
+
+def test_sqlite_cache_purges_expired_rows(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), purge_every=3)
+    cache.set_if_newer("quota:v1:gone", b"v", version=1.0, ttl=-1)
+    cache.set_if_newer("geocode:v1:kept", b"v", version=1.0, ttl=60)
+
+    def rows():
+        return cache._conn().execute("SELECT key FROM cache").fetchall()
+
+    assert len(rows()) == 2
+    # the third write triggers a purge
+    cache.set_if_newer("geocode:v1:also", b"v", version=1.0, ttl=60)
+    assert sorted(key for (key,) in rows()) == ["geocode:v1:also", "geocode:v1:kept"]
+    cache.set_if_newer("quota:v1:gone", b"v", version=1.0, ttl=-1)
+    assert cache.purge() == 1
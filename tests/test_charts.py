@@ -0,0 +1,47 @@
+import numpy as np
+
+from frontend.charts import build_hourly_figure, hourly_frame, minmax_downsample_indices
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def test_hourly_frame_aligns_weather_on_marine_time():
+    df = hourly_frame(_marine_response(), _weather_response())
+
+    assert len(df) == 5
+    assert np.isnan(df["wave_height"].iloc[1])
+    assert df["windspeed_10m"].iloc[0] == 5.0
+    assert np.isnan(df["windspeed_10m"].iloc[4])
+
+
+def test_minmax_downsample_keeps_peaks():
+    values = np.zeros(16 * 24 * 10)
+    values[1234] = 9.0
+    values[567] = -3.0
+
+    idx = minmax_downsample_indices(values, 200)
+
+    assert len(idx) <= 200
+    assert 1234 in idx and 567 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_minmax_downsample_keeps_the_whole_x_range():
+    for n, max_points in ((385, 200), (10_000, 300), (1000, 3), (1000, 2)):
+        values = np.sin(np.arange(n))
+        values[n - 2] = 5.0
+
+        idx = minmax_downsample_indices(values, max_points)
+
+        assert len(idx) <= max_points
+        assert idx[0] == 0 and idx[-1] == n - 1
+        if max_points >= 4:
+            assert n - 2 in idx
+    assert minmax_downsample_indices(np.zeros(10), 1).tolist() == [9]
+
+
+def test_build_hourly_figure_uses_webgl_traces():
+    frames = {"a": hourly_frame(_marine_response(), _weather_response())}
+    fig = build_hourly_figure(frames)
+
+    assert fig.data
+    assert all(trace.type == "scattergl" for trace in fig.data)
@@ -0,0 +1,141 @@
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+import api.marine as marine_module
+from api.cluster import Cluster, HashRing, set_cluster
+from api.marine import get_marine_forecast
+from backend.main import create_app
+from cli.cluster import node_env
+from services.helpers import cell_id
+from tests.test_forecast import _marine_response
+
+_OWNER = "http://testserver"
+_ME = "http://node-a"
+_TOKEN = "s3cret"
+
+
+class _Owner:
+    """the owner node: an app in this process (the test client takes no timeout)"""
+
+    def __init__(self):
+        self.client = TestClient(create_app())
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        return self.client.get(url, params=params, headers=headers)
+
+
+@pytest.fixture(autouse=True)
+def _no_cluster():
+    yield
+    set_cluster(None)
+
+
+def _cells(n):
+    return [cell_id(30 + i * 0.01, -9.0 - i * 0.03) for i in range(n)]
+
+
+def _owned_by(cluster, node):
+    cell = next(c for c in _cells(200) if cluster.owner(c) == node)
+    return tuple(float(part) for part in cell.split(":"))
+
+
+def test_membership_changes_move_only_the_changed_nodes_cells():
+    nodes = [f"http://node-{i}" for i in range(4)]
+    ring = HashRing(nodes)
+    cells = _cells(4000)
+    before = {cell: ring.owner(cell) for cell in cells}
+
+    assert all(0.15 < share < 0.35 for share in ring.shares().values())
+
+    ring.add("http://node-4")
+    moved = [cell for cell in cells if ring.owner(cell) != before[cell]]
+    # about a fifth moves, all of it to the new node
+    assert 0.1 < len(moved) / len(cells) < 0.3
+    assert {ring.owner(cell) for cell in moved} == {"http://node-4"}
+
+    ring.remove("http://node-4")
+    assert {cell: ring.owner(cell) for cell in cells} == before
+
+
+def test_non_owner_forwards_to_the_owner_which_fetches_once(monkeypatch):
+    calls = []
+
+    def upstream(url, params, deadline=None):
+        calls.append(params)
+        return _marine_response().model_dump()
+
+    monkeypatch.setattr(marine_module._upstream, "get_json", upstream)
+    cluster = Cluster([_ME, _OWNER], _ME, _TOKEN, session=_Owner())
+    set_cluster(cluster)
+    lat, lon = _owned_by(cluster, _OWNER)
+
+    marine = get_marine_forecast(lat, lon)
+
+    assert marine.hourly.time == _marine_response().hourly.time
+    assert len(calls) == 1
+    assert cluster.stats()["forwarded"] == 1
+    # cells this node owns are fetched here
+    get_marine_forecast(*_owned_by(cluster, _ME))
+    assert len(calls) == 2
+    assert cluster.stats()["forwarded"] == 1
+
+
+def test_unreachable_owner_falls_back_to_a_local_fetch(monkeypatch):
+    class _DeadSession:
+        def get(self, url, params=None, headers=None, timeout=None):
+            raise requests.ConnectionError("down")
+
+    monkeypatch.setattr(
+        marine_module._upstream,
+        "get_json",
+        lambda url, params, deadline=None: _marine_response().model_dump(),
+    )
+    cluster = Cluster([_ME, _OWNER], _ME, _TOKEN, session=_DeadSession())
+    set_cluster(cluster)
+
+    get_marine_forecast(*_owned_by(cluster, _OWNER))
+
+    assert cluster.stats()["fallbacks"] == 1
+    with pytest.raises(ValueError):
+        cluster.set_nodes([_OWNER])
+
+
+def test_local_cluster_nodes_share_membership_but_not_caches(tmp_path):
+    urls = ["http://127.0.0.1:8101", "http://127.0.0.1:8102"]
+
+    first, second = (
+        node_env(urls, i, str(tmp_path), _TOKEN, base={}) for i in range(2)
+    )
+
+    assert first["SURF_CLUSTER_NODES"] == second["SURF_CLUSTER_NODES"]
+    assert second["SURF_CLUSTER_SELF"] == urls[1]
+    assert first["SURF_CACHE_PATH"] != second["SURF_CACHE_PATH"]
+    assert first["SURF_CLUSTER_TOKEN"] == second["SURF_CLUSTER_TOKEN"] == _TOKEN
+
+
+def test_cluster_routes_refuse_callers_without_the_token(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(
+        marine_module._upstream,
+        "get_json",
+        lambda url, params, deadline=None: fetched.append(params),
+    )
+    set_cluster(Cluster([_ME, _OWNER], _OWNER, _TOKEN))
+    client = TestClient(create_app())
+    cell = {"latitude": 38.66, "longitude": -9.2, "days": 7, "daily": "true"}
+    intruder = {"nodes": [_OWNER, "http://attacker.example"]}
+    wrong = {"X-Surf-Cluster-Token": "guess"}
+
+    assert client.get("/internal/marine", params=cell).status_code == 401
+    assert client.get("/internal/marine", params=cell, headers=wrong).status_code == 403
+    assert client.get("/admin/cluster").status_code == 401
+    assert client.put("/admin/cluster", json=intruder).status_code == 401
+    assert client.put("/admin/cluster", json=intruder, headers=wrong).status_code == 403
+    assert fetched == []
+
+    ok = {"X-Surf-Cluster-Token": _TOKEN}
+    status = client.get("/admin/cluster", headers=ok).json()
+    assert sorted(status["nodes"]) == [_ME, _OWNER]
+    with pytest.raises(ValueError):
+        Cluster([_ME], _ME, "")
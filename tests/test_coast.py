@@ -0,0 +1,59 @@
+import numpy as np
+
+from backend.models import SurfForecast
+from cli.build_coastline import build_index
+from services.coast import CoastIndex, get_index
+from services.forecast import ForecastService
+from services.helpers import shore_wind
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def _west_facing_coast():
+    # 1° grid, land east of 10°E between the equator and 20°N
+    fraction = np.zeros((180, 360), dtype=np.float32)
+    fraction[70:90, 190:] = 1.0
+    return CoastIndex(**build_index(fraction, 1.0))
+
+
+def test_build_index_keeps_coastal_sea_cells_facing_the_sea():
+    index = _west_facing_coast()
+
+    point = index.snap(10.5, 12.5, max_km=500)
+
+    # nearest sea cell is just west of the coast, whose beaches face west
+    assert (point.latitude, point.longitude) == (10.5, 9.5)
+    assert abs(point.shore_facing_deg - 270) <= 10
+    assert index.snap(10.5, 40.5, max_km=500).shore_facing_deg is None
+
+
+def test_bundled_index_snaps_inland_centroid_to_the_atlantic():
+    index = get_index()
+    assert index is not None and len(index) > 10_000
+
+    # Biarritz town centre: the surf coast faces west-northwest
+    point = index.snap(43.4832, -1.5586, max_km=25)
+
+    assert point.distance_km < 10
+    assert point.longitude < -1.55
+    assert 260 <= point.shore_facing_deg <= 330
+    # far inland (Madrid) stays put
+    assert index.snap(40.4168, -3.7038, max_km=25).shore_facing_deg is None
+
+
+def test_shore_wind_labels():
+    assert shore_wind(90, 270) == "offshore"
+    assert shore_wind(280, 270) == "onshore"
+    assert shore_wind(0, 270) == "cross-shore"
+    assert shore_wind(350, 10) == "onshore"
+
+
+def test_forecast_context_labels_wind_relative_to_shore():
+    forecast = ForecastService.parse_forecast_data(
+        _marine_response(), _weather_response(), "Test", 1.0, 2.0, shore_facing_deg=0
+    )
+
+    assert isinstance(forecast, SurfForecast)
+    text = forecast.to_llm_context()
+    assert "Shore faces N (0°)" in text
+    # the fixture wind blows from the south, off the land
+    assert "gusts 8 knots, offshore)" in text
@@ -0,0 +1,52 @@
+import pytest
+
+from backend import context
+from backend.context import estimate_tokens, render_forecast_context
+from services.forecast import ForecastService
+from tests.test_forecast import _marine_response, _weather_response
+
+
+@pytest.fixture
+def forecast():
+    return ForecastService.parse_forecast_data(
+        _marine_response(), _weather_response(), "Test Beach", 10.0, 20.0
+    )
+
+
+def test_full_render_matches_prose_layout(forecast):
+    text = render_forecast_context(forecast)
+
+    assert text == context.format_forecast_to_llm_context(forecast)
+    assert "## 5-Day Forecast" in text
+
+
+def test_compact_render_is_smaller(forecast):
+    full = render_forecast_context(forecast)
+    compact = render_forecast_context(forecast, detail="compact")
+
+    assert len(compact) < len(full)
+    assert "day|wave max m" in compact
+    assert "02-11|3.0|2.0|NW|" in compact
+
+
+def test_budget_drops_least_informative_rows(forecast):
+    compact = render_forecast_context(forecast, detail="compact")
+    budget = estimate_tokens(compact) - 5
+
+    text = render_forecast_context(forecast, max_tokens=budget)
+
+    assert estimate_tokens(text) <= budget
+    # the first day is always kept
+    assert "02-10|" in text
+
+
+def test_tiny_budget_truncates(forecast):
+    text = render_forecast_context(forecast, max_tokens=5)
+
+    assert estimate_tokens(text) <= 5
+    assert text.endswith("…")
+
+
+def test_unknown_detail_rejected(forecast):
+    with pytest.raises(ValueError):
+        render_forecast_context(forecast, detail="verbose")
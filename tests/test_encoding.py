@@ -0,0 +1,19 @@
+from backend.encoding import ARROW, JSON, MSGPACK, negotiate
+
+
+def test_json_is_the_default():
+    assert negotiate(None, (JSON, MSGPACK)) == JSON
+    assert negotiate("*/*", (JSON, MSGPACK)) == JSON
+    assert negotiate("application/*", (JSON, MSGPACK)) == JSON
+
+
+def test_explicit_type_beats_wildcard_and_q_is_respected():
+    assert negotiate("*/*, application/msgpack", (JSON, MSGPACK)) == MSGPACK
+    assert negotiate("application/x-msgpack", (JSON, MSGPACK)) == MSGPACK
+    assert negotiate("application/msgpack;q=0.4, */*;q=0.5", (JSON, MSGPACK)) == JSON
+    assert negotiate("*/*, application/json;q=0", (JSON, MSGPACK)) == MSGPACK
+
+
+def test_unacceptable_or_unoffered_types():
+    assert negotiate("text/csv", (JSON, MSGPACK)) is None
+    assert negotiate(ARROW, (JSON, MSGPACK)) is None
@@ -0,0 +1,59 @@
+import pytest
+
+from backend.models import MarineHourly, MarineResponse
+from services import ensemble
+
+
+def _member(times, height, direction):
+    n = len(times)
+    return MarineResponse(
+        hourly=MarineHourly(
+            time=times,
+            wave_height=height,
+            wave_direction=direction,
+            wave_period=[10] * n,
+            wind_wave_height=[0.2] * n,
+            wind_wave_direction=[0] * n,
+            wind_wave_period=[4] * n,
+            swell_wave_height=height,
+            swell_wave_direction=direction,
+            swell_wave_period=[12] * n,
+        )
+    )
+
+
+def test_statistics_align_members_on_common_axis():
+    a = _member(["2026-02-10T00:00", "2026-02-10T01:00"], [1.0, 2.0], [350, 10])
+    b = _member(["2026-02-10T01:00", "2026-02-10T02:00"], [3.0, None], [30, 90])
+
+    times, members, variables = ensemble.ensemble_statistics({"a": a, "b": b})
+
+    assert times == ["2026-02-10T00:00", "2026-02-10T01:00", "2026-02-10T02:00"]
+    assert members == [1, 2, 1]
+    waves = variables["wave_height"]
+    assert waves.mean == [1.0, 2.5, None]
+    assert waves.spread == [0.0, 0.5, None]
+    assert waves.agreement[1] == 0.8
+    # circular mean of 10 and 30 degrees, and of a single member at 350
+    directions = variables["wave_direction"]
+    assert directions.mean[:2] == [350.0, 20.0]
+    assert directions.agreement[0] == 1.0
+
+
+def test_failed_members_are_reported(monkeypatch):
+    def marine(lat, lon, forecast_days=7, deadline=None, model=None):
+        if model == "dwd_gwam":
+            raise ValueError("invalid marine api response")
+        return _member(["2026-02-10T00:00"], [1.0], [270])
+
+    monkeypatch.setattr(ensemble, "get_marine_forecast", marine)
+
+    responses, failed = ensemble.fetch_ensemble(1.0, 2.0)
+
+    assert sorted(responses) == ["ecmwf_wam025", "meteofrance_wave", "ncep_gfswave025"]
+    assert failed == ["dwd_gwam"]
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(ValueError):
+        ensemble.fetch_ensemble(1.0, 2.0, models=["not-a-model"])
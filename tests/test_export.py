@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import pytest
+
+from cli import export
+from services.coast import CoastPoint
+from tests.test_forecast import _marine_response, _weather_response
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    def marine(lat, lon, forecast_days=7):
+        if lat < 0:
+            raise ValueError("upstream said no")
+        return _marine_response()
+
+    monkeypatch.setattr(export, "get_marine_forecast", marine)
+    monkeypatch.setattr(
+        export,
+        "weather_forecast",
+        lambda lat, lon, forecast_days=7: _weather_response(),
+    )
+    monkeypatch.setattr(
+        export, "geocode_location", lambda name: (38.7, -9.4, f"{name}, Portugal")
+    )
+
+
+def test_read_spots_uses_catalogue_coordinates(tmp_path):
+    path = tmp_path / "catalogue.json"
+    path.write_text(
+        json.dumps([{"name": "Peniche", "latitude": 39.4, "longitude": -9.4}])
+    )
+
+    assert export.read_spots(str(path)) == [export.Spot("Peniche", 39.4, -9.4)]
+
+
+def test_export_streams_rows_and_reports_failures(tmp_path, clients):
+    output = tmp_path / "out.csv"
+    spots = [export.Spot("Peniche"), export.Spot("Broken", -1.0, 0.0)]
+    errors = io.StringIO()
+
+    sink = export.open_sink(str(output))
+    summary = export.export(spots, sink, workers=2, errors=errors)
+    sink.close()
+
+    rows = list(csv.DictReader(output.open()))
+    assert summary.spots == 2 and summary.failed == 1
+    assert summary.rows == len(rows) == 5
+    assert rows[0]["spot"] == "Peniche"
+    assert rows[0]["windspeed_10m"] == "5.0"
+    # weather has no value for later marine hours
+    assert rows[4]["windspeed_10m"] == ""
+    assert "Broken" in errors.getvalue()
+
+
+def test_catalogue_coordinates_are_snapped_to_the_sea(monkeypatch, clients):
+    fetched = []
+    monkeypatch.setattr(
+        export,
+        "snap_to_sea",
+        lambda lat, lon: CoastPoint(lat + 0.1, lon - 0.1, 270.0, 8.0),
+    )
+    monkeypatch.setattr(
+        export,
+        "get_marine_forecast",
+        lambda lat, lon, forecast_days=7: fetched.append((lat, lon))
+        or _marine_response(),
+    )
+
+    rows = export.fetch_spot(export.Spot("Peniche", 39.4, -9.4), days=7)
+
+    assert fetched == [(pytest.approx(39.5), pytest.approx(-9.5))]
+    assert rows[0][1:3] == (pytest.approx(39.5), pytest.approx(-9.5))
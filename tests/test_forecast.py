@@ -17,14 +17,15 @@ from services.forecast import ForecastService
 
 
 def _marine_response():
+    # morning hours: the hourly forecast only lists daylight hours
     return MarineResponse(
         hourly=MarineHourly(
             time=[
-                "2026-02-10T00:00",
-                "2026-02-10T01:00",
-                "2026-02-10T02:00",
-                "2026-02-10T03:00",
-                "2026-02-10T04:00",
+                "2026-02-10T08:00",
+                "2026-02-10T09:00",
+                "2026-02-10T10:00",
+                "2026-02-10T11:00",
+                "2026-02-10T12:00",
             ],
             wave_height=[1.0, None, 2.0, None, 1.5],
             wave_direction=[10, None, 20, 30, 40],
@@ -54,7 +55,7 @@ def _marine_response():
 def _weather_response():
     return WeatherResponse(
         hourly=WeatherHourly(
-            time=["2026-02-10T00:00", "2026-02-10T01:00"],
+            time=["2026-02-10T08:00", "2026-02-10T09:00"],
             temperature_2m=[20.0, None],
             windspeed_10m=[5.0, None],
             winddirection_10m=[180.0, None],
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from cli import geocode_import
+
+
+class _Limiter:
+    def __init__(self):
+        self.calls = 0
+
+    def wait(self):
+        self.calls += 1
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    queried = []
+
+    def geocode(name):
+        queried.append(name)
+        if name == "Nowhere":
+            raise ValueError(f"could not find location: {name}")
+        return 38.7, -9.4, f"{name}, Portugal"
+
+    monkeypatch.setattr(geocode_import, "geocode_location", geocode)
+    return queried
+
+
+def test_read_names_from_csv_and_json(tmp_path):
+    csv_path = tmp_path / "spots.csv"
+    csv_path.write_text("region,name\nwest,Peniche\nwest,Ericeira\n")
+    json_path = tmp_path / "spots.json"
+    json_path.write_text(json.dumps(["Peniche", {"name": "Nazaré"}]))
+
+    assert geocode_import.read_names(str(csv_path)) == ["Peniche", "Ericeira"]
+    assert geocode_import.read_names(str(json_path)) == ["Peniche", "Nazaré"]
+
+
+def test_import_dedupes_and_resumes(tmp_path, geocoder):
+    progress = str(tmp_path / "progress.jsonl")
+    names = ["Nazaré", "nazare ", "Peniche", "Nowhere"]
+
+    limiter = _Limiter()
+    records = geocode_import.import_names(names, progress, limiter=limiter)
+
+    assert geocoder == ["Nazaré", "Peniche", "Nowhere"]
+    assert limiter.calls == 3
+    assert records["nazare"]["status"] == "ok"
+    assert records["nowhere"]["status"] == "not_found"
+
+    geocoder.clear()
+    records = geocode_import.import_names(
+        names + ["Ericeira"], progress, limiter=limiter
+    )
+    assert geocoder == ["Ericeira"]
+    assert len(records) == 4
+
+
+def test_catalogue_lists_geocoded_spots(tmp_path, geocoder):
+    records = geocode_import.import_names(
+        ["Peniche", "Nowhere"], str(tmp_path / "p.jsonl"), limiter=_Limiter()
+    )
+    path = tmp_path / "catalogue.json"
+
+    assert geocode_import.write_catalogue(records.values(), str(path)) == 1
+    [spot] = json.loads(path.read_text())
+    assert spot["address"] == "Peniche, Portugal"
+
+
+def test_rate_limiter_spaces_calls():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    limiter = geocode_import.RateLimiter(1.0, clock=lambda: now[0], sleep=sleep)
+    limiter.wait()
+    limiter.wait()
+    now[0] += 0.25
+    limiter.wait()
+
+    assert slept == [1.0, 0.75]
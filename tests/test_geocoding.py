@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api import geocoding
+from api.upstream import UpstreamUnavailableError
+
+
+@pytest.fixture
+def nominatim(monkeypatch):
+    state = {"down": False}
+
+    def call(breaker, fn, failure_types, bulkhead=None, deadline=None):
+        if state["down"]:
+            raise UpstreamUnavailableError("nominatim", 30.0, "circuit open")
+        return SimpleNamespace(latitude=38.7, longitude=-9.4, address="Lisboa")
+
+    monkeypatch.setattr(geocoding, "guarded_call", call)
+    monkeypatch.setattr(geocoding, "_last_good", geocoding.OrderedDict())
+    return state
+
+
+def test_last_good_answers_are_bounded_and_shared_by_spellings(nominatim, monkeypatch):
+    monkeypatch.setattr(geocoding, "_LAST_GOOD_ENTRIES", 2)
+    for name in ("Lisboa", "Porto", "Faro"):
+        geocoding.geocode_location(name)
+
+    assert list(geocoding._last_good) == [
+        geocoding.geocode_cache_key("Porto"),
+        geocoding.geocode_cache_key("Faro"),
+    ]
+
+    # the cache backend is gone too: only the last good answers remain
+    monkeypatch.setattr(geocoding, "get_model", lambda key, cls: None)
+    nominatim["down"] = True
+    assert geocoding.geocode_location("  FARO ") == (38.7, -9.4, "Lisboa")
+    with pytest.raises(UpstreamUnavailableError):
+        geocoding.geocode_location("Lisboa")
@@ -0,0 +1,103 @@
+import pytest
+
+from backend.models import MarineResponse, WeatherResponse
+from services import interpolate, pipeline
+from services.cache import get_cache, put_model
+from services.helpers import forecast_cache_key
+from tests.test_forecast import _marine_response, _weather_response
+
+
+@pytest.fixture(autouse=True)
+def _fresh_index(monkeypatch):
+    monkeypatch.setattr(interpolate, "_index", None)
+
+
+def _cache(kind, lat, lon, model):
+    put_model(forecast_cache_key(kind, lat, lon, 7, True), model, 1.0, 3600)
+
+
+def _marine_with_direction(direction):
+    response = _marine_response()
+    hourly = response.hourly.model_copy(
+        update={"wave_direction": [direction] * len(response.hourly.time)}
+    )
+    return response.model_copy(update={"hourly": hourly})
+
+
+def test_directions_interpolate_around_north():
+    _cache("marine", 38.61, -9.20, _marine_with_direction(350))
+    _cache("marine", 38.59, -9.20, _marine_with_direction(10))
+
+    found = interpolate.interpolate_response(
+        forecast_cache_key("marine", 38.60, -9.20, 7, True), MarineResponse
+    )
+
+    assert found is not None
+    response, cells = found
+    assert sorted(cells) == ["38.59:-9.20", "38.61:-9.20"]
+    assert response.hourly.wave_direction == [0.0] * 5
+    # scalar series are plain weighted means of equidistant neighbours
+    assert (
+        response.hourly.swell_wave_height == _marine_response().hourly.swell_wave_height
+    )
+
+
+def test_index_seed_skips_keys_it_cannot_place():
+    key = forecast_cache_key("marine", 38.60, -9.20, 7, True)
+    bad = key.replace("38.60", "nan")
+    get_cache().set_if_newer(bad, b"{}", version=1.0, ttl=3600)
+    _cache("marine", 38.61, -9.20, _marine_response())
+
+    found = interpolate.interpolate_response(key, MarineResponse)
+
+    assert found is not None and found[1] == ["38.61:-9.20"]
+
+
+def test_neighbours_beyond_max_distance_are_ignored():
+    # ~22 km north
+    _cache("marine", 38.80, -9.20, _marine_response())
+    key = forecast_cache_key("marine", 38.60, -9.20, 7, True)
+
+    assert interpolate.interpolate_response(key, MarineResponse, max_km=15) is None
+    assert interpolate.interpolate_response(key, MarineResponse, max_km=30) is not None
+
+
+def test_pipeline_approximate_uses_cached_neighbours(monkeypatch):
+    for lat in (38.59, 38.61):
+        _cache("marine", lat, -9.20, _marine_response())
+        _cache("weather", lat, -9.20, _weather_response())
+    refreshed = []
+
+    def unexpected_fetch(*args, **kwargs):
+        raise AssertionError("approximate forecast must not fetch upstream")
+
+    # keep the fake spot where it is rather than snapping it to the coast
+    monkeypatch.setenv("SURF_COAST_SNAP_KM", "0")
+    monkeypatch.setattr(
+        pipeline, "geocode_location", lambda name, deadline=None: (38.60, -9.20, name)
+    )
+    monkeypatch.setattr(pipeline, "get_marine_forecast", unexpected_fetch)
+    monkeypatch.setattr(pipeline, "weather_forecast", unexpected_fetch)
+    monkeypatch.setattr(
+        pipeline, "refresh_exact_cell", lambda lat, lon: refreshed.append((lat, lon))
+    )
+
+    forecast = pipeline.fetch_surf_forecast("Test Beach", approximate=True)
+
+    assert len(forecast.interpolated_from) == 2
+    assert refreshed == [(38.60, -9.20)]
+    assert "approximate forecast" in forecast.to_llm_context()
+
+
+def test_pipeline_approximate_prefers_exact_cell(monkeypatch):
+    _cache("marine", 38.60, -9.20, _marine_response())
+    _cache("marine", 38.61, -9.20, _marine_response())
+    _cache("weather", 38.61, -9.20, _weather_response())
+
+    assert pipeline._interpolated(38.60, -9.20) is None
+    assert isinstance(
+        interpolate.interpolate_response(
+            forecast_cache_key("weather", 38.60, -9.20, 7, True), WeatherResponse
+        )[0],
+        WeatherResponse,
+    )
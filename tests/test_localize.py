@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from backend.context import render_forecast_context
+from services.forecast import ForecastService
+from services.localize import (
+    Units,
+    convert_times,
+    get_zone,
+    localize_forecast,
+    spot_zone,
+    utc_series,
+)
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def _forecast():
+    marine = _marine_response()
+    marine.timezone = "Europe/Lisbon"
+    return ForecastService.parse_forecast_data(
+        marine, _weather_response(), "Test", 38.7, -9.4
+    )
+
+
+def test_times_follow_daylight_saving_transitions():
+    # lisbon moves from utc+0 to utc+1 at 01:00 utc on 2026-03-29
+    times = [f"2026-03-29T{h:02d}:00" for h in range(4)]
+
+    assert convert_times(times, "Europe/Lisbon") == [
+        "2026-03-29T00:00",
+        "2026-03-29T02:00",
+        "2026-03-29T03:00",
+        "2026-03-29T04:00",
+    ]
+    assert convert_times(times, "UTC-03:30")[0] == "2026-03-28T20:30"
+
+
+def test_unixtime_payloads_become_utc_hours_and_local_dates():
+    midnight = 1781049600  # 2026-06-10T00:00 utc
+    payload = {
+        "utc_offset_seconds": 3600,
+        "hourly": {"time": [midnight, midnight + 3600], "wave_height": [1.0, 1.1]},
+        "daily": {"time": [midnight - 3600]},
+    }
+
+    data = utc_series(payload)
+
+    assert data["hourly"]["time"] == ["2026-06-10T00:00", "2026-06-10T01:00"]
+    assert data["hourly"]["wave_height"] == [1.0, 1.1]
+    assert data["daily"]["time"] == ["2026-06-10"]
+    # the cached payload itself is untouched
+    assert payload["hourly"]["time"][0] == midnight
+    assert utc_series(data) == data
+
+
+def test_spot_zone_falls_back_to_offsets():
+    assert spot_zone("Europe/Lisbon", 0, -9.4) == "Europe/Lisbon"
+    assert spot_zone("GMT", 19800, 75.0) == "UTC+05:30"
+    assert spot_zone("GMT", 0, -45.0) == "UTC-03:00"
+    with pytest.raises(ValueError):
+        get_zone("Mars/Olympus")
+
+
+def test_forecast_is_utc_and_localized_per_request():
+    forecast = _forecast()
+
+    assert forecast.timezone == "UTC"
+    assert forecast.local_timezone == "Europe/Lisbon"
+    assert forecast.current_conditions.timestamp == "2026-02-10T08:00"
+
+    local = localize_forecast(forecast)
+    assert local.timezone == "Europe/Lisbon"
+    # lisbon is on utc in february
+    assert local.current_conditions.timestamp == "2026-02-10T08:00"
+    assert localize_forecast(forecast, "UTC") is forecast
+
+    tokyo = localize_forecast(forecast, "Asia/Tokyo")
+    assert tokyo.current_conditions.timestamp == "2026-02-10T17:00"
+    day, there = forecast.forecast_5day[0], tokyo.forecast_5day[0]
+    assert there.first_light != day.first_light
+    assert int(there.first_light[:2]) == (int(day.first_light[:2]) + 9) % 24
+
+
+def test_units_convert_rendered_text_only():
+    forecast = _forecast()
+    imperial = Units(wind="mph", height="ft", temperature="f")
+
+    text = render_forecast_context(forecast, units=imperial)
+    compact = render_forecast_context(forecast, detail="compact", units=imperial)
+
+    assert "ft" in text and "mph" in text and "°F" in text
+    assert "day|wave max ft|" in compact and "temp F" in compact
+    assert render_forecast_context(forecast) != text
+    assert np.isclose(imperial.length(1.0), 3.28084)
+    assert np.isclose(imperial.degrees(100.0), 212.0)
+    with pytest.raises(ValueError):
+        Units(wind="beaufort")
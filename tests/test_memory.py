@@ -0,0 +1,168 @@
+import random
+import time
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from backend.main import create_app
+from backend.models import GeocodedLocation
+from cli.memory_report import format_report
+from services import memory
+from services.cache import get_cache, put_model
+from services.memory import (
+    MemoryProfiler,
+    cache_usage,
+    deep_size,
+    live_model_usage,
+    memory_report,
+    register_cache,
+    stored_model_usage,
+)
+
+
+_PENICHE = GeocodedLocation(latitude=39.3, longitude=-9.4, address="Peniche")
+
+
+class _Inner(BaseModel):
+    values: list[float]
+
+
+class _Outer(BaseModel):
+    name: str
+    inner: _Inner
+
+
+@pytest.fixture
+def tracing():
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    yield
+    if started:
+        tracemalloc.stop()
+
+
+def test_deep_size_counts_shared_objects_once_and_can_stop_at_models():
+    shared = list(range(1000))
+    assert deep_size([shared, shared]) < deep_size([shared, list(range(1000))])
+
+    outer = _Outer(name="x", inner=_Inner(values=[float(i) for i in range(1000)]))
+    assert deep_size(outer) > deep_size(outer, models=False) + 8000
+
+
+def test_registered_methods_do_not_keep_their_object_alive():
+    class Holder:
+        def usage(self):
+            return 3, 300
+
+    holder = Holder()
+    register_cache("test:holder", holder.usage)
+    assert cache_usage()["test:holder"] == {"entries": 3, "bytes": 300}
+
+    del holder
+    assert "test:holder" not in cache_usage()
+
+
+def test_in_process_cache_registers_its_usage():
+    put_model("geocode:v1:peniche", _PENICHE, time.time(), 3600)
+
+    entries = cache_usage()["cache:memory"]["entries"]
+    assert entries == 1
+
+
+def test_stored_models_are_grouped_by_key_kind():
+    put_model("geocode:v1:peniche", _PENICHE, time.time(), 3600)
+    put_model("geocode:v1:ericeira", _PENICHE, time.time(), 3600)
+
+    stored = stored_model_usage(get_cache().scan(""))
+
+    assert stored["geocode"]["model"] == "GeocodedLocation"
+    assert stored["geocode"]["entries"] == 2
+    assert stored["geocode"]["bytes"] > len(_PENICHE.model_dump_json()) * 2
+
+
+def test_stored_models_are_streamed_and_dropped_if_the_scan_fails():
+    put_model("geocode:v1:peniche", _PENICHE, time.time(), 3600)
+
+    def broken_scan():
+        yield from get_cache().scan("")
+        raise ConnectionError("cache went away")
+
+    assert memory_report(stored=get_cache().scan(""))["stored_models"]
+    assert "stored_models" not in memory_report(stored=broken_scan())
+
+
+def test_live_models_are_counted_per_class_without_double_counting():
+    kept = [_Outer(name=str(i), inner=_Inner(values=[1.0] * 100)) for i in range(5)]
+
+    usage = live_model_usage(top=100)
+
+    assert usage["_Outer"]["instances"] >= 5
+    assert usage["_Inner"]["instances"] >= 5
+    # the 100 floats belong to _Inner, not to _Outer as well
+    assert usage["_Inner"]["bytes"] > usage["_Outer"]["bytes"]
+    del kept
+
+
+def test_profiler_records_net_bytes_and_allocation_sites(tracing):
+    profiler = MemoryProfiler(sample=1.0, rng=random.Random(0))
+    kept = []
+
+    token = profiler.begin()
+    kept.append(bytearray(1 << 20))
+    profiler.end(token, "GET /forecast")
+
+    stats = profiler.report()["requests"]["GET /forecast"]
+    assert stats["requests"] == 1 and stats["sampled"] == 1
+    assert stats["max_net_bytes"] >= 1 << 20
+    top = stats["top_sites"][0]
+    assert top["site"].endswith(f"test_memory.py:{_line_of('kept.append(bytearray')}")
+    assert top["bytes"] >= 1 << 20
+
+
+def test_profiler_is_inert_without_tracemalloc():
+    profiler = MemoryProfiler(sample=1.0)
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc enabled for the whole run")
+
+    profiler.end(profiler.begin(), "GET /health")
+
+    assert profiler.report()["requests"] == {}
+
+
+def test_admin_endpoint_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("SURF_MEMORY_PROFILE", raising=False)
+    client = TestClient(create_app())
+
+    assert client.get("/admin/memory").status_code == 404
+
+
+def test_admin_endpoint_reports_requests_by_route(monkeypatch, tracing):
+    monkeypatch.setenv("SURF_MEMORY_PROFILE", "1")
+    monkeypatch.setattr(memory, "_profiler", MemoryProfiler(sample=0.0))
+    put_model("geocode:v1:peniche", _PENICHE, time.time(), 3600)
+    client = TestClient(create_app())
+
+    client.get("/health")
+    client.delete("/alerts/missing")
+    report = client.get("/admin/memory", params={"models": "true"}).json()
+
+    assert report["requests"]["GET /health"]["requests"] == 1
+    assert report["requests"]["DELETE /alerts/{rule_id}"]["requests"] == 1
+    assert report["stored_models"]["geocode"]["entries"] == 1
+    assert "cache:memory" in report["caches"]
+    assert "GeocodedLocation" in report["live_models"]
+
+    text = format_report(report)
+    assert "DELETE /alerts/{rule_id}" in text
+    assert "GeocodedLocation" in text
+
+
+def _line_of(snippet: str) -> int:
+    with open(__file__, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if snippet in line and "_line_of" not in line:
+                return number
+    raise AssertionError(snippet)
@@ -0,0 +1,43 @@
+import pytest
+
+from api.deadline import Deadline, DeadlineExceeded
+from services import pipeline
+from tests.test_forecast import _marine_response
+
+
+@pytest.fixture
+def _slow_weather(monkeypatch):
+    def weather(lat, lon, deadline=None):
+        raise DeadlineExceeded("weather: deadline exceeded")
+
+    monkeypatch.setattr(
+        pipeline, "geocode_location", lambda name, deadline=None: (1.0, 2.0, name)
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "get_marine_forecast",
+        lambda lat, lon, deadline=None: _marine_response(),
+    )
+    monkeypatch.setattr(pipeline, "weather_forecast", weather)
+
+
+def test_partial_forecast_when_weather_misses_deadline(_slow_weather):
+    forecast = pipeline.fetch_surf_forecast(
+        "Test Beach", deadline=Deadline(1), allow_partial=True
+    )
+
+    assert forecast.unavailable_sources == ["weather"]
+    assert forecast.current_conditions.wind_speed_knots is None
+    assert "Wind: unavailable" in forecast.to_llm_context()
+
+
+def test_deadline_error_without_partial(_slow_weather):
+    with pytest.raises(DeadlineExceeded):
+        pipeline.fetch_surf_forecast("Test Beach", deadline=Deadline(1))
+
+
+def test_deadline_caps_timeout():
+    deadline = Deadline(0.5)
+
+    assert deadline.timeout(30) <= 0.5
+    assert not deadline.allows(1.0)
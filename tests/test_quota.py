@@ -0,0 +1,95 @@
+import pytest
+
+from api import quota as quota_module
+from api.quota import CRITICAL, EXHAUSTED, LOW, NORMAL, QuotaTracker
+from api.upstream import Upstream, UpstreamUnavailableError
+from tests.test_upstream import _FakeResponse, _FakeSession
+
+_HOUR = 1770710400.0  # 2026-02-10T08:00 utc
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_counts_are_shared_through_the_cache_and_survive_restarts():
+    clock = _Clock(_HOUR + 60)
+    first = QuotaTracker("om", {"hourly": 100, "daily": 1000}, clock=clock)
+    first.record(3)
+    first.sync()
+
+    # another worker, or this one after a restart
+    second = QuotaTracker("om", {"hourly": 100, "daily": 1000}, clock=clock)
+    second.record(2)
+
+    assert second.used("hourly") == 5
+    assert second.used("daily") == 5
+
+    # a new hour starts from zero; the day keeps counting
+    clock.now += 3600
+    second.sync()
+    assert second.used("hourly") == 0
+    assert second.used("daily") == 5
+
+
+def test_levels_and_projected_exhaustion_follow_the_budget():
+    clock = _Clock(_HOUR + 1800)
+    tracker = QuotaTracker("om", {"hourly": 100}, clock=clock, persist=False)
+
+    tracker.record(80)
+    assert tracker.level() == LOW
+    # 80 calls in half an hour: the last 20 go in 450 seconds
+    assert tracker.projected_exhaustion("hourly") == pytest.approx(clock.now + 450)
+    report = tracker.report()
+    assert report["windows"]["hourly"]["remaining"] == 20
+    assert report["projected_exhaustion"] == "2026-02-10T08:37:30Z"
+    assert report["windows"]["daily"]["budget"] is None
+
+    tracker.record(12)
+    assert tracker.level() == CRITICAL
+    tracker.record(8)
+    assert tracker.level() == EXHAUSTED
+    assert tracker.retry_after() == pytest.approx(1800)
+
+    clock.now += 1800
+    assert tracker.level() == NORMAL
+    assert tracker.projected_exhaustion("hourly") is None
+
+
+def test_429_is_not_retried_and_pauses_the_upstream():
+    def handler(call):
+        response = _FakeResponse(status_code=429)
+        response.headers = {"Retry-After": "120"}
+        return response
+
+    session = _FakeSession(handler)
+    tracker = QuotaTracker("om", {}, persist=False)
+    up = Upstream("test", session, timeout=1, hedge=False, quota=tracker)
+
+    with pytest.raises(UpstreamUnavailableError) as error:
+        up.get_json("http://x", {"a": 1})
+    assert error.value.retry_after == 120
+    assert session.calls == 1
+    assert tracker.used("hourly") == 1
+    assert tracker.level() == EXHAUSTED
+
+    with pytest.raises(UpstreamUnavailableError):
+        up.get_json("http://x", {"a": 1})
+    assert session.calls == 1  # paused, no upstream call
+    assert up.breaker.state == "closed"
+
+
+def test_low_budget_stretches_cache_ttls(monkeypatch):
+    tracker = QuotaTracker("open-meteo", {"hourly": 10}, persist=False)
+    monkeypatch.setattr(quota_module, "_trackers", {"open-meteo": tracker})
+    assert quota_module.cache_ttl(3600) == 3600
+
+    tracker.record(8)
+
+    assert quota_module.degraded()
+    assert not quota_module.degraded(CRITICAL)
+    assert quota_module.cache_ttl(3600) == 3 * 3600
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.upstream import Bulkhead, UpstreamSaturatedError, is_cache_only
+from backend import router
+from backend.main import create_app
+from services import pipeline
+from services.forecast import ForecastService
+from services.pipeline import LocationNotFoundError
+from tests.test_forecast import _marine_response, _weather_response
+
+
+@pytest.fixture
+def client():
+    return TestClient(create_app())
+
+
+def test_overloaded_forecast_is_shed_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(router, "_admission", Bulkhead("f", 0, max_queue=0))
+    monkeypatch.setattr(router, "_cache_only_admission", Bulkhead("c", 0, max_queue=0))
+
+    response = client.get("/forecast", params={"city": "Peniche"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/health").status_code == 200
+
+
+def test_saturated_requests_are_served_from_cache_only(client, monkeypatch):
+    seen = []
+
+    def fetch(city_name, **kwargs):
+        seen.append(is_cache_only())
+        raise UpstreamSaturatedError("open-meteo-marine", retry_after=2)
+
+    monkeypatch.setattr(router, "_admission", Bulkhead("f", 0, max_queue=0))
+    monkeypatch.setattr(router, "fetch_surf_forecast", fetch)
+
+    response = client.get("/forecast", params={"city": "Peniche"})
+
+    assert seen == [True]
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_alert_rules_can_be_created_listed_and_deleted(client):
+    rule = {
+        "subscriber": "ana",
+        "latitude": 38.66,
+        "longitude": -9.2,
+        "conditions": [{"variable": "swell_wave_height", "op": ">", "value": 1.5}],
+    }
+
+    created = client.post("/alerts", json=rule)
+    assert created.status_code == 201
+    rule_id = created.json()["rule_id"]
+
+    listed = client.get("/alerts", params={"subscriber": "ana"}).json()
+    assert [r["rule_id"] for r in listed] == [rule_id]
+    assert client.delete(f"/alerts/{rule_id}").status_code == 204
+    assert client.delete(f"/alerts/{rule_id}").status_code == 404
+
+
+def _forecast(city_name, **kwargs):
+    return ForecastService.parse_forecast_data(
+        _marine_response(), _weather_response(), city_name, 1.0, 2.0
+    )
+
+
+def test_forecast_negotiates_msgpack(client, monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    monkeypatch.setattr(router, "fetch_surf_forecast", _forecast)
+
+    response = client.get(
+        "/forecast",
+        params={"city": "Peniche"},
+        headers={"Accept": "application/msgpack, application/json;q=0.5"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["vary"] == "Accept"
+    assert msgpack.unpackb(response.content)["location"] == "Peniche"
+    assert client.get("/forecast", params={"city": "Peniche"}).json()["location"] == (
+        "Peniche"
+    )
+
+
+def test_forecast_rejects_unacceptable_format(client, monkeypatch):
+    monkeypatch.setattr(router, "fetch_surf_forecast", _forecast)
+
+    response = client.get(
+        "/forecast", params={"city": "Peniche"}, headers={"Accept": "text/csv"}
+    )
+
+    assert response.status_code == 406
+
+
+def test_batch_streams_arrow_with_errors_in_metadata(client, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+
+    def fetch(city_name, **kwargs):
+        if city_name == "Nowhere":
+            raise LocationNotFoundError("no match for Nowhere")
+        return _forecast(city_name)
+
+    monkeypatch.setattr(pipeline, "fetch_surf_forecast", fetch)
+
+    response = client.post(
+        "/forecast/batch",
+        json={"cities": ["Peniche", "Nowhere", "Ericeira"]},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("location").unique().to_pylist() == ["Peniche", "Ericeira"]
+    assert table.num_rows == 2 * len(_forecast("x").hourly_forecast)
+    assert json.loads(table.schema.metadata[b"errors"]) == {
+        "Nowhere": "no match for Nowhere"
+    }
+    assert table.schema.field("daylight").type == pa.bool_()
+    assert table.schema.field("hours_ahead").type == pa.int64()
+    assert table.schema.field("wave_height_m").type == pa.float64()
+    assert set(table.column("daylight").to_pylist()) <= {True, False, None}
+
+
+def test_forecast_times_follow_the_requested_zone(client, monkeypatch):
+    monkeypatch.setattr(router, "fetch_surf_forecast", _forecast)
+
+    default = client.get("/forecast", params={"city": "Peniche"}).json()
+    utc = client.get("/forecast", params={"city": "Peniche", "tz": "UTC"}).json()
+    unknown = client.get("/forecast", params={"city": "Peniche", "tz": "Nowhere/Bay"})
+
+    # the fixture spot is at longitude 2: nominal zone utc+0
+    assert default["timezone"] == "UTC"
+    assert utc["current_conditions"]["timestamp"] == "2026-02-10T08:00"
+    shifted = client.get(
+        "/forecast", params={"city": "Peniche", "tz": "UTC+02:00"}
+    ).json()
+    assert shifted["current_conditions"]["timestamp"] == "2026-02-10T10:00"
+    assert unknown.status_code == 400
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from api.scheduler import BACKGROUND, BULK, INTERACTIVE, Scheduler, priority
+
+
+def _holding(scheduler: Scheduler, name: str):
+    with priority(name):
+        assert scheduler.acquire(timeout=0)
+
+
+def _wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+def test_reserved_slots_are_left_to_interactive_calls():
+    scheduler = Scheduler("t", max_concurrent=2, max_queue=5, max_wait=1, reserved=1)
+
+    _holding(scheduler, BULK)
+    with priority(BACKGROUND):
+        assert not scheduler.acquire(timeout=0.02)
+    _holding(scheduler, INTERACTIVE)
+
+    assert scheduler.stats()["classes"][BULK]["active"] == 1
+
+
+def test_interactive_caller_evicts_queued_bulk_work():
+    scheduler = Scheduler("t", max_concurrent=1, max_queue=1, max_wait=1)
+    _holding(scheduler, INTERACTIVE)
+    results = {}
+
+    def bulk():
+        with priority(BULK):
+            results["bulk"] = scheduler.acquire()
+
+    worker = threading.Thread(target=bulk)
+    worker.start()
+    _wait_for(lambda: scheduler.stats()["waiting"] == 1)
+
+    def interactive():
+        results["interactive"] = scheduler.acquire()
+
+    waiter = threading.Thread(target=interactive)
+    waiter.start()
+    worker.join(2)
+    assert results == {"bulk": False}
+
+    with priority(INTERACTIVE):
+        scheduler.release()
+    waiter.join(2)
+    assert results["interactive"] is True
+    assert scheduler.stats()["classes"][BULK]["evicted"] == 1
+
+
+def test_queued_classes_share_slots_by_weight():
+    scheduler = Scheduler("t", max_concurrent=1, max_queue=20, max_wait=5)
+    _holding(scheduler, INTERACTIVE)
+    order = []
+
+    def call(name):
+        with priority(name):
+            assert scheduler.acquire()
+            order.append(name)
+            scheduler.release()
+
+    threads = [threading.Thread(target=call, args=(INTERACTIVE,)) for _ in range(16)]
+    threads += [threading.Thread(target=call, args=(BULK,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: scheduler.stats()["waiting"] == 18)
+
+    with priority(INTERACTIVE):
+        scheduler.release()
+    for thread in threads:
+        thread.join(2)
+
+    # weights 8:1: bulk gets a turn after every eight interactive calls (the
+    # holder's included), not after all of them
+    assert [i for i, name in enumerate(order) if name == BULK] == [7, 16]
+
+
+def test_rate_tokens_limit_call_starts():
+    scheduler = Scheduler("t", max_concurrent=5, max_queue=5, max_wait=1, rate=20)
+
+    start = time.monotonic()
+    for _ in range(22):
+        assert scheduler.acquire()
+        scheduler.release()
+
+    # a burst of 20, then two more at 20 per second
+    assert time.monotonic() - start >= 0.08
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with priority("urgent"):
+            pass
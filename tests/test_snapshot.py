@@ -0,0 +1,43 @@
+import time
+
+from backend.models import MarineResponse, WeatherResponse
+from services.cache import InProcessCache, add_fallback, clear_fallbacks, get_model
+from services.snapshot import SnapshotReader, snapshot_cache
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def test_snapshot_round_trip_preserves_values_and_nulls(tmp_path):
+    cache = InProcessCache()
+    now = time.time()
+    marine, weather = _marine_response(), _weather_response()
+    cache.set_if_newer(
+        "marine:v1:10.00:20.00:7", marine.model_dump_json().encode(), now, 60
+    )
+    cache.set_if_newer(
+        "weather:v1:10.00:20.00:7", weather.model_dump_json().encode(), now, 60
+    )
+    path = str(tmp_path / "snap.bin")
+
+    assert snapshot_cache(path, cache) == 2
+
+    reader = SnapshotReader(path)
+    loaded, version, _ = reader.load_model("marine:v1:10.00:20.00:7", MarineResponse)
+    assert loaded == marine
+    assert version == now
+    assert reader.entries["marine:v1:10.00:20.00:7"]["latitude"] == 10.0
+    loaded, _, _ = reader.load_model("weather:v1:10.00:20.00:7", WeatherResponse)
+    assert loaded == weather
+
+
+def test_snapshot_serves_cache_misses(tmp_path):
+    source = InProcessCache()
+    marine = _marine_response()
+    source.set_if_newer("marine:k", marine.model_dump_json().encode(), 1.0, 60)
+    path = str(tmp_path / "snap.bin")
+    snapshot_cache(path, source)
+
+    add_fallback(SnapshotReader(path))
+    try:
+        assert get_model("marine:k", MarineResponse) == marine
+    finally:
+        clear_fallbacks()
@@ -0,0 +1,85 @@
+import numpy as np
+
+from services.aggregate import daily_from_hourly
+from services.forecast import ForecastService
+from services.solar import SUNRISE_ZENITH, crossings, first_and_last_light, light_mask
+from tests.test_aggregate import _HOURS, _hourly
+from tests.test_forecast import _marine_response, _weather_response
+
+_LISBON = (38.72, -9.14)
+_SUMMER = 3600
+
+
+def test_sunrise_and_sunset_match_published_times():
+    dates = np.array(["2026-06-21", "2026-12-21"], dtype="datetime64[D]")
+
+    rise, sets = crossings(*_LISBON, dates, SUNRISE_ZENITH)
+
+    # lisbon: 06:12 / 21:05 local (utc+1) at the june solstice, 07:51 / 17:18
+    # utc in december
+    assert abs(rise[0] + 60 - (6 * 60 + 12)) <= 2
+    assert abs(sets[0] + 60 - (21 * 60 + 5)) <= 2
+    assert abs(rise[1] - (7 * 60 + 51)) <= 2
+    assert abs(sets[1] - (17 * 60 + 18)) <= 2
+
+
+def test_first_and_last_light_are_civil_twilight_in_local_time():
+    assert first_and_last_light(["2026-06-21"], *_LISBON, _SUMMER) == [
+        ("05:40", "21:37")
+    ]
+
+
+def test_polar_days_and_nights():
+    hours = [f"2026-06-21T{h:02d}:00" for h in range(24)]
+
+    assert light_mask(hours, 78.2, 15.6).all()
+    assert not light_mask(
+        [h.replace("06-21", "12-21") for h in hours], 78.2, 15.6
+    ).any()
+    assert first_and_last_light(["2026-06-21"], 78.2, 15.6) == [(None, None)]
+
+
+def test_light_mask_uses_the_utc_offset():
+    hours = [f"2026-06-21T{h:02d}:00" for h in range(24)]
+
+    daylight = light_mask(hours, *_LISBON, _SUMMER)
+    dawn = light_mask(hours, *_LISBON, _SUMMER, window="dawn")
+
+    assert np.flatnonzero(daylight).tolist() == list(range(6, 22))
+    assert np.flatnonzero(dawn).tolist() == [6, 7, 8, 9]
+    # an hour later in utc shifts every local hour back
+    assert np.flatnonzero(light_mask(hours, *_LISBON, 0)).tolist() == list(range(5, 21))
+
+
+def test_daylight_window_follows_the_sun_when_the_location_is_known():
+    # waves peak at 19:00 local, after dark at the equator in february
+    heights = [5.0 if h == 19 else 1.0 for h in range(24)] + [1.0]
+    hourly = _hourly(wave_height=heights)
+    assert len(_HOURS) == len(heights)
+
+    clock = daily_from_hourly(hourly, window="daylight")[0]
+    solar = daily_from_hourly(hourly, window="daylight", location=(0.0, 0.0, "UTC"))[0]
+
+    assert clock.wave_height_max_m == 5.0 and clock.first_light is None
+    assert solar.wave_height_max_m == 1.0
+    assert (solar.first_light, solar.last_light) == ("05:49", "18:39")
+
+
+def test_hourly_forecast_skips_the_night():
+    marine, weather = _marine_response(), _weather_response()
+    marine.hourly.time = [f"2026-02-10T{h:02d}:00" for h in range(16, 21)]
+    marine.timezone = "Europe/Lisbon"
+
+    forecast = ForecastService.parse_forecast_data(marine, weather, "Test", *_LISBON)
+
+    # 19:00 is after last light in lisbon in february
+    assert forecast.hourly_forecast == []
+    assert forecast.current_conditions.daylight is True
+
+    marine.hourly.time = [f"2026-02-10T{h:02d}:00" for h in range(20, 25)][:4] + [
+        "2026-02-11T00:00"
+    ]
+    forecast = ForecastService.parse_forecast_data(marine, weather, "Test", *_LISBON)
+    assert forecast.current_conditions.daylight is False
+    assert "dark now - first light at 07:" in forecast.surf_quality_notes
+    assert forecast.forecast_5day[1].first_light.startswith("07:")
@@ -0,0 +1,101 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.main import create_app
+from backend.models import GeocodedLocation, LocationSuggestion
+from services import suggest
+from services.cache import get_cache, put_model
+from services.suggest import LocationIndex, build_index
+
+
+def _spot(name, address=None, source="spot"):
+    return LocationSuggestion(
+        name=name,
+        address=address or f"{name}, Portugal",
+        latitude=38.6,
+        longitude=-9.2,
+        source=source,
+    )
+
+
+def _index():
+    index = LocationIndex()
+    for name in ("Costa da Caparica", "São Jacinto", "Peniche", "Praia da Rocha"):
+        index.add(_spot(name))
+    index.add(_spot("caparica, almada", "Caparica, Almada, Portugal", "geocode"))
+    return index
+
+
+def test_prefix_matches_any_word_ignoring_accents_and_case():
+    index = _index()
+
+    assert [s.name for s in index.suggest("CAPAR")] == [
+        "Costa da Caparica",
+        "caparica, almada",
+    ]
+    assert [s.name for s in index.suggest("sao j")] == ["São Jacinto"]
+    assert [s.name for s in index.suggest("praia da r")] == ["Praia da Rocha"]
+
+
+def test_typos_are_tolerated_only_without_exact_matches():
+    index = _index()
+
+    # a transposition is two edits, over the budget of a 7 letter query
+    assert index.suggest("penihce") == []
+    assert [s.name for s in index.suggest("penche")] == ["Peniche"]
+    assert [s.name for s in index.suggest("jacimto")] == ["São Jacinto"]
+    # short queries must match exactly
+    assert index.suggest("pxn") == []
+
+
+def test_index_is_built_from_catalogue_and_cached_geocodes(tmp_path):
+    catalogue = tmp_path / "catalogue.json"
+    catalogue.write_text(
+        json.dumps(
+            [
+                {
+                    "name": "Supertubos",
+                    "latitude": 39.34,
+                    "longitude": -9.36,
+                    "address": "",
+                }
+            ]
+        )
+    )
+    put_model(
+        "geocode:v1:ericeira",
+        GeocodedLocation(latitude=38.96, longitude=-9.41, address="Ericeira, Mafra"),
+        1.0,
+        3600,
+    )
+
+    index = build_index(str(catalogue))
+
+    assert [s.source for s in index.suggest("super")] == ["spot"]
+    assert [s.name for s in index.suggest("eric")] == ["ericeira"]
+
+
+def test_a_bad_cached_geocode_is_skipped_not_the_rest():
+    get_cache().set_if_newer("geocode:v1:atlantis", b"{}", version=1.0, ttl=3600)
+    put_model(
+        "geocode:v1:ericeira",
+        GeocodedLocation(latitude=38.96, longitude=-9.41, address="Ericeira, Mafra"),
+        1.0,
+        3600,
+    )
+
+    index = build_index()
+
+    assert [s.name for s in index.suggest("eric")] == ["ericeira"]
+    assert index.suggest("atlan") == []
+
+
+def test_suggest_endpoint(monkeypatch):
+    monkeypatch.setattr(suggest, "_index", _index())
+    client = TestClient(create_app())
+
+    response = client.get("/locations/suggest", params={"q": "peni", "limit": 3})
+
+    assert response.status_code == 200
+    assert [s["name"] for s in response.json()] == ["Peniche"]
@@ -0,0 +1,68 @@
+import pytest
+
+from backend.models import MarineHourly, MarineResponse
+from services.cache import get_model, put_model
+from services.forecast import ForecastService
+from services.timeindex import TimeIndex
+from tests.test_forecast import _marine_response, _weather_response
+
+_HOURS = [f"2026-02-10T{h:02d}:00" for h in range(8, 13)]
+_EIGHT = 1770710400  # 2026-02-10T08:00 utc
+
+
+def test_current_hour_is_found_by_bisection():
+    index = TimeIndex(_HOURS)
+
+    assert index.at(_EIGHT + 2 * 3600 + 59 * 60) == 2
+    assert index.at(_EIGHT + 2 * 3600) == 2
+    # before the series: its first hour; after it (stale data): its last
+    assert index.at(_EIGHT - 86400) == 0
+    assert index.at(_EIGHT + 86400) == 4
+    with pytest.raises(IndexError):
+        TimeIndex([]).at(_EIGHT)
+
+
+def test_offsets_from_now_and_gaps():
+    index = TimeIndex(_HOURS[:2] + _HOURS[3:])
+
+    assert index.ahead(_EIGHT + 1800, [0, 1, 2, 3, 10]).tolist() == [0, 1, -1, 2, -1]
+    assert index.find([_EIGHT + 4 * 3600, _EIGHT + 60]).tolist() == [3, -1]
+    assert index.hours_between(0, 3) == 4
+
+
+def test_index_is_parsed_once_per_series():
+    hourly = _marine_response().hourly
+    assert hourly.time_index is hourly.time_index
+
+    hourly.time = _HOURS[1:]
+    assert len(hourly.time_index) == 4
+    assert isinstance(hourly, MarineHourly)
+
+
+def test_index_is_kept_with_the_cached_response():
+    put_model("marine:cell", _marine_response(), version=1.0, ttl=60)
+    first = get_model("marine:cell", MarineResponse)
+    index = first.hourly.time_index
+
+    assert get_model("marine:cell", MarineResponse).hourly.time_index is index
+    # a rewrite is parsed again
+    put_model("marine:cell", _marine_response(), version=2.0, ttl=60)
+    assert get_model("marine:cell", MarineResponse) is not first
+
+
+def test_current_conditions_are_now_not_the_first_hour():
+    marine, weather = _marine_response(), _weather_response()
+    weather.hourly.time = ["2026-02-10T09:00", "2026-02-10T10:00"]
+
+    forecast = ForecastService.parse_forecast_data(
+        marine, weather, "Test", 38.7, -9.4, now=_EIGHT + 3600 + 120
+    )
+
+    current = forecast.current_conditions
+    assert current.timestamp == "2026-02-10T09:00"
+    assert current.hours_ahead == 0
+    # the weather series starts an hour later: matched by time, not position
+    assert current.temperature_c == 20.0
+    assert [h.timestamp for h in forecast.hourly_forecast] == ["2026-02-10T12:00"]
+    assert forecast.hourly_forecast[0].hours_ahead == 3
+    assert "12:00 (+3h)" in forecast.to_llm_context()
@@ -0,0 +1,64 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.main import create_app
+from services import pipeline, tracing
+from services.tracing import JsonLinesExporter, span, start_trace
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def _stub_upstreams(monkeypatch):
+    monkeypatch.setattr(
+        pipeline, "geocode_location", lambda name, deadline=None: (1.0, 2.0, name)
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "get_marine_forecast",
+        lambda lat, lon, deadline=None: _marine_response(),
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "weather_forecast",
+        lambda lat, lon, deadline=None: _weather_response(),
+    )
+
+
+def test_debug_timing_adds_server_timing_header(monkeypatch):
+    _stub_upstreams(monkeypatch)
+    client = TestClient(create_app())
+
+    response = client.get("/forecast", params={"city": "Test", "debug": "timing"})
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert "parse_forecast_data;dur=" in timing
+    assert "total;dur=" in timing
+    assert "Server-Timing" not in client.get("/forecast?city=Test").headers
+
+
+def test_sampled_traces_are_exported(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("SURF_TRACE_SAMPLE_RATE", "1")
+    tracing.set_exporter(JsonLinesExporter(str(path)))
+    try:
+        with start_trace("job"):
+            with span("outer"):
+                with span("inner", cache="miss"):
+                    pass
+    finally:
+        tracing.set_exporter(None)
+
+    record = json.loads(path.read_text())
+    spans = {s["name"]: s for s in record["spans"]}
+    assert spans["inner"]["parent"] == "outer"
+    assert spans["inner"]["attributes"] == {"cache": "miss"}
+
+
+def test_unsampled_trace_records_nothing(monkeypatch):
+    monkeypatch.setenv("SURF_TRACE_SAMPLE_RATE", "0")
+    with start_trace("job") as trace:
+        with span("stage"):
+            pass
+
+    assert trace.spans == []
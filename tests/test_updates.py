@@ -0,0 +1,113 @@
+import asyncio
+
+from fastapi import Response
+from fastapi.testclient import TestClient
+
+from api.upstream import Bulkhead
+from backend import router
+from backend.main import create_app
+from services import pipeline
+from services.cache import put_model
+from services.forecast import ForecastService
+from services.helpers import forecast_cache_key
+from services.pipeline import LocationNotFoundError
+from services.updates import Subscriber, UpdateHub
+from tests.test_forecast import _marine_response, _weather_response
+
+
+def _fetch(city_name, **kwargs):
+    if city_name == "Nowhere":
+        raise LocationNotFoundError("no match for Nowhere")
+    return ForecastService.parse_forecast_data(
+        _marine_response(), _weather_response(), "Peniche", 1.0, 2.0
+    )
+
+
+def _cache(marine):
+    put_model(forecast_cache_key("marine", 1.0, 2.0, 7, True), marine, 1.0, 3600)
+    put_model(
+        forecast_cache_key("weather", 1.0, 2.0, 7, True), _weather_response(), 1.0, 3600
+    )
+
+
+def test_refresh_pushes_changed_forecast_to_every_subscriber(monkeypatch):
+    monkeypatch.setattr(pipeline, "fetch_surf_forecast", _fetch)
+    hub = UpdateHub()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        first, second = Subscriber(loop), Subscriber(loop)
+        assert hub.subscribe(first, "peniche") == "Peniche"
+        hub.subscribe(second, "Peniche")
+        initial = [await first.get(), await second.get()]
+
+        _cache(_marine_response())
+        unchanged = hub.publish("1.00:2.00")
+
+        bigger = _marine_response()
+        bigger.hourly.wave_height[0] = 3.0
+        _cache(bigger)
+        changed = hub.publish("1.00:2.00")
+        pushed = await asyncio.wait_for(second.get(), 1)
+        return initial, unchanged, changed, pushed, first._queue.qsize()
+
+    initial, unchanged, changed, pushed, pending = asyncio.run(scenario())
+
+    assert [name for name, _ in initial] == ["forecast", "forecast"]
+    assert unchanged == 0
+    assert changed == 1
+    assert pushed[0] == "forecast" and '"wave_height_m":3.0' in pushed[1]
+    assert pending == 1
+    assert hub.cells() == ["1.00:2.00"]
+
+
+def test_unsubscribed_cells_are_forgotten(monkeypatch):
+    monkeypatch.setattr(pipeline, "fetch_surf_forecast", _fetch)
+    hub = UpdateHub()
+
+    async def scenario():
+        subscriber = Subscriber(asyncio.get_running_loop())
+        hub.subscribe(subscriber, "Peniche")
+        assert hub.unsubscribe(subscriber, "Peniche")
+        assert not hub.unsubscribe(subscriber, "Peniche")
+
+    asyncio.run(scenario())
+
+    assert hub.cells() == []
+
+
+def test_websocket_subscription(monkeypatch):
+    monkeypatch.setattr(pipeline, "fetch_surf_forecast", _fetch)
+    client = TestClient(create_app())
+
+    with client.websocket_connect("/forecast/ws") as ws:
+        ws.send_json({"subscribe": ["Peniche", "Nowhere"]})
+        first, second = ws.receive_json(), ws.receive_json()
+
+    events = {first["event"]: first["data"], second["event"]: second["data"]}
+    assert events["forecast"]["location"] == "Peniche"
+    assert events["error"] == {
+        "city": "Nowhere",
+        "detail": "Location not found: no match for Nowhere",
+    }
+
+
+def test_streams_go_through_admission_control(monkeypatch):
+    monkeypatch.setattr(pipeline, "fetch_surf_forecast", _fetch)
+    monkeypatch.setattr(router, "get_hub", UpdateHub)
+    monkeypatch.setattr(router, "_admission", Bulkhead("f", 0, max_queue=0))
+
+    stream = asyncio.run(
+        router.stream_forecast_updates(
+            request=None, response=Response(), city=["Peniche"]
+        )
+    )
+    assert stream.headers["X-Cache-Only"] == "1"
+    assert stream.headers["Cache-Control"] == "no-cache"
+
+    monkeypatch.setattr(router, "_cache_only_admission", Bulkhead("c", 0, max_queue=0))
+    with TestClient(create_app()).websocket_connect("/forecast/ws") as ws:
+        ws.send_json({"subscribe": ["Peniche"]})
+        event = ws.receive_json()
+    assert event["event"] == "error"
+    assert event["data"]["detail"].startswith("Too many forecast requests")
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from api import upstream as upstream_module
+from api.upstream import (
+    Bulkhead,
+    CircuitBreaker,
+    Upstream,
+    UpstreamSaturatedError,
+    UpstreamUnavailableError,
+    cache_only,
+)
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code), response=self)
+
+
+class _FakeSession:
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        return self.handler(call)
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(upstream_module, "_BACKOFF", 0)
+
+
+def test_breaker_opens_and_serves_stale_payload():
+    healthy = {"ok": True}
+    state = {"down": False}
+
+    def handler(call):
+        if state["down"]:
+            raise requests.ConnectionError("down")
+        return _FakeResponse(payload=healthy)
+
+    session = _FakeSession(handler)
+    up = Upstream("test", session, timeout=1, hedge=False)
+    up.breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=60)
+
+    assert up.get_json("http://x", {"a": 1}) == healthy
+    state["down"] = True
+    assert up.get_json("http://x", {"a": 1}) == healthy
+    assert up.breaker.state == "open"
+
+    calls = session.calls
+    assert up.get_json("http://x", {"a": 1}) == healthy
+    assert session.calls == calls  # failed fast, no upstream call
+
+    with pytest.raises(UpstreamUnavailableError):
+        up.get_json("http://x", {"a": 2})
+
+
+def test_slow_request_is_hedged():
+    def handler(call):
+        if call == 1:
+            time.sleep(1.0)
+            return _FakeResponse(payload={"call": 1})
+        return _FakeResponse(payload={"call": call})
+
+    session = _FakeSession(handler)
+    up = Upstream("test", session, timeout=5)
+    for _ in range(upstream_module._MIN_LATENCY_SAMPLES):
+        up.latency.record(0.01)
+
+    start = time.perf_counter()
+    payload = up.get_json("http://x", {})
+
+    assert payload == {"call": 2}
+    assert time.perf_counter() - start < 0.9
+
+
+def test_fast_hedge_error_does_not_beat_slow_success():
+    def handler(call):
+        if call == 1:
+            time.sleep(0.6)
+            return _FakeResponse(payload={"call": 1})
+        return _FakeResponse(status_code=503)
+
+    session = _FakeSession(handler)
+    up = Upstream("test", session, timeout=5)
+    for _ in range(upstream_module._MIN_LATENCY_SAMPLES):
+        up.latency.record(0.01)
+
+    assert up.get_json("http://x", {}) == {"call": 1}
+    assert session.calls == 2
+    assert up.breaker.state == "closed"
+
+
+def test_client_errors_do_not_trip_breaker():
+    session = _FakeSession(lambda call: _FakeResponse(status_code=400))
+    up = Upstream("test", session, timeout=1, hedge=False)
+
+    with pytest.raises(requests.HTTPError):
+        up.get_json("http://x", {})
+    assert session.calls == 1
+    assert up.breaker.state == "closed"
+
+
+def test_bulkhead_rejects_when_queue_full():
+    bulkhead = Bulkhead("test", max_concurrent=1, max_queue=0, max_wait=1)
+
+    assert bulkhead.acquire()
+    assert not bulkhead.acquire()
+    bulkhead.release()
+    assert bulkhead.acquire()
+
+
+def test_bulkhead_wait_is_time_limited():
+    bulkhead = Bulkhead("test", max_concurrent=1, max_queue=1, max_wait=0.05)
+    assert bulkhead.acquire()
+
+    start = time.monotonic()
+    assert not bulkhead.acquire()
+    assert time.monotonic() - start < 0.5
+
+    threading.Timer(0.01, bulkhead.release).start()
+    bulkhead.max_wait = 1
+    assert bulkhead.acquire()
+
+
+def test_saturated_upstream_serves_stale_or_fails_fast():
+    session = _FakeSession(lambda call: _FakeResponse(payload={"ok": True}))
+    up = Upstream(
+        "test",
+        session,
+        timeout=1,
+        hedge=False,
+        bulkhead=Bulkhead("test", max_concurrent=1, max_queue=0),
+    )
+    assert up.get_json("http://x", {"a": 1}) == {"ok": True}
+
+    up.bulkhead.acquire()
+    assert up.get_json("http://x", {"a": 1}) == {"ok": True}
+    with pytest.raises(UpstreamSaturatedError) as exc:
+        up.get_json("http://x", {"a": 2})
+    assert exc.value.retry_after >= 1
+    assert session.calls == 1
+
+
+def test_cache_only_never_calls_upstream():
+    session = _FakeSession(lambda call: _FakeResponse(payload={"ok": True}))
+    up = Upstream("test", session, timeout=1, hedge=False)
+
+    with cache_only(), pytest.raises(UpstreamSaturatedError):
+        up.get_json("http://x", {"a": 1})
+    assert session.calls == 0